@@ -1,12 +1,87 @@
+import json
+
+import numpy as np
 from django.contrib import admin
-from .models import PlantData, QAEntry
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+from .models import CareReminder, PlantData, QAEntry
+
+# Below this many rows an exact COUNT(*) is cheap enough to run.
+EXACT_COUNT_LIMIT = 10_000
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that takes large change-list counts from PostgreSQL's
+    statistics instead of COUNT(*): pg_class.reltuples for the whole table
+    (summed over partitions) and the planner's row estimate for filtered or
+    searched lists. Small results are still counted exactly.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return super().count
+        if not queryset.query.where:
+            estimate = self.table_estimate(connection, queryset.model._meta.db_table)
+        else:
+            plan = json.loads(queryset.explain(format='json'))
+            estimate = plan[0]['Plan']['Plan Rows']
+        if estimate < EXACT_COUNT_LIMIT:
+            return super().count
+        return int(estimate)
+
+    @staticmethod
+    def table_estimate(connection, table):
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT coalesce(sum(greatest(c.reltuples, 0)), 0)
+                  FROM pg_class c
+                 WHERE c.oid = to_regclass(%s)
+                    OR c.oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = to_regclass(%s))
+            """, [table, table])
+            return cursor.fetchone()[0]
+
+
+def vector_preview(vector):
+    """
+    Summarises an embedding as its size, norm and first values instead of
+    rendering all 1536 floats.
+    """
+    if vector is None:
+        return "—"
+    vector = np.asarray(vector, dtype=float)
+    head = ", ".join(f"{value:.4f}" for value in vector[:5])
+    return f"{len(vector)} dims, norm {np.linalg.norm(vector):.3f}: [{head}, …]"
+
+
+class ScalableAdmin(admin.ModelAdmin):
+    """
+    Change-list defaults for large tables: estimated counts, no second
+    unfiltered count, and vector columns left unread.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    deferred_fields = ()
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).defer(*self.deferred_fields)
+
 
 @admin.register(PlantData)
-class PlantDataAdmin(admin.ModelAdmin):
+class PlantDataAdmin(ScalableAdmin):
     list_display = ('common_name', 'scientific_name', 'trefle_id', 'family', 'genus')
+    # Each field has a trigram index on UPPER(field), which icontains uses.
+    # No list_filter: its choices come from a DISTINCT over the whole table.
+    # Families are found through the indexed search instead.
     search_fields = ('common_name', 'scientific_name', 'family', 'genus')
-    list_filter = ('family', 'genus')
-    readonly_fields = ('trefle_id', 'slug', 'vector_data')
+    readonly_fields = ('trefle_id', 'slug', 'vector')
+    deferred_fields = ('vector_data',)
     fieldsets = (
         ('Basic Information', {
             'fields': ('common_name', 'scientific_name', 'trefle_id', 'slug')
@@ -15,17 +90,59 @@ class PlantDataAdmin(admin.ModelAdmin):
             'fields': ('family_common_name', 'family', 'genus')
         }),
         ('Details', {
-            'fields': ('description', 'care_instructions', 'soil_type', 'water_requirements', 'sunlight_requirements', 'maximum_height', 'flower_color','native_to','vector_data')
+            'fields': ('description', 'care_instructions', 'soil_type', 'water_requirements', 'sunlight_requirements', 'maximum_height', 'flower_color','native_to','vector')
         }),
         ('Image', {
             'fields': ('image_url', 'year'),
         })
     )
 
+    @admin.display(description='Vector data')
+    def vector(self, obj):
+        return vector_preview(obj.vector_data)
+
+
 @admin.register(QAEntry)
-class QAEntryAdmin(admin.ModelAdmin):
+class QAEntryAdmin(ScalableAdmin):
     list_display = ('plant', 'question_text', 'created_at')
-    search_fields = ('question_text', 'answer_text', 'plant__common_name', 'plant__scientific_name')
-    list_filter = ('plant',)
-    readonly_fields = ('question_vector', 'answer_vector', 'created_at')
-    raw_id_fields = ('plant',)
\ No newline at end of file
+    list_select_related = ('plant',)
+    search_fields = ('question_text',)
+    search_help_text = "Searches questions and plant names."
+    fields = ('plant', 'question_text', 'answer_text', 'question_embedding', 'answer_embedding',
+              'created_at')
+    readonly_fields = ('question_embedding', 'answer_embedding', 'created_at')
+    raw_id_fields = ('plant',)
+    deferred_fields = ('question_vector', 'answer_vector', 'plant__vector_data')
+
+    @admin.display(description='Question vector')
+    def question_embedding(self, obj):
+        return vector_preview(obj.question_vector)
+
+    @admin.display(description='Answer vector')
+    def answer_embedding(self, obj):
+        return vector_preview(obj.answer_vector)
+
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Matches plant names on PlantData first, through its trigram indexes,
+        so the entry search is an OR of two indexed conditions rather than a
+        join scanned with icontains. Both conditions apply on top of the
+        filters the change list already set on `queryset`.
+        """
+        searched, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        if search_term:
+            plant_ids = (PlantData.objects.filter(Q(common_name__icontains=search_term) |
+                                                  Q(scientific_name__icontains=search_term))
+                         .values('pk')[:1000])
+            searched |= queryset.filter(plant_id__in=plant_ids)
+        return searched, may_have_duplicates
+
+
+@admin.register(CareReminder)
+class CareReminderAdmin(ScalableAdmin):
+    list_display = ('user', 'plant', 'kind', 'next_due_at', 'last_sent_at', 'enabled')
+    list_select_related = ('user', 'plant')
+    list_filter = ('kind', 'enabled')
+    search_fields = ('user__username', 'plant__common_name')
+    raw_id_fields = ('user', 'plant')
+    deferred_fields = ('plant__vector_data',)
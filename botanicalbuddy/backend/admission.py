@@ -0,0 +1,225 @@
+import asyncio
+import functools
+import heapq
+import itertools
+import logging
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+
+from rest_framework import status
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+
+class Overloaded(Exception):
+    def __init__(self, retry_after, reason="overloaded"):
+        super().__init__(f"Request shed ({reason}); retry after {retry_after:.1f}s")
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class UserQuotas:
+    """
+    Per-user token buckets. Each user may burst up to `burst` cost units and
+    refills at `rate` units per second. Buckets for the least recently seen
+    users are dropped beyond `max_users`; a dropped user starts again full.
+    """
+
+    def __init__(self, rate, burst, max_users=100_000):
+        self.rate = rate
+        self.burst = burst
+        self.max_users = max_users
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key, cost=1.0, now=None):
+        """
+        Takes `cost` units from the user's bucket.
+
+        Returns:
+            float: 0 if the request is allowed, otherwise the seconds until
+            the bucket holds enough units.
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens >= cost:
+                tokens -= cost
+                wait = 0.0
+            else:
+                wait = (cost - tokens) / self.rate if self.rate else math.inf
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_users:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+class _Waiter:
+    __slots__ = ('priority', 'seq', 'loop', 'future', 'granted', 'abandoned')
+
+    def __init__(self, priority, seq, loop):
+        self.priority = priority
+        self.seq = seq
+        self.loop = loop
+        self.future = loop.create_future()
+        self.granted = False
+        self.abandoned = False
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class AdmissionController:
+    """
+    Caps in-flight inference and queues the excess by priority.
+
+    A request is shed immediately when the queue is full or when the
+    estimated wait (queue depth x average service time / capacity) already
+    exceeds `max_wait`; a queued request that is not admitted within
+    `max_wait` is shed too. Accepted requests therefore wait at most
+    `max_wait` before they start.
+
+    Slots are handed over under a thread lock and waiters are woken on their
+    own event loop, so the controller also works when async views run on
+    per-request loops under WSGI.
+    """
+
+    def __init__(self, max_in_flight, max_queue, max_wait, initial_service_time=1.0):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.service_time = initial_service_time
+        self.in_flight = 0
+        self.queued = 0
+        self.admitted = 0
+        self.shed = 0
+        self._waiters = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def estimated_wait(self, position=None):
+        position = self.queued + 1 if position is None else position
+        return position * self.service_time / self.max_in_flight
+
+    def _shed(self, reason):
+        self.shed += 1
+        return Overloaded(max(1.0, self.estimated_wait()), reason)
+
+    async def acquire(self, priority=PRIORITY_NORMAL):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self.in_flight < self.max_in_flight and not self.queued:
+                self.in_flight += 1
+                self.admitted += 1
+                return
+            if self.queued >= self.max_queue:
+                raise self._shed("queue full")
+            if self.estimated_wait() > self.max_wait:
+                raise self._shed("queue deadline")
+            waiter = _Waiter(priority, next(self._seq), loop)
+            heapq.heappush(self._waiters, waiter)
+            self.queued += 1
+
+        try:
+            await asyncio.wait_for(waiter.future, self.max_wait)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            with self._lock:
+                if not waiter.granted:
+                    waiter.abandoned = True
+                    self.queued -= 1
+                    if isinstance(e, asyncio.TimeoutError):
+                        raise self._shed("wait timeout") from None
+                    raise
+            # The slot was handed over just as we gave up on it.
+            if isinstance(e, asyncio.CancelledError):
+                self.release()
+                raise
+        with self._lock:
+            self.admitted += 1
+
+    def release(self, service_time=None):
+        with self._lock:
+            if service_time is not None:
+                # Exponentially weighted moving average of time spent in a slot.
+                self.service_time = 0.9 * self.service_time + 0.1 * service_time
+            while self._waiters:
+                waiter = heapq.heappop(self._waiters)
+                if waiter.abandoned:
+                    continue
+                waiter.granted = True
+                self.queued -= 1
+                waiter.loop.call_soon_threadsafe(_wake, waiter.future)
+                return
+            self.in_flight -= 1
+
+    @asynccontextmanager
+    async def slot(self, priority=PRIORITY_NORMAL):
+        await self.acquire(priority)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - started)
+
+    def stats(self):
+        return {'in_flight': self.in_flight, 'queued': self.queued, 'admitted': self.admitted,
+                'shed': self.shed, 'service_time': round(self.service_time, 3)}
+
+
+user_quotas = UserQuotas(
+    rate=float(os.environ.get("USER_QUOTA_RATE", 0.5)),
+    burst=float(os.environ.get("USER_QUOTA_BURST", 10)),
+)
+inference_admission = AdmissionController(
+    max_in_flight=int(os.environ.get("ADMISSION_MAX_IN_FLIGHT", 16)),
+    max_queue=int(os.environ.get("ADMISSION_MAX_QUEUE", 64)),
+    max_wait=float(os.environ.get("ADMISSION_MAX_WAIT", 5.0)),
+)
+
+
+def too_many_requests(retry_after, message):
+    response = Response({'error': message}, status=status.HTTP_429_TOO_MANY_REQUESTS)
+    response['Retry-After'] = str(math.ceil(retry_after))
+    return response
+
+
+def admission_controlled(cost=1.0, priority=PRIORITY_NORMAL):
+    """
+    Applies the per-user quota and the global inference cap to an async view.
+
+    Place it below @api_view and @permission_classes so request.user is the
+    authenticated JWT user. Staff requests are queued ahead of others.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            user = request.user
+            wait = user_quotas.consume(user.pk, cost)
+            if wait:
+                logger.info(f"User {user.pk} is over quota; retry in {wait:.1f}s.")
+                return too_many_requests(wait, 'Request quota exceeded. Please retry later.')
+            request_priority = PRIORITY_HIGH if user.is_staff else priority
+            try:
+                async with inference_admission.slot(request_priority):
+                    return await view(request, *args, **kwargs)
+            except Overloaded as e:
+                logger.warning(f"Shedding {view.__name__} for user {user.pk}: {e} "
+                               f"({inference_admission.stats()})")
+                return too_many_requests(e.retry_after, 'Server is busy. Please retry later.')
+        return wrapper
+    return decorator
@@ -0,0 +1,144 @@
+"""
+Cached user lookups for the authentication hot path.
+
+JWTAuthentication and the session AuthenticationMiddleware each load the
+user row on every request. Here they read it from a short-lived
+process-local copy first, then from the shared cache, and only then from the
+database. Saving or deleting a user (which covers password changes and
+deactivation) or changing their groups or permissions moves the user to a
+new generation in the shared cache and drops the local copy in the process
+that made the change; other processes see it once their local copy expires
+after AUTH_USER_LOCAL_TTL seconds.
+"""
+import logging
+import os
+import pickle
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+logger = logging.getLogger(__name__)
+
+AUTH_USER_CACHE_TTL = int(os.environ.get("AUTH_USER_CACHE_TTL", 300))
+AUTH_USER_LOCAL_TTL = float(os.environ.get("AUTH_USER_LOCAL_TTL", 5))
+AUTH_USER_LOCAL_SIZE = int(os.environ.get("AUTH_USER_LOCAL_SIZE", 10_000))
+
+
+def user_generation_key(user_id):
+    return f"auth_user_generation:{user_id}"
+
+
+def user_cache_key(user_id, generation):
+    return f"auth_user:{user_id}:{generation}"
+
+
+class UserCache:
+    """
+    Two-level cache of active users by id. Local entries hold the pickled
+    user, so every request gets its own instance and per-request state
+    (such as permission caches) is never shared. Ids are keyed as strings:
+    sessions hold "5" where tokens and signals hold 5.
+
+    Shared entries are keyed by a per-user generation read before the row is
+    loaded, and invalidate() bumps it. A request that loaded the row before
+    an invalidation then writes its copy under the old generation, where no
+    one reads it, instead of bringing back the stale user. Generations start
+    from the clock, so one evicted from the cache does not revive old entries.
+    """
+
+    def __init__(self, local_ttl=AUTH_USER_LOCAL_TTL, ttl=AUTH_USER_CACHE_TTL,
+                 max_local=AUTH_USER_LOCAL_SIZE):
+        self.local_ttl = local_ttl
+        self.ttl = ttl
+        self.max_local = max_local
+        self._local = {}
+        self._invalidations = 0
+        self._lock = threading.Lock()
+
+    def get(self, user_id, load):
+        """
+        Returns the user with this id, calling `load(user_id)` on a miss.
+        `load` raises if there is no such user; nothing is cached then.
+        """
+        now = time.monotonic()
+        key = str(user_id)
+        with self._lock:
+            entry = self._local.get(key)
+            invalidations = self._invalidations
+        if entry is not None and entry[0] > now:
+            return pickle.loads(entry[1])
+
+        generation = cache.get_or_set(user_generation_key(key), time.time_ns, timeout=None)
+        data = cache.get(user_cache_key(key, generation))
+        if data is None:
+            data = pickle.dumps(load(user_id))
+            cache.set(user_cache_key(key, generation), data, self.ttl)
+        with self._lock:
+            # Skip the local copy if this process invalidated a user meanwhile.
+            if self._invalidations == invalidations:
+                if len(self._local) >= self.max_local:
+                    self._local.clear()
+                self._local[key] = (now + self.local_ttl, data)
+        return pickle.loads(data)
+
+    def invalidate(self, user_id):
+        key = str(user_id)
+        with self._lock:
+            self._local.pop(key, None)
+            self._invalidations += 1
+        try:
+            cache.incr(user_generation_key(key))
+        except ValueError:
+            cache.set(user_generation_key(key), time.time_ns(), timeout=None)
+
+    def clear_local(self):
+        with self._lock:
+            self._local.clear()
+
+
+user_cache = UserCache()
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that reads the token's user from user_cache.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken("Token contained no recognizable user identification")
+
+        def load(user_id):
+            try:
+                return self.user_model.objects.get(**{api_settings.USER_ID_FIELD: user_id})
+            except self.user_model.DoesNotExist:
+                raise AuthenticationFailed("User not found", code="user_not_found")
+
+        user = user_cache.get(user_id, load)
+        if not user.is_active:
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+        return user
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    ModelBackend whose per-request session user lookup goes through user_cache.
+    """
+
+    def get_user(self, user_id):
+        def load(user_id):
+            return get_user_model()._default_manager.get(pk=user_id)
+
+        try:
+            user = user_cache.get(user_id, load)
+        except get_user_model().DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,281 @@
+"""
+Precompiled catalog bundles for client-side browsing.
+
+build_catalog_bundle() exports the browsable plant fields to a single JSON
+file named after the hash of its content, compressed with gzip and, when the
+brotli package is installed, brotli. For each of the previous versions still
+kept it also writes a delta holding only the rows that changed and the ids
+that were deleted. manifest.json names the current version and its deltas.
+
+Bundle and delta files never change once written, so they are served with
+year-long immutable cache headers; only the small manifest is revalidated.
+Rows are written one per line, and the build streams the catalog, so memory
+holds one row digest per plant rather than the catalog itself.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import PlantData
+
+try:
+    import brotli
+except ImportError:  # gzip alone is enough to serve the bundles
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+CATALOG_BUNDLE_DIR = os.environ.get("CATALOG_BUNDLE_DIR", os.path.join(settings.BASE_DIR, "catalog"))
+# Versions whose bundles are kept, and from which deltas to the newest are built.
+CATALOG_BUNDLE_KEEP = int(os.environ.get("CATALOG_BUNDLE_KEEP", 5))
+CATALOG_BROTLI_QUALITY = int(os.environ.get("CATALOG_BROTLI_QUALITY", 11))
+
+BUNDLE_FORMAT = 1
+MANIFEST_NAME = "manifest.json"
+# The fields a client needs to list, search and render plants; no vectors or descriptions.
+CATALOG_FIELDS = ('id', 'trefle_id', 'common_name', 'scientific_name', 'slug', 'image_url', 'year',
+                  'family_common_name', 'family', 'genus', 'growth_habit', 'maximum_height',
+                  'flower_color', 'native_regions', 'care_instructions', 'soil_type',
+                  'water_requirements', 'sunlight_requirements', 'common_diseases', 'common_pests')
+FILE_NAME = re.compile(r'^(catalog-[0-9a-f]{16}|delta-[0-9a-f]{16}-[0-9a-f]{16})\.json$')
+ENCODINGS = {'br': '.br', 'gzip': '.gz'}
+
+
+def bundle_name(version):
+    return f"catalog-{version}.json"
+
+
+def delta_name(old_version, new_version):
+    return f"delta-{old_version}-{new_version}.json"
+
+
+def row_line(values):
+    return json.dumps(list(values), separators=(',', ':'), ensure_ascii=False, default=str)
+
+
+def row_digest(line):
+    return hashlib.blake2b(line.encode(), digest_size=8).digest()
+
+
+class CompressedWriter:
+    """
+    Writes text to `<path>.gz` and, if brotli is available, `<path>.br` in
+    one pass.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._gzip_file = open(path + '.gz', 'wb')
+        # mtime=0 keeps the output identical for identical content.
+        self._gzip = gzip.GzipFile(filename='', mode='wb', fileobj=self._gzip_file,
+                                   compresslevel=9, mtime=0)
+        self._brotli_file = open(path + '.br', 'wb') if brotli else None
+        self._brotli = brotli.Compressor(quality=CATALOG_BROTLI_QUALITY) if brotli else None
+
+    def write(self, text):
+        data = text.encode()
+        self._gzip.write(data)
+        if self._brotli:
+            self._brotli_file.write(self._brotli.process(data))
+
+    def close(self):
+        self._gzip.close()
+        self._gzip_file.close()
+        if self._brotli:
+            self._brotli_file.write(self._brotli.finish())
+            self._brotli_file.close()
+
+    def publish(self, path):
+        """
+        Renames the finished files to `path` plus their encoding suffix.
+
+        Returns:
+            dict: Compressed size in bytes per encoding.
+        """
+        sizes = {}
+        for encoding, suffix in ENCODINGS.items():
+            if os.path.exists(self.path + suffix):
+                os.replace(self.path + suffix, path + suffix)
+                sizes[encoding] = os.path.getsize(path + suffix)
+        return sizes
+
+    def discard(self):
+        for suffix in ENCODINGS.values():
+            if os.path.exists(self.path + suffix):
+                os.remove(self.path + suffix)
+
+
+def iter_bundle_lines(path):
+    """
+    Yields the row lines of a gzipped bundle without parsing the whole file.
+    """
+    with gzip.open(path + '.gz', 'rt') as f:
+        next(f)  # {"format":...,"rows":[
+        for line in f:
+            line = line.rstrip('\n').rstrip(',')
+            if line == ']}':
+                return
+            if line:
+                yield line
+
+
+def read_row_digests(path):
+    """
+    Returns {plant id: row digest} for a previously built bundle.
+    """
+    return {json.loads(line)[0]: row_digest(line) for line in iter_bundle_lines(path)}
+
+
+def read_manifest(directory=None):
+    """
+    Returns the current manifest, or None if no bundle has been built.
+    """
+    try:
+        with open(os.path.join(directory or CATALOG_BUNDLE_DIR, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def build_catalog_bundle(directory=None, keep=CATALOG_BUNDLE_KEEP):
+    """
+    Exports the catalog as a content-hashed bundle plus deltas from the
+    previous `keep - 1` versions, then points the manifest at it.
+
+    A catalog whose content has not changed keeps its current version and
+    writes nothing.
+
+    Returns:
+        dict: The manifest now being served.
+    """
+    directory = directory or CATALOG_BUNDLE_DIR
+    os.makedirs(directory, exist_ok=True)
+    manifest = read_manifest(directory)
+    history = manifest['history'] if manifest else []
+    previous = {version: read_row_digests(os.path.join(directory, bundle_name(version)))
+                for version in history[:keep - 1]
+                if os.path.exists(os.path.join(directory, bundle_name(version)) + '.gz')}
+
+    workdir = tempfile.mkdtemp(dir=directory, prefix='.build-')
+    try:
+        bundle = CompressedWriter(os.path.join(workdir, 'bundle.json'))
+        upserts = {version: open(os.path.join(workdir, f'{version}.upserts'), 'w')
+                   for version in previous}
+        hasher = hashlib.sha256()
+
+        def emit(text):
+            hasher.update(text.encode())
+            bundle.write(text)
+
+        emit(f'{{"format":{BUNDLE_FORMAT},"fields":{json.dumps(CATALOG_FIELDS)},"rows":[\n')
+        rows = 0
+        for values in PlantData.objects.order_by('pk').values_list(*CATALOG_FIELDS).iterator(chunk_size=2000):
+            line = row_line(values)
+            emit((',\n' if rows else '') + line)
+            rows += 1
+            digest = row_digest(line)
+            for version, digests in previous.items():
+                # Whatever is left in `digests` afterwards was deleted.
+                if digests.pop(values[0], None) != digest:
+                    upserts[version].write(line + '\n')
+        emit('\n]}\n')
+        bundle.close()
+        for f in upserts.values():
+            f.close()
+
+        version = hasher.hexdigest()[:16]
+        if history and version == history[0]:
+            bundle.discard()
+            logger.info(f"Catalog unchanged; keeping bundle {version}.")
+            return manifest
+
+        sizes = bundle.publish(os.path.join(directory, bundle_name(version)))
+        deltas = {}
+        for old_version, deleted in previous.items():
+            if old_version == version:
+                continue
+            deltas[old_version] = write_delta(directory, workdir, old_version, version, sorted(deleted))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    history = [version] + [v for v in history if v != version][:keep - 1]
+    manifest = {
+        'format': BUNDLE_FORMAT,
+        'version': version,
+        'built_at': timezone.now().isoformat(),
+        'rows': rows,
+        'fields': list(CATALOG_FIELDS),
+        'bundle': {'name': bundle_name(version), 'bytes': sizes},
+        'deltas': deltas,
+        'history': history,
+    }
+    manifest_path = os.path.join(directory, MANIFEST_NAME)
+    with open(manifest_path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(manifest_path + '.tmp', manifest_path)
+    prune_bundles(directory, manifest)
+    logger.info(f"Built catalog bundle {version} with {rows} plants and {len(deltas)} deltas ({sizes}).")
+    return manifest
+
+
+def write_delta(directory, workdir, old_version, new_version, deleted):
+    """
+    Writes the delta from old_version to new_version from the upserted row
+    lines collected during the build.
+
+    Returns:
+        dict: The delta's name, size per encoding and change counts.
+    """
+    writer = CompressedWriter(os.path.join(workdir, f'{old_version}.delta'))
+    writer.write(f'{{"format":{BUNDLE_FORMAT},"from":"{old_version}","to":"{new_version}",'
+                 f'"fields":{json.dumps(CATALOG_FIELDS)},"deletes":{json.dumps(deleted)},"upserts":[\n')
+    upserted = 0
+    with open(os.path.join(workdir, f'{old_version}.upserts')) as f:
+        for line in f:
+            writer.write((',\n' if upserted else '') + line.rstrip('\n'))
+            upserted += 1
+    writer.write('\n]}\n')
+    writer.close()
+    name = delta_name(old_version, new_version)
+    sizes = writer.publish(os.path.join(directory, name))
+    return {'name': name, 'bytes': sizes, 'upserts': upserted, 'deletes': len(deleted)}
+
+
+def prune_bundles(directory, manifest):
+    """
+    Removes bundles of versions no longer kept and deltas to older versions.
+    """
+    keep = {bundle_name(version) for version in manifest['history']}
+    keep.update(delta['name'] for delta in manifest['deltas'].values())
+    for name in os.listdir(directory):
+        base, _ = os.path.splitext(name)
+        if FILE_NAME.match(base) and base not in keep:
+            os.remove(os.path.join(directory, name))
+
+
+def bundle_file(name, accept_encoding, directory=None):
+    """
+    Picks the stored file to send for a bundle or delta name.
+
+    Returns:
+        tuple: (path, content encoding or None for gzip to decompress), or
+        None if there is no such file.
+    """
+    if not FILE_NAME.match(name):
+        return None
+    path = os.path.join(directory or CATALOG_BUNDLE_DIR, name)
+    accepted = {part.split(';')[0].strip() for part in accept_encoding.split(',')}
+    for encoding, suffix in ENCODINGS.items():
+        if encoding in accepted and os.path.exists(path + suffix):
+            return path + suffix, encoding
+    if os.path.exists(path + '.gz'):
+        return path + '.gz', None
+    return None
@@ -0,0 +1,211 @@
+"""
+Server-side conversation memory for ask_botanical_question.
+
+Each conversation keeps its turns plus a rolling summary. A prompt gets the
+summary and the newest turns that have not been summarized yet, cut to a
+token budget, so it stays the same size however long the conversation runs.
+Once a conversation has a full window of unsummarized turns, a background
+thread folds the oldest of them into the summary.
+"""
+import logging
+import os
+import threading
+
+from django.db import close_old_connections
+from openai import OpenAI
+
+from .models import Conversation, ConversationTurn, User
+from .pydanticai import ChatTurn, ConversationHistory
+from .utils import CHARS_PER_TOKEN, estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Unsummarized turns read for a prompt.
+CONVERSATION_WINDOW_TURNS = int(os.environ.get("CONVERSATION_WINDOW_TURNS", 6))
+# Of those, the newest kept verbatim when the rest are folded into the summary.
+CONVERSATION_KEEP_TURNS = int(os.environ.get("CONVERSATION_KEEP_TURNS", 2))
+CONVERSATION_TOKEN_BUDGET = int(os.environ.get("CONVERSATION_TOKEN_BUDGET", 600))
+CONVERSATION_SUMMARY_TOKENS = int(os.environ.get("CONVERSATION_SUMMARY_TOKENS", 200))
+CONVERSATION_SUMMARY_MODEL = os.environ.get("CONVERSATION_SUMMARY_MODEL", "gpt-4o-mini")
+
+SUMMARY_PROMPT = (
+    "Update the summary of a conversation between a gardener and a botanical assistant. "
+    "Keep the plants, symptoms, conditions and advice that later questions may refer to. "
+    "Answer with the updated summary only, in at most {words} words.\n\n"
+    "Current summary:\n{summary}\n\nNew turns:\n{turns}"
+)
+
+
+def budget_history(summary, turns, token_budget=CONVERSATION_TOKEN_BUDGET,
+                   summary_tokens=CONVERSATION_SUMMARY_TOKENS):
+    """
+    Fits a conversation summary and its recent turns into a token budget.
+
+    The summary is cut to summary_tokens. Turns are then taken newest first
+    until the next one would exceed the budget.
+
+    Args:
+        summary (str): The rolling summary of older turns.
+        turns (list): ChatTurn objects, newest first.
+        token_budget (int, optional): Maximum estimated tokens for the history.
+        summary_tokens (int, optional): Maximum estimated tokens for the summary.
+
+    Returns:
+        ConversationHistory: The summary and the selected turns, oldest first.
+    """
+    summary = summary[:summary_tokens * CHARS_PER_TOKEN]
+    used = estimate_tokens(summary) if summary else 0
+    selected = []
+    for turn in turns:
+        cost = estimate_tokens(turn.to_prompt())
+        if used + cost > token_budget:
+            break
+        used += cost
+        selected.append(turn)
+    return ConversationHistory(summary=summary, turns=selected[::-1], token_count=used)
+
+
+async def get_or_start_conversation(username, conversation_id=None, plant=None):
+    """
+    Returns the user's conversation with this id, or starts a new one.
+
+    Returns:
+        Conversation: The conversation, or None if conversation_id is not one
+        of the user's or the user has no profile to attach a new one to.
+    """
+    if conversation_id is not None:
+        return await Conversation.objects.filter(pk=conversation_id,
+                                                 user__username=username).afirst()
+    user = await User.objects.filter(username=username).afirst()
+    if user is None:
+        return None
+    return await Conversation.objects.acreate(user=user, plant=plant)
+
+
+async def load_history(conversation):
+    """
+    Reads the conversation's summary and newest unsummarized turns within
+    the token budget. Only one window of turns is ever read.
+
+    Returns:
+        tuple: (ConversationHistory, bool) where the bool is True if the
+        window is full and the conversation is due for summarizing.
+    """
+    turns = [
+        ChatTurn(question_text=question, answer_text=answer)
+        async for question, answer in ConversationTurn.objects
+        .filter(conversation=conversation, pk__gt=conversation.summarized_through)
+        .order_by('-pk').values_list('question_text', 'answer_text')[:CONVERSATION_WINDOW_TURNS]
+    ]
+    history = budget_history(conversation.summary, turns)
+    return history, len(turns) >= CONVERSATION_WINDOW_TURNS
+
+
+async def record_turn(conversation, question_text, answer_text, due=False):
+    """
+    Stores an answered question, and queues the conversation for
+    summarizing if it was due.
+    """
+    await ConversationTurn.objects.acreate(conversation=conversation, question_text=question_text,
+                                           answer_text=answer_text)
+    if due:
+        conversation_summarizer.submit(conversation.pk)
+
+
+def summarize_turns(summary, turns):
+    """
+    Asks the model to fold turns into the running summary.
+
+    Returns:
+        str: The updated summary.
+    """
+    turns_text = "\n".join(turn.to_prompt() for turn in turns)
+    prompt = SUMMARY_PROMPT.format(words=CONVERSATION_SUMMARY_TOKENS * 3 // 4,
+                                   summary=summary or "(none)", turns=turns_text)
+    response = OpenAI().chat.completions.create(
+        model=CONVERSATION_SUMMARY_MODEL,
+        messages=[{"role": "user", "content": prompt}],
+        max_tokens=CONVERSATION_SUMMARY_TOKENS,
+    )
+    return response.choices[0].message.content.strip()
+
+
+def fold_conversation(conversation_id, summarize=summarize_turns, keep=CONVERSATION_KEEP_TURNS):
+    """
+    Folds all but the newest `keep` unsummarized turns into the summary.
+
+    The summary is only written if no other worker has moved the
+    conversation on in the meantime.
+
+    Returns:
+        int: The number of turns folded.
+    """
+    conversation = Conversation.objects.filter(pk=conversation_id).first()
+    if conversation is None:
+        return 0
+    rows = list(ConversationTurn.objects
+                .filter(conversation=conversation, pk__gt=conversation.summarized_through)
+                .order_by('pk').values_list('pk', 'question_text', 'answer_text'))
+    fold = rows[:max(len(rows) - keep, 0)]
+    if not fold:
+        return 0
+    summary = summarize(conversation.summary,
+                        [ChatTurn(question_text=q, answer_text=a) for _, q, a in fold])
+    updated = Conversation.objects.filter(
+        pk=conversation.pk, summarized_through=conversation.summarized_through,
+    ).update(summary=summary, summarized_through=fold[-1][0])
+    return len(fold) if updated else 0
+
+
+class ConversationSummarizer:
+    """
+    Background worker that refreshes conversation summaries off the request
+    path. Submitting a conversation that is already queued is a no-op; if
+    summarizing fails, the conversation is picked up again the next time its
+    window fills, and until then prompts simply drop its oldest turns.
+    """
+
+    def __init__(self, fold=fold_conversation):
+        self.fold = fold
+        self._pending = {}
+        self._condition = threading.Condition()
+        self._thread = None
+        self.summarized = self.failed = 0
+
+    def submit(self, conversation_id):
+        with self._condition:
+            self._pending[conversation_id] = None
+            self._condition.notify()
+        self._ensure_thread()
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._condition:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name="conversation-summarizer",
+                                                    daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+                conversation_id = next(iter(self._pending))
+                del self._pending[conversation_id]
+            self.run_one(conversation_id)
+
+    def run_one(self, conversation_id):
+        close_old_connections()
+        try:
+            folded = self.fold(conversation_id)
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"Failed to summarize conversation {conversation_id}: {e}")
+            return
+        if folded:
+            self.summarized += 1
+            logger.info(f"Folded {folded} turns into the summary of conversation {conversation_id}.")
+
+
+conversation_summarizer = ConversationSummarizer()
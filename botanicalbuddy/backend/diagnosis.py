@@ -0,0 +1,333 @@
+import logging
+import math
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+
+from .entities import DISEASE, PEST, iter_catalog_terms, normalize_term
+from .regions import CatalogWatcher
+
+logger = logging.getLogger(__name__)
+
+# How much each kind of evidence contributes to an issue's score.
+IMAGE_WEIGHT = 3.0
+SYMPTOM_WEIGHT = 1.0
+MENTION_WEIGHT = 1.5
+KNOWN_ISSUE_WEIGHT = 0.75
+PRIOR_WEIGHT = 0.25
+
+# Symptom -> (issue keyword, strength). An issue in the catalog is linked to a
+# symptom when its name contains the keyword, e.g. "powdery mildew" and "mildew".
+SYMPTOM_ASSOCIATIONS: Dict[str, List[Tuple[str, float]]] = {
+    "yellow leaves": [("root rot", 0.6), ("spider mite", 0.5), ("aphid", 0.4), ("mosaic", 0.5),
+                      ("wilt", 0.5), ("scale", 0.4), ("nematode", 0.4)],
+    "yellowing leaves": [("root rot", 0.6), ("spider mite", 0.5), ("aphid", 0.4), ("mosaic", 0.5),
+                         ("wilt", 0.5), ("scale", 0.4), ("nematode", 0.4)],
+    "yellowing": [("root rot", 0.5), ("spider mite", 0.4), ("mosaic", 0.4), ("wilt", 0.4)],
+    "chlorosis": [("mosaic", 0.7), ("nematode", 0.5), ("root rot", 0.4)],
+    "brown leaves": [("blight", 0.6), ("scorch", 0.6), ("root rot", 0.4)],
+    "brown tips": [("scorch", 0.6), ("root rot", 0.3), ("spider mite", 0.3)],
+    "brown edges": [("scorch", 0.7), ("blight", 0.4)],
+    "brown spots": [("leaf spot", 0.8), ("anthracnose", 0.7), ("blight", 0.6), ("rust", 0.4)],
+    "black spots": [("black spot", 1.0), ("leaf spot", 0.6), ("anthracnose", 0.5), ("sooty mold", 0.4)],
+    "leaf spots": [("leaf spot", 1.0), ("anthracnose", 0.6), ("black spot", 0.6), ("rust", 0.4)],
+    "spots on leaves": [("leaf spot", 0.9), ("black spot", 0.6), ("rust", 0.5), ("anthracnose", 0.5)],
+    "white spots": [("powdery mildew", 0.8), ("mealybug", 0.6), ("scale", 0.4), ("thrip", 0.3)],
+    "white powder": [("powdery mildew", 1.0), ("mildew", 0.8)],
+    "powdery coating": [("powdery mildew", 1.0), ("mildew", 0.8)],
+    "wilting": [("wilt", 1.0), ("root rot", 0.7), ("borer", 0.5), ("nematode", 0.4)],
+    "wilted": [("wilt", 1.0), ("root rot", 0.7), ("borer", 0.5)],
+    "drooping": [("root rot", 0.6), ("wilt", 0.6), ("borer", 0.3)],
+    "droopy": [("root rot", 0.6), ("wilt", 0.6)],
+    "leaf drop": [("spider mite", 0.5), ("scale", 0.5), ("root rot", 0.4), ("black spot", 0.4)],
+    "dropping leaves": [("spider mite", 0.5), ("scale", 0.5), ("root rot", 0.4), ("black spot", 0.4)],
+    "curling leaves": [("aphid", 0.8), ("leaf curl", 1.0), ("thrip", 0.5), ("whitefl", 0.4), ("virus", 0.4)],
+    "leaf curl": [("leaf curl", 1.0), ("aphid", 0.8), ("thrip", 0.5), ("virus", 0.4)],
+    "curled leaves": [("leaf curl", 1.0), ("aphid", 0.8), ("thrip", 0.5)],
+    "holes in leaves": [("caterpillar", 0.9), ("beetle", 0.8), ("slug", 0.8), ("snail", 0.7),
+                        ("shot hole", 0.7), ("sawfl", 0.6)],
+    "chewed leaves": [("caterpillar", 1.0), ("beetle", 0.8), ("slug", 0.7), ("grasshopper", 0.6)],
+    "sticky residue": [("aphid", 0.9), ("scale", 0.8), ("whitefl", 0.7), ("mealybug", 0.7)],
+    "sticky leaves": [("aphid", 0.9), ("scale", 0.8), ("whitefl", 0.7), ("mealybug", 0.7)],
+    "honeydew": [("aphid", 1.0), ("scale", 0.8), ("whitefl", 0.8), ("mealybug", 0.7)],
+    "webbing": [("spider mite", 1.0), ("webworm", 0.8), ("caterpillar", 0.3)],
+    "webs": [("spider mite", 1.0), ("webworm", 0.7)],
+    "mushy stem": [("stem rot", 1.0), ("root rot", 0.7), ("crown rot", 0.8), ("soft rot", 0.8)],
+    "soft stem": [("stem rot", 0.9), ("soft rot", 0.8), ("root rot", 0.6)],
+    "stem rot": [("stem rot", 1.0), ("crown rot", 0.7)],
+    "rotting roots": [("root rot", 1.0), ("phytophthora", 0.8), ("pythium", 0.8)],
+    "mushy roots": [("root rot", 1.0), ("phytophthora", 0.7), ("pythium", 0.7)],
+    "stunted growth": [("nematode", 0.7), ("root rot", 0.6), ("virus", 0.5), ("aphid", 0.3)],
+    "slow growth": [("nematode", 0.5), ("root rot", 0.5), ("scale", 0.3)],
+    "leggy": [],  # A light problem, not a disease or pest.
+    "pale leaves": [("spider mite", 0.5), ("mosaic", 0.4), ("lace bug", 0.5)],
+    "scorched leaves": [("scorch", 1.0), ("blight", 0.5)],
+    "crispy leaves": [("scorch", 0.8), ("spider mite", 0.3)],
+    "dry leaves": [("scorch", 0.6), ("spider mite", 0.4)],
+    "mold": [("mold", 1.0), ("mildew", 0.6), ("botrytis", 0.6)],
+    "mould": [("mold", 1.0), ("mildew", 0.6), ("botrytis", 0.6)],
+    "sooty mold": [("sooty mold", 1.0), ("aphid", 0.6), ("scale", 0.6), ("whitefl", 0.5)],
+    "fuzzy growth": [("botrytis", 0.9), ("grey mold", 0.9), ("gray mold", 0.9), ("downy mildew", 0.6)],
+    "galls": [("gall", 1.0), ("nematode", 0.5), ("crown gall", 1.0)],
+    "cankers": [("canker", 1.0), ("blight", 0.4)],
+    "oozing sap": [("canker", 0.8), ("borer", 0.8), ("fire blight", 0.6)],
+    "discolored leaves": [("mosaic", 0.6), ("rust", 0.4), ("spider mite", 0.4), ("lace bug", 0.4)],
+    "mottled leaves": [("mosaic", 1.0), ("spider mite", 0.5), ("lace bug", 0.6), ("virus", 0.6)],
+}
+
+
+@dataclass
+class Diagnosis:
+    name: str
+    label: str
+    score: float
+    confidence: float
+    evidence: List[str]
+
+
+def _symptom_key(text: str) -> Optional[str]:
+    """Maps a matched symptom (possibly plural/singular) onto its vocabulary entry."""
+    term = normalize_term(text)
+    for candidate in (term, term + "s", term[:-1] if term.endswith("s") else None):
+        if candidate in SYMPTOM_ASSOCIATIONS:
+            return candidate
+    return None
+
+
+class DiagnosisIndex:
+    """
+    Inverted index from symptoms to the catalog's diseases and pests.
+
+    Issues are the distinct names across PlantData.common_diseases/common_pests.
+    The symptom matrix holds one weighted row per symptom; weights are the seed
+    association strength scaled by how specific the symptom is (the fewer
+    issues it points at, the more it counts). The prior favours issues that
+    many plants list.
+
+    Catalog changes only mark the index stale: directly from signals in the
+    process that saved the plant, and through the shared catalog version in
+    the others. The first build runs in the caller, since there is nothing to
+    serve yet; later rebuilds run on a background thread, one at a time,
+    while the current index keeps answering.
+    """
+
+    def __init__(self):
+        self.issues: List[Tuple[str, str]] = []
+        self.issue_ids: Dict[Tuple[str, str], int] = {}
+        self.symptom_ids: Dict[str, int] = {}
+        self.symptom_matrix = np.zeros((0, 0), dtype=np.float32)
+        self.prior = np.zeros(0, dtype=np.float32)
+        # Bumped on every catalog change; the index is stale until a build
+        # that started at the current generation finishes.
+        self.generation = 0
+        self.built_generation = None
+        self.catalog = CatalogWatcher()
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._rebuilding = False
+
+    @property
+    def built(self):
+        return self.built_generation is not None
+
+    @property
+    def stale(self):
+        return self.built_generation != self.generation
+
+    def mark_stale(self):
+        with self._lock:
+            self.generation += 1
+
+    def build(self, plant_issues, generation=None):
+        """
+        Builds the index from an iterable of (common_diseases, common_pests)
+        pairs read at `generation` (the current one if not given).
+        """
+        if generation is None:
+            generation = self.generation
+        counts = Counter()
+        for common_diseases, common_pests in plant_issues:
+            for label, value in ((DISEASE, common_diseases), (PEST, common_pests)):
+                for name in {normalize_term(n) for n in iter_catalog_terms(value)}:
+                    if name:
+                        counts[(name, label)] += 1
+
+        issues = sorted(counts)
+        issue_ids = {issue: i for i, issue in enumerate(issues)}
+        symptoms = sorted(SYMPTOM_ASSOCIATIONS)
+        matrix = np.zeros((len(symptoms), len(issues)), dtype=np.float32)
+        for row, symptom in enumerate(symptoms):
+            for keyword, strength in SYMPTOM_ASSOCIATIONS[symptom]:
+                for col, (name, _) in enumerate(issues):
+                    if keyword in name:
+                        matrix[row, col] = max(matrix[row, col], strength)
+            linked = np.count_nonzero(matrix[row])
+            if linked:
+                matrix[row] *= 1.0 + math.log(len(issues) / linked) / 10
+
+        prior = np.array([math.log1p(counts[issue]) for issue in issues], dtype=np.float32)
+        if prior.size and prior.max() > 0:
+            prior /= prior.max()
+
+        with self._lock:
+            self.issues = issues
+            self.issue_ids = issue_ids
+            self.symptom_ids = {symptom: row for row, symptom in enumerate(symptoms)}
+            self.symptom_matrix = matrix
+            self.prior = prior
+            self.built_generation = generation
+        logger.info(f"Diagnosis index built with {len(issues)} issues and "
+                    f"{int(np.count_nonzero(matrix))} symptom links.")
+
+    def load_catalog(self):
+        from .models import PlantData
+
+        # Taken before reading, so a change made during the read leaves it stale.
+        generation = self.generation
+        rows = PlantData.objects.exclude(common_diseases__isnull=True,
+                                         common_pests__isnull=True).values_list(
+            'common_diseases', 'common_pests')
+        self.build(rows.iterator(chunk_size=2000), generation)
+
+    def refresh(self):
+        """
+        Brings a stale index up to date: blocking on the first build, and
+        otherwise by starting a background rebuild and returning at once.
+        """
+        if self.catalog.due() and self.catalog.changed():
+            self.mark_stale()
+        if not self.stale:
+            return
+        if self.built:
+            self._start_rebuild()
+            return
+        with self._build_lock:
+            if not self.built:
+                self.load_catalog()
+
+    def _start_rebuild(self):
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+        threading.Thread(target=self._rebuild, name="diagnosis-index-rebuild", daemon=True).start()
+
+    def _rebuild(self):
+        close_old_connections()
+        try:
+            with self._build_lock:
+                if self.stale:
+                    self.load_catalog()
+        except Exception as e:
+            logger.exception(f"Failed to rebuild the diagnosis index: {e}")
+        finally:
+            with self._lock:
+                self._rebuilding = False
+            close_old_connections()
+
+    def _mask_for(self, names, label) -> np.ndarray:
+        mask = np.zeros(len(self.issues), dtype=np.float32)
+        for name in iter_catalog_terms(names):
+            name = normalize_term(name)
+            for candidate in (name, name + "s", name[:-1] if name.endswith("s") else None):
+                index = self.issue_ids.get((candidate, label))
+                if index is not None:
+                    mask[index] = 1.0
+                    break
+        return mask
+
+    def rank(self, prediction=None, symptoms=(), mentioned_diseases=(), mentioned_pests=(),
+             common_diseases=None, common_pests=None, top_n=3) -> List[Diagnosis]:
+        """
+        Ranks catalog issues by combining every piece of evidence in one pass.
+
+        Args:
+            prediction (dict, optional): Image model output with disease/pest labels
+                and probabilities.
+            symptoms (list): Symptom phrases found in the user's query.
+            mentioned_diseases, mentioned_pests (list): Issues named in the query.
+            common_diseases, common_pests: The plant's known issues (catalog JSON).
+            top_n (int, optional): Number of diagnoses to return.
+
+        Returns:
+            list: Diagnosis objects, best first. Empty if there is no evidence.
+        """
+        with self._lock:
+            if not self.issues:
+                return []
+            n_issues = len(self.issues)
+
+            image = np.zeros(n_issues, dtype=np.float32)
+            prediction = prediction or {}
+            for label, name_key, prob_key in ((DISEASE, 'disease_label', 'disease_probability'),
+                                              (PEST, 'pest_label', 'pest_probability')):
+                if prediction.get(name_key):
+                    image += self._mask_for([prediction[name_key]], label) * float(
+                        prediction.get(prob_key) or 0.0)
+
+            symptom_rows = sorted({self.symptom_ids[key] for key in map(_symptom_key, symptoms)
+                                   if key is not None})
+            symptom_scores = (self.symptom_matrix[symptom_rows].sum(axis=0)
+                              if symptom_rows else np.zeros(n_issues, dtype=np.float32))
+
+            mentioned = np.maximum(self._mask_for(mentioned_diseases, DISEASE),
+                                   self._mask_for(mentioned_pests, PEST))
+            known = np.maximum(self._mask_for(common_diseases, DISEASE),
+                               self._mask_for(common_pests, PEST))
+
+            evidence = IMAGE_WEIGHT * image + SYMPTOM_WEIGHT * symptom_scores + MENTION_WEIGHT * mentioned
+            if not evidence.any():
+                return []
+            # Known issues and the catalog prior only reorder issues with direct evidence.
+            scores = np.where(evidence > 0,
+                              evidence + KNOWN_ISSUE_WEIGHT * known + PRIOR_WEIGHT * self.prior,
+                              0.0)
+
+            top = np.argsort(-scores)[:top_n]
+            top = top[scores[top] > 0]
+            total = float(scores[scores > 0].sum())
+            diagnoses = []
+            for index in top:
+                reasons = []
+                if image[index]:
+                    reasons.append("image")
+                if symptom_scores[index]:
+                    reasons.append("symptoms")
+                if mentioned[index]:
+                    reasons.append("mentioned")
+                if known[index]:
+                    reasons.append("known issue")
+                name, label = self.issues[index]
+                diagnoses.append(Diagnosis(name=name, label=label, score=float(scores[index]),
+                                           confidence=float(scores[index]) / total,
+                                           evidence=reasons))
+            return diagnoses
+
+
+diagnosis_index = DiagnosisIndex()
+
+
+def rank_diagnoses(*args, **kwargs) -> List[Diagnosis]:
+    """
+    Ranks likely diseases and pests, building the index on first use.
+    """
+    diagnosis_index.refresh()
+    return diagnosis_index.rank(*args, **kwargs)
+
+
+async def arank_diagnoses(*args, **kwargs) -> List[Diagnosis]:
+    """
+    Async variant of rank_diagnoses; only the first build reads the database
+    on the request path, and the shared catalog version is read off the
+    event loop.
+    """
+    if diagnosis_index.built and not diagnosis_index.catalog.due():
+        diagnosis_index.refresh()
+    else:
+        await sync_to_async(diagnosis_index.refresh)()
+    return diagnosis_index.rank(*args, **kwargs)
@@ -0,0 +1,356 @@
+import logging
+import threading
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Set, Tuple
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+
+from .regions import CatalogWatcher
+
+logger = logging.getLogger(__name__)
+
+PEST = "PEST"
+DISEASE = "DISEASE"
+SYMPTOM = "SYMPTOM"
+
+# When a phrase is both a catalog issue and a symptom, the catalog label wins.
+LABEL_PRIORITY = {DISEASE: 0, PEST: 1, SYMPTOM: 2}
+
+# Symptom phrases users describe in questions. Catalog data only lists
+# diseases and pests, so symptoms come from this vocabulary.
+SYMPTOM_VOCABULARY = (
+    "yellow leaves", "yellowing leaves", "yellowing", "chlorosis",
+    "brown leaves", "brown tips", "brown edges", "brown spots", "black spots",
+    "leaf spots", "spots on leaves", "white spots", "white powder", "powdery coating",
+    "wilting", "wilted", "drooping", "droopy", "leaf drop", "dropping leaves",
+    "curling leaves", "leaf curl", "curled leaves", "holes in leaves", "chewed leaves",
+    "sticky residue", "sticky leaves", "honeydew", "webbing", "webs",
+    "mushy stem", "soft stem", "stem rot", "rotting roots", "mushy roots",
+    "stunted growth", "slow growth", "leggy", "pale leaves", "scorched leaves",
+    "crispy leaves", "dry leaves", "mold", "mould", "sooty mold", "fuzzy growth",
+    "galls", "cankers", "oozing sap", "discolored leaves", "mottled leaves",
+)
+
+
+@dataclass
+class EntityMatch:
+    text: str
+    label: str
+    start: int
+    end: int
+
+
+@dataclass
+class QueryEntities:
+    matches: List[EntityMatch] = field(default_factory=list)
+
+    def _texts(self, label):
+        return [m.text for m in self.matches if m.label == label]
+
+    @property
+    def pests(self) -> List[str]:
+        return self._texts(PEST)
+
+    @property
+    def diseases(self) -> List[str]:
+        return self._texts(DISEASE)
+
+    @property
+    def symptoms(self) -> List[str]:
+        return self._texts(SYMPTOM)
+
+    @property
+    def is_diagnostic(self) -> bool:
+        """True if the query mentions any pest, disease or symptom."""
+        return bool(self.matches)
+
+
+def normalize_term(term: str) -> str:
+    return " ".join(term.lower().split())
+
+
+def term_variants(term: str) -> Set[str]:
+    """
+    Returns the normalized term plus its naive singular/plural form.
+    """
+    term = normalize_term(term)
+    if not term:
+        return set()
+    if term.endswith("s") and len(term) > 3:
+        return {term, term[:-1]}
+    return {term, term + "s"}
+
+
+def iter_catalog_terms(value) -> Iterable[str]:
+    """
+    Yields issue names from a PlantData.common_diseases/common_pests value.
+
+    The JSON is usually a list of names, but dicts with a "name" key and
+    comma-separated strings are accepted too.
+    """
+    if not value:
+        return
+    if isinstance(value, str):
+        yield from (part for part in value.split(",") if part.strip())
+    elif isinstance(value, dict):
+        yield from iter_catalog_terms(value.get("name"))
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            yield from iter_catalog_terms(item)
+
+
+class AhoCorasick:
+    """
+    Aho-Corasick automaton over lowercased text with word-boundary matching.
+
+    Patterns are reference counted so the same term can be contributed by many
+    plants. Adding a pattern extends the trie in place; removing one only
+    deactivates its output. Failure links are recomputed lazily, in time linear
+    in the trie size, on the first match after a change.
+    The lock makes matching safe against concurrent updates from signals.
+    """
+
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[int]] = [[]]
+        self._patterns: List[Tuple[str, str]] = []
+        self._pattern_ids: Dict[Tuple[str, str], int] = {}
+        self._refcounts: Counter = Counter()
+        self._out_closed: List[List[int]] = [[]]
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return sum(1 for key in self._patterns if self._refcounts[key] > 0)
+
+    def add(self, term: str, label: str):
+        key = (term, label)
+        with self._lock:
+            self._refcounts[key] += 1
+            if key in self._pattern_ids:
+                return
+            node = 0
+            for char in term:
+                next_node = self._goto[node].get(char)
+                if next_node is None:
+                    next_node = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                    self._goto[node][char] = next_node
+                node = next_node
+            self._pattern_ids[key] = len(self._patterns)
+            self._out[node].append(len(self._patterns))
+            self._patterns.append(key)
+            self._dirty = True
+
+    def remove(self, term: str, label: str):
+        key = (term, label)
+        with self._lock:
+            if self._refcounts[key] > 0:
+                self._refcounts[key] -= 1
+
+    def _build_failure_links(self):
+        fail = [0] * len(self._goto)
+        out = [list(outputs) for outputs in self._out]
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                state = fail[node]
+                while state and char not in self._goto[state]:
+                    state = fail[state]
+                fail[child] = self._goto[state].get(char, 0)
+                # Parents are visited first, so out[fail[child]] is already closed.
+                out[child].extend(out[fail[child]])
+                queue.append(child)
+        self._fail = fail
+        self._out_closed = out
+        self._dirty = False
+
+    def find_all(self, text: str) -> List[Tuple[int, int, str, str]]:
+        """
+        Returns (start, end, term, label) for every active pattern found in text.
+        """
+        found = []
+        with self._lock:
+            if self._dirty:
+                self._build_failure_links()
+            goto, fail, out = self._goto, self._fail, self._out_closed
+            patterns, refcounts = self._patterns, self._refcounts
+            node = 0
+            for index, char in enumerate(text):
+                while node and char not in goto[node]:
+                    node = fail[node]
+                node = goto[node].get(char, 0)
+                for pattern_id in out[node]:
+                    term, label = patterns[pattern_id]
+                    if refcounts[(term, label)] <= 0:
+                        continue
+                    start = index - len(term) + 1
+                    end = index + 1
+                    if start > 0 and text[start - 1].isalnum():
+                        continue
+                    if end < len(text) and text[end].isalnum():
+                        continue
+                    found.append((start, end, term, label))
+        return found
+
+
+class EntityGazetteer:
+    """
+    Pest/disease/symptom matcher compiled from the PlantData catalog.
+
+    Each plant's contributed terms are remembered, so a plant saved or
+    deleted in this process only adds or releases its own terms instead of
+    rebuilding the automaton. Changes made by other processes are noticed
+    through the shared catalog version and reloaded on a background thread
+    while the current terms keep matching.
+    """
+
+    def __init__(self, symptoms: Iterable[str] = SYMPTOM_VOCABULARY):
+        self.symptoms = tuple(symptoms)
+        self.loaded = False
+        self.catalog = CatalogWatcher()
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._reloading = False
+        self.automaton, self._plant_terms = self._empty()
+
+    def _empty(self):
+        automaton = AhoCorasick()
+        for symptom in self.symptoms:
+            for variant in term_variants(symptom):
+                automaton.add(variant, SYMPTOM)
+        return automaton, {}
+
+    @staticmethod
+    def _terms_for(common_diseases, common_pests) -> Set[Tuple[str, str]]:
+        terms = set()
+        for label, value in ((DISEASE, common_diseases), (PEST, common_pests)):
+            for name in iter_catalog_terms(value):
+                terms.update((variant, label) for variant in term_variants(name))
+        return terms
+
+    @staticmethod
+    def _apply(automaton, plant_terms, plant_id, new_terms):
+        old_terms = plant_terms.get(plant_id, set())
+        for term, label in new_terms - old_terms:
+            automaton.add(term, label)
+        for term, label in old_terms - new_terms:
+            automaton.remove(term, label)
+        if new_terms:
+            plant_terms[plant_id] = new_terms
+        else:
+            plant_terms.pop(plant_id, None)
+
+    def update_plant(self, plant_id, common_diseases, common_pests):
+        new_terms = self._terms_for(common_diseases, common_pests)
+        with self._lock:
+            self._apply(self.automaton, self._plant_terms, plant_id, new_terms)
+
+    def remove_plant(self, plant_id):
+        with self._lock:
+            self._apply(self.automaton, self._plant_terms, plant_id, set())
+
+    def load_catalog(self):
+        """
+        Compiles a new automaton from the common_diseases/common_pests of
+        every plant and swaps it in.
+        """
+        from .models import PlantData
+
+        automaton, plant_terms = self._empty()
+        rows = PlantData.objects.exclude(common_diseases__isnull=True,
+                                         common_pests__isnull=True).values_list(
+            'id', 'common_diseases', 'common_pests')
+        for plant_id, diseases, pests in rows.iterator(chunk_size=2000):
+            self._apply(automaton, plant_terms, plant_id, self._terms_for(diseases, pests))
+        with self._lock:
+            self.automaton, self._plant_terms = automaton, plant_terms
+            self.loaded = True
+        logger.info(f"Entity gazetteer compiled with {len(automaton)} terms "
+                    f"from {len(plant_terms)} plants.")
+
+    def needs_refresh(self):
+        return not self.loaded or self.catalog.due()
+
+    def refresh(self):
+        """
+        Loads the catalog on first use, blocking, and reloads it in the
+        background when the shared catalog version has moved. The version is
+        read before the catalog, so a change made during a load is picked up
+        by the next check.
+        """
+        if not self.needs_refresh():
+            return
+        if not self.catalog.changed() and self.loaded:
+            return
+        if self.loaded:
+            self._start_reload()
+            return
+        with self._load_lock:
+            if not self.loaded:
+                self.load_catalog()
+
+    def _start_reload(self):
+        with self._lock:
+            if self._reloading:
+                return
+            self._reloading = True
+        threading.Thread(target=self._reload, name="entity-gazetteer-reload", daemon=True).start()
+
+    def _reload(self):
+        close_old_connections()
+        try:
+            with self._load_lock:
+                self.load_catalog()
+        except Exception as e:
+            logger.exception(f"Failed to reload the entity gazetteer: {e}")
+        finally:
+            with self._lock:
+                self._reloading = False
+            close_old_connections()
+
+    def match(self, text: str) -> QueryEntities:
+        """
+        Finds pests, diseases and symptoms in text, keeping the longest
+        leftmost match where terms overlap.
+        """
+        lowered = text.lower()
+        with self._lock:
+            automaton = self.automaton
+        candidates = sorted(automaton.find_all(lowered),
+                            key=lambda m: (m[0], m[0] - m[1], LABEL_PRIORITY[m[3]]))
+        matches, last_end = [], 0
+        for start, end, term, label in candidates:
+            if start < last_end:
+                continue
+            matches.append(EntityMatch(text=text[start:end], label=label,
+                                       start=start, end=end))
+            last_end = end
+        return QueryEntities(matches=matches)
+
+
+gazetteer = EntityGazetteer()
+
+
+def extract_entities(text: str) -> QueryEntities:
+    """
+    Extracts pest/disease/symptom entities from a user query.
+    """
+    gazetteer.refresh()
+    return gazetteer.match(text)
+
+
+async def aextract_entities(text: str) -> QueryEntities:
+    """
+    Async variant of extract_entities; the database and the shared catalog
+    version are only read off the event loop.
+    """
+    if gazetteer.needs_refresh():
+        await sync_to_async(gazetteer.refresh)()
+    return gazetteer.match(text)
@@ -0,0 +1,82 @@
+import hashlib
+import json
+import logging
+import os
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_TTL = int(os.environ.get("RESPONSE_CACHE_TTL", 86400))
+
+
+def response_cache_key(model, pk):
+    return f"response:{model._meta.label_lower}:{pk}"
+
+
+def get_representation(model, pk, serializer_class, modified_field=None):
+    """
+    Returns the serialized object with its ETag and Last-Modified time,
+    from the shared cache when possible.
+
+    Misses read the primary, so a lagging replica can't put an old version
+    back into the cache right after an invalidation.
+
+    Args:
+        model (Model): The model class.
+        pk: The object's primary key.
+        serializer_class (Serializer): Serializer for the response body.
+        modified_field (str, optional): Datetime field used for Last-Modified.
+
+    Returns:
+        dict: {'data', 'etag', 'last_modified'}, last_modified being a Unix
+            timestamp or None.
+
+    Raises:
+        model.DoesNotExist: If there is no such object.
+    """
+    key = response_cache_key(model, pk)
+    representation = cache.get(key)
+    if representation is not None:
+        return representation
+    instance = model.objects.using(DEFAULT_DB_ALIAS).get(pk=pk)
+    body = json.dumps(serializer_class(instance).data, cls=JSONEncoder, sort_keys=True)
+    modified = getattr(instance, modified_field) if modified_field else None
+    representation = {
+        'data': json.loads(body),
+        'etag': quote_etag(hashlib.sha256(body.encode()).hexdigest()[:32]),
+        'last_modified': int(modified.timestamp()) if modified else None,
+    }
+    cache.set(key, representation, RESPONSE_CACHE_TTL)
+    return representation
+
+
+def conditional_response(request, representation):
+    """
+    Answers a GET from a cached representation: 304 when the client's
+    If-None-Match or If-Modified-Since still matches, else the full body.
+    """
+    response = Response(representation['data'])
+    response['ETag'] = representation['etag']
+    if representation['last_modified'] is not None:
+        response['Last-Modified'] = http_date(representation['last_modified'])
+    # Authenticated data: browsers may keep it but must revalidate each time.
+    patch_cache_control(response, private=True, no_cache=True)
+    return get_conditional_response(request, etag=representation['etag'],
+                                    last_modified=representation['last_modified'],
+                                    response=response)
+
+
+def invalidate_responses(model, pks):
+    """
+    Drops cached representations once the current transaction commits, so
+    a concurrent miss can't re-cache the pre-commit row.
+    """
+    keys = [response_cache_key(model, pk) for pk in pks]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
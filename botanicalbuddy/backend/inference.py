@@ -0,0 +1,243 @@
+"""
+In-process image diagnosis on the CPU.
+
+The disease/pest classifier is an ONNX model loaded once per worker process
+and run by ONNX Runtime on a dedicated thread pool, never on the event
+loop. Concurrent requests are grouped by a dynamic batcher: the first image
+to arrive opens a window of IMAGE_BATCH_WINDOW_MS, and everything that
+arrives within it (up to IMAGE_BATCH_MAX_SIZE images) goes through the model
+in one call.
+
+The model takes float32 NCHW images normalized with the ImageNet mean and
+standard deviation and has two outputs, disease scores and pest scores. The
+labels for each come from IMAGE_MODEL_LABELS, a JSON file of the form
+{"disease": [...], "pest": [...]}.
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+IMAGE_MODEL_PATH = os.environ.get("IMAGE_MODEL_PATH", "")
+IMAGE_MODEL_LABELS = os.environ.get("IMAGE_MODEL_LABELS", "")
+IMAGE_SIZE = int(os.environ.get("IMAGE_MODEL_SIZE", 224))
+# Threads ONNX Runtime may use inside one model call.
+IMAGE_MODEL_THREADS = int(os.environ.get("IMAGE_MODEL_THREADS", 1))
+# Model calls that may run at once; with one thread each, one per core.
+IMAGE_INFERENCE_WORKERS = int(os.environ.get("IMAGE_INFERENCE_WORKERS", os.cpu_count() or 1))
+IMAGE_BATCH_MAX_SIZE = int(os.environ.get("IMAGE_BATCH_MAX_SIZE", 16))
+IMAGE_BATCH_WINDOW_MS = float(os.environ.get("IMAGE_BATCH_WINDOW_MS", 5))
+
+IMAGENET_MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+IMAGENET_STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+
+
+class ImageModelUnavailable(Exception):
+    pass
+
+
+def preprocess(image, size=IMAGE_SIZE):
+    """
+    Turns an uploaded image into the model's input.
+
+    Args:
+        image: A file-like object or bytes holding the image.
+        size (int, optional): Edge length of the square model input.
+
+    Returns:
+        np.ndarray: A float32 array of shape (3, size, size).
+    """
+    if isinstance(image, bytes):
+        image = BytesIO(image)
+    with Image.open(image) as img:
+        # JPEGs are decoded straight at a reduced scale no smaller than the input.
+        img.draft('RGB', (size, size))
+        img = img.convert('RGB').resize((size, size), Image.BILINEAR)
+        array = np.asarray(img, dtype=np.float32) / 255.0
+    return ((array - IMAGENET_MEAN) / IMAGENET_STD).transpose(2, 0, 1)
+
+
+def softmax(scores):
+    scores = scores - scores.max(axis=1, keepdims=True)
+    exp = np.exp(scores)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+class OnnxImageClassifier:
+    """
+    The disease/pest classifier behind an ONNX Runtime session. One session
+    is shared by every thread; InferenceSession.run is thread-safe.
+    """
+
+    def __init__(self, model_path, labels_path, threads=IMAGE_MODEL_THREADS):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+        with open(labels_path) as f:
+            labels = json.load(f)
+        self.disease_labels = labels['disease']
+        self.pest_labels = labels['pest']
+
+    def __call__(self, batch):
+        """
+        Classifies a batch of preprocessed images.
+
+        Returns:
+            tuple: (disease scores, pest scores), each of shape (batch, labels).
+        """
+        disease, pest = self.session.run(None, {self.input_name: batch})[:2]
+        return disease, pest
+
+
+def to_predictions(model, disease_scores, pest_scores):
+    """
+    Maps the model's scores to the prediction dicts refine_diagnosis reads.
+    """
+    disease_probs, pest_probs = softmax(disease_scores), softmax(pest_scores)
+    disease_top, pest_top = disease_probs.argmax(axis=1), pest_probs.argmax(axis=1)
+    return [{'disease_label': model.disease_labels[d], 'disease_probability': float(disease_probs[i, d]),
+             'pest_label': model.pest_labels[p], 'pest_probability': float(pest_probs[i, p])}
+            for i, (d, p) in enumerate(zip(disease_top, pest_top))]
+
+
+class DynamicBatcher:
+    """
+    Groups single-image requests into model batches.
+
+    A collector thread takes the first queued image, waits up to `window`
+    seconds for up to `max_batch - 1` more, and hands the batch to the
+    worker pool, so several batches can run at once on different cores.
+    Results come back as concurrent futures, which lets callers on any
+    event loop, or none, wait for them.
+    """
+
+    def __init__(self, model, max_batch=IMAGE_BATCH_MAX_SIZE, window_ms=IMAGE_BATCH_WINDOW_MS,
+                 workers=IMAGE_INFERENCE_WORKERS):
+        self.model = model
+        self.max_batch = max_batch
+        self.window = window_ms / 1000
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="image-inference")
+        self._pending = []
+        self._condition = threading.Condition()
+        self._thread = None
+        self.images = self.batches = 0
+
+    def submit(self, array):
+        future = Future()
+        with self._condition:
+            self._pending.append((array, future))
+            self._condition.notify()
+        self._ensure_thread()
+        return future
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._condition:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._collect, name="image-batcher",
+                                                    daemon=True)
+                    self._thread.start()
+
+    def _collect(self):
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+                deadline = time.monotonic() + self.window
+                while len(self._pending) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+            self.executor.submit(self._run, batch)
+
+    def _run(self, batch):
+        futures = [future for _, future in batch]
+        try:
+            scores = self.model(np.stack([array for array, _ in batch]))
+            predictions = to_predictions(self.model, *scores)
+        except Exception as e:
+            logger.exception(f"Image model failed on a batch of {len(batch)}: {e}")
+            for future in futures:
+                future.set_exception(e)
+            return
+        self.images += len(batch)
+        self.batches += 1
+        for future, prediction in zip(futures, predictions):
+            future.set_result(prediction)
+
+    async def predict(self, image):
+        """
+        Diagnoses one uploaded image.
+
+        Returns:
+            dict: disease_label, disease_probability, pest_label and pest_probability.
+        """
+        loop = asyncio.get_running_loop()
+        array = await loop.run_in_executor(self.executor, preprocess, image)
+        return await asyncio.wrap_future(self.submit(array))
+
+    def stats(self):
+        return {'images': self.images, 'batches': self.batches,
+                'mean_batch_size': round(self.images / self.batches, 2) if self.batches else 0.0}
+
+
+_engine = None
+_engine_error = None
+_engine_lock = threading.Lock()
+
+
+def get_image_engine():
+    """
+    Loads the classifier and its batcher on first use, once per process.
+    A failed load is remembered, so later uploads fail fast instead of
+    loading the model again; restart the process after fixing it.
+
+    Raises:
+        ImageModelUnavailable: If no model is configured or it fails to load.
+    """
+    global _engine, _engine_error
+    if _engine is None:
+        with _engine_lock:
+            if _engine_error is not None:
+                raise _engine_error
+            if _engine is None:
+                if not IMAGE_MODEL_PATH or not IMAGE_MODEL_LABELS:
+                    _engine_error = ImageModelUnavailable("IMAGE_MODEL_PATH and IMAGE_MODEL_LABELS are not set.")
+                    raise _engine_error
+                try:
+                    model = OnnxImageClassifier(IMAGE_MODEL_PATH, IMAGE_MODEL_LABELS)
+                except Exception as e:
+                    logger.exception(f"Failed to load the image model {IMAGE_MODEL_PATH}: {e}")
+                    _engine_error = ImageModelUnavailable(f"Failed to load the image model: {e}")
+                    raise _engine_error from e
+                logger.info(f"Loaded image model {IMAGE_MODEL_PATH} with {IMAGE_INFERENCE_WORKERS} workers.")
+                _engine = DynamicBatcher(model)
+    return _engine
+
+
+async def predict_image(image):
+    """
+    Diagnoses an uploaded image with the process's image engine. The first
+    call loads the model on a worker thread, not on the event loop.
+    """
+    engine = _engine
+    if engine is None:
+        engine = await asyncio.get_running_loop().run_in_executor(None, get_image_engine)
+    return await engine.predict(image)
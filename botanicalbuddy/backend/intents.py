@@ -0,0 +1,96 @@
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import List
+
+import numpy as np
+from sklearn.cluster import MiniBatchKMeans
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class QuestionIntent:
+    question_text: str
+    plant_id: int
+    size: int
+    plant_count: int
+    vector: np.ndarray = field(repr=False)
+
+
+def normalize_rows(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix[None, :]
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def mine_intents(vectors, texts, plant_ids, n_intents=20, min_size=3, random_state=0) -> List[QuestionIntent]:
+    """
+    Clusters question vectors into intents and ranks them by popularity.
+
+    Args:
+        vectors (array-like): Question embeddings, one row per question.
+        texts (list): The question text for each row.
+        plant_ids (list): The plant each question was asked about.
+        n_intents (int, optional): Number of clusters to fit.
+        min_size (int, optional): Smallest cluster kept as an intent.
+        random_state (int, optional): Seed for reproducible clusters.
+
+    Returns:
+        list: QuestionIntent objects ordered by the number of distinct plants
+        and then questions in the cluster. Each intent is represented by the
+        member question closest to its centroid.
+    """
+    if not len(texts):
+        return []
+    matrix = normalize_rows(vectors)
+    n_clusters = min(n_intents, len(texts))
+    kmeans = MiniBatchKMeans(n_clusters=n_clusters, random_state=random_state,
+                             batch_size=1024, n_init=3)
+    labels = kmeans.fit_predict(matrix)
+    centroids = normalize_rows(kmeans.cluster_centers_)
+
+    plant_ids = np.asarray(plant_ids)
+    intents = []
+    for label in range(n_clusters):
+        members = np.flatnonzero(labels == label)
+        if len(members) < min_size:
+            continue
+        representative = members[np.argmax(matrix[members] @ centroids[label])]
+        intents.append(QuestionIntent(
+            question_text=texts[representative],
+            plant_id=int(plant_ids[representative]),
+            size=len(members),
+            plant_count=len(set(plant_ids[members].tolist())),
+            vector=matrix[representative],
+        ))
+    intents.sort(key=lambda intent: (intent.plant_count, intent.size), reverse=True)
+    logger.debug(f"Mined {len(intents)} intents from {len(texts)} questions")
+    return intents
+
+
+def is_covered(intent_vector, answered_vectors, threshold):
+    """
+    Checks whether any already answered question is at least `threshold`
+    cosine-similar to the intent, i.e. would be served from the Q&A cache.
+    """
+    if answered_vectors is None or not len(answered_vectors):
+        return False
+    return float(np.max(answered_vectors @ intent_vector)) >= threshold
+
+
+def adapt_question(text, source_names, target_name):
+    """
+    Rewrites a question asked about one plant so that it is about another.
+
+    Any of `source_names` found in the text is replaced by `target_name`; a
+    question that does not name its plant is returned unchanged.
+    """
+    for name in sorted(filter(None, source_names), key=len, reverse=True):
+        pattern = re.compile(rf"\b{re.escape(name)}\b", re.IGNORECASE)
+        if pattern.search(text):
+            return pattern.sub(lambda match: target_name, text)
+    return text
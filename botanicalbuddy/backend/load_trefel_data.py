@@ -1,29 +1,57 @@
+import argparse
+import asyncio
+import csv
+import gzip
+import itertools
 import os
+import re
 import django
 import requests
 import json
 import logging
+import time
 from tqdm import tqdm
-from typing import List, Dict, Any
+from typing import Any, Dict, Iterable, Iterator, List, Optional, TextIO
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'botanicalbuddy.settings')
 django.setup()
 
+from django.db import transaction
+from openai import AsyncOpenAI
+
+from backend.catalog import build_catalog_bundle
+from backend.httpcache import invalidate_responses
 from backend.models import PlantData
-from backend.utils import get_embedding  # Import from backend.utils
+from backend.regions import bump_catalog_version, normalize_regions
+from backend.reminders import refresh_plant_intervals
+from backend.utils import CHARS_PER_TOKEN, batch_by_tokens, get_embeddings
 
 logger = logging.getLogger(__name__)
 
-TREFLE_API_KEY = os.environ.get("TREFLE_API_KEY")
-if not TREFLE_API_KEY:
-    raise ValueError("TREFLE_API_KEY environment variable not found.")
-
 BASE_URL = "https://trefle.io/api/v1/plants"
 
+# text-embedding-ada-002 accepts at most 8191 tokens per input.
+MAX_INPUT_TOKENS = 8000
+
+# Fields written by the loader; everything else (images, diseases, pests) is left alone.
+LOADED_FIELDS = ['common_name', 'scientific_name', 'slug', 'image_url', 'year',
+                 'family_common_name', 'family', 'genus', 'growth_habit', 'maximum_height',
+                 'flower_color', 'native_to', 'native_regions', 'description',
+                 'care_instructions', 'soil_type', 'water_requirements',
+                 'sunlight_requirements', 'vector_data', 'updated_at']
+REQUIREMENT_FIELDS = ('water_requirements', 'sunlight_requirements')
+
+
+def trefle_api_key() -> str:
+    key = os.environ.get("TREFLE_API_KEY")
+    if not key:
+        raise ValueError("TREFLE_API_KEY environment variable not found.")
+    return key
+
 
 def fetch_plant_data(page: int = 1) -> List[Dict[str, Any]]:
     """Fetches plant data from the Trefle API."""
-    url = f"{BASE_URL}?token={TREFLE_API_KEY}&page={page}"
+    url = f"{BASE_URL}?token={trefle_api_key()}&page={page}"
     try:
         response = requests.get(url)
         response.raise_for_status()  # Raise an exception for bad status codes
@@ -36,7 +64,7 @@ def fetch_plant_data(page: int = 1) -> List[Dict[str, Any]]:
 
 def fetch_plant_details(plant_id: int) -> Dict[str, Any]:
     """Fetches detailed information for a specific plant from Trefle."""
-    url = f"{BASE_URL}/{plant_id}?token={TREFLE_API_KEY}"
+    url = f"{BASE_URL}/{plant_id}?token={trefle_api_key()}"
     try:
         response = requests.get(url)
         response.raise_for_status()
@@ -46,70 +74,323 @@ def fetch_plant_details(plant_id: int) -> Dict[str, Any]:
         return {}
 
 
-def save_plant_to_db(plant_data: Dict[str, Any]):
-    """Saves plant data to the database, including generating and storing embeddings."""
-    try:
-        details = fetch_plant_details(plant_data.get('id'))
-        if not details:
+def iter_api_records() -> Iterator[Dict[str, Any]]:
+    """Yields the detail record of every plant, page by page, from the Trefle API."""
+    page = 1
+    while True:
+        plants = fetch_plant_data(page)
+        if not plants:
             return
+        logger.info(f"Fetching page {page}: {len(plants)} plants")
+        for plant in plants:
+            details = fetch_plant_details(plant.get('id'))
+            if details:
+                yield details
+        page += 1
 
-        description = details.get("specifications", {}).get("description")
-        if description:
-            try:
-                vector_data = get_embedding(description)
-            except Exception as e:
-                logger.error(
-                    f"Failed to generate embedding for plant {details.get('common_name')}: {e}"
-                )
-                vector_data = None
-        else:
-            vector_data = None
-
-        PlantData.objects.update_or_create(
-            trefle_id=details.get('id'),
-            defaults={
-                'common_name': details.get('common_name'),
-                'scientific_name': details.get('scientific_name'),
-                'slug': details.get('slug'),
-                'image_url': details.get("image_url"),
-                'year': details.get("year"),
-                'family_common_name': details.get("family_common_name"),
-                'family': details.get("family"),
-                'genus': details.get("genus"),
-                'growth_habit': details.get("growth_habit"),
-                'maximum_height': details.get("maximum_height", {}).get("cm"),
-                'flower_color': details.get("flower_color"),
-                'native_to': details.get("native_to"),
-                'description': description,
-                'care_instructions': details.get("care_instructions"),
-                'soil_type': details.get("soil_type"),
-                'water_requirements': details.get("water_requirements"),
-                'sunlight_requirements': details.get("sunlight_requirements"),
-                'vector_data': vector_data
-            })
-    except Exception as e:
-        logger.error(f"Error saving plant to database: {e}")
 
+def open_dump(path: str) -> TextIO:
+    """Opens a dump file as text, decompressing it on the fly if it is gzipped."""
+    with open(path, 'rb') as f:
+        gzipped = f.read(2) == b'\x1f\x8b'
+    if gzipped:
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    return open(path, 'r', encoding='utf-8', newline='')
 
-def main():
-    """Main function to fetch and save plant data."""
-    page = 1
-    total_plants = 0
+
+def dump_format(path: str) -> str:
+    name = path[:-3] if path.endswith('.gz') else path
+    extension = os.path.splitext(name)[1].lower().lstrip('.')
+    return {'jsonl': 'ndjson', 'tsv': 'csv'}.get(extension, extension)
+
+
+def iter_csv_records(f: TextIO) -> Iterator[Dict[str, Any]]:
+    """Yields CSV or TSV rows as dicts; the delimiter is taken from the header line."""
+    header = f.readline()
+    delimiter = '\t' if header.count('\t') > header.count(',') else ','
+    fieldnames = next(csv.reader([header], delimiter=delimiter))
+    for row in csv.DictReader(f, fieldnames=fieldnames, delimiter=delimiter):
+        yield {key: value for key, value in row.items() if value not in ('', None)}
+
+
+def iter_ndjson_records(f: TextIO) -> Iterator[Dict[str, Any]]:
+    for line in f:
+        if line.strip():
+            yield json.loads(line)
+
+
+DATA_ARRAY = re.compile(r'"data"\s*:\s*\[')
+# A single JSON record larger than this is treated as a corrupt dump, rather
+# than reading the rest of the file into memory looking for its end.
+MAX_JSON_RECORD_CHARS = 4 << 20
+
+
+def iter_json_records(f: TextIO, chunk_size: int = 1 << 16,
+                      max_record_chars: int = MAX_JSON_RECORD_CHARS) -> Iterator[Dict[str, Any]]:
+    """
+    Yields the objects of a top-level JSON array (or of the "data" array of
+    an API-style {"data": [...]} document) one at a time, reading the file
+    in chunks so only the current object is held in memory.
+
+    Raises:
+        ValueError: If a record does not decode within `max_record_chars`
+            characters; the message gives its character offset in the file.
+    """
+    decoder = json.JSONDecoder()
+    buffer, position = '', 0
+    consumed = 0  # characters of the file before the buffer
+    eof = False
+
+    def fill():
+        nonlocal buffer, position, consumed, eof
+        chunk = f.read(chunk_size)
+        eof = not chunk
+        consumed += position
+        buffer = buffer[position:] + chunk
+        position = 0
+
+    def skip(characters):
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position] in characters:
+                position += 1
+            if position < len(buffer) or eof:
+                return
+            fill()
+
+    fill()
+    skip(' \t\r\n')
+    if buffer[position:position + 1] == '{':
+        # {"data": [...]}: skip ahead to the bracket after the "data" key.
+        while (match := DATA_ARRAY.search(buffer, position)) is None and not eof:
+            if len(buffer) > max_record_chars:
+                raise ValueError(f"No \"data\" array in the first {consumed + len(buffer)} characters.")
+            fill()
+        if match is None:
+            raise ValueError("Expected a \"data\" array of plant records.")
+        position = match.end() - 1
+    if buffer[position:position + 1] != '[':
+        raise ValueError("Expected a JSON array of plant records.")
+    position += 1
     while True:
-        plants = fetch_plant_data(page)
-        if not plants:
-            break
+        skip(' \t\r\n,')
+        if position >= len(buffer) or buffer[position] in ']}':
+            return
+        while True:
+            try:
+                record, end = decoder.raw_decode(buffer, position)
+                break
+            except json.JSONDecodeError as e:
+                if eof:
+                    raise ValueError(f"Invalid JSON record at character {consumed + position}: "
+                                     f"{e.msg}") from e
+                if len(buffer) - position > max_record_chars:
+                    raise ValueError(f"The record at character {consumed + position} did not decode "
+                                     f"within {max_record_chars} characters: {e.msg}") from e
+                fill()
+        position = end
+        yield record
 
-        total_plants += len(plants)
-        print(f"Fetching page {page}: {len(plants)} plants")
-        for plant in tqdm(plants, desc=f"Saving plants from page {page}"):
-            save_plant_to_db(plant)
-        page += 1
 
-    print(f"Finished loading plant data. Total Plants loaded: {total_plants}")
+READERS = {'csv': iter_csv_records, 'ndjson': iter_ndjson_records, 'json': iter_json_records}
+
+
+def iter_dump_records(path: str, fmt: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """Streams plant records from a local CSV/TSV, JSON or NDJSON dump, gzipped or not."""
+    fmt = fmt or dump_format(path)
+    if fmt not in READERS:
+        raise ValueError(f"Unsupported dump format '{fmt}'; use one of {', '.join(READERS)}.")
+    with open_dump(path) as f:
+        yield from READERS[fmt](f)
+
+
+def _number(value, cast=float):
+    if value in (None, ''):
+        return None
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _native_to(value):
+    if isinstance(value, str) and value.startswith(('[', '{')):
+        try:
+            return json.loads(value)
+        except ValueError:
+            pass
+    return value
+
+
+def plant_fields(record: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Maps a Trefle record to PlantData fields. Accepts API detail records as
+    well as the flat rows of CSV dumps (maximum_height_cm, description, ...).
+    """
+    specifications = record.get('specifications') or {}
+    height = record.get('maximum_height', specifications.get('maximum_height'))
+    if isinstance(height, dict):
+        height = height.get('cm')
+    else:
+        height = record.get('maximum_height_cm', height)
+    native_to = _native_to(record.get('native_to', record.get('distribution')))
+    return {
+        'common_name': record.get('common_name'),
+        'scientific_name': record.get('scientific_name'),
+        'slug': record.get('slug'),
+        'image_url': record.get('image_url'),
+        'year': _number(record.get('year'), int),
+        'family_common_name': record.get('family_common_name'),
+        'family': record.get('family'),
+        'genus': record.get('genus'),
+        'growth_habit': record.get('growth_habit', specifications.get('growth_habit')),
+        'maximum_height': _number(height),
+        'flower_color': record.get('flower_color'),
+        'native_to': native_to,
+        'native_regions': normalize_regions(native_to),
+        'description': specifications.get('description') or record.get('description'),
+        'care_instructions': record.get('care_instructions'),
+        'soil_type': record.get('soil_type'),
+        'water_requirements': record.get('water_requirements'),
+        'sunlight_requirements': record.get('sunlight_requirements'),
+    }
+
+
+def build_plants(records: Iterable[Dict[str, Any]], stats: Dict[str, int]) -> Iterator[PlantData]:
+    for record in records:
+        trefle_id = _number(record.get('id', record.get('trefle_id')), int)
+        if trefle_id is None:
+            stats['skipped'] += 1
+            continue
+        yield PlantData(trefle_id=trefle_id, **plant_fields(record))
+
+
+def reuse_vectors(plants: List[PlantData]) -> List[PlantData]:
+    """
+    Copies vectors of rows whose description is unchanged into `plants`,
+    and returns the plants whose description still needs embedding. Also
+    remembers which rows had different care requirements before the load.
+    """
+    existing = {
+        row[0]: row[1:] for row in PlantData.objects.filter(
+            trefle_id__in=[plant.trefle_id for plant in plants]).values_list(
+                'trefle_id', 'description', 'vector_data', *REQUIREMENT_FIELDS)
+    }
+    to_embed = []
+    for plant in plants:
+        description, vector, *requirements = existing.get(plant.trefle_id, (None, None, None, None))
+        plant._requirements_changed = plant.trefle_id in existing and \
+            requirements != [getattr(plant, field) for field in REQUIREMENT_FIELDS]
+        if vector is not None and description == plant.description:
+            plant.vector_data = vector
+        elif plant.description:
+            to_embed.append(plant)
+    return to_embed
+
+
+async def embed_plants(client, batches, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    max_chars = MAX_INPUT_TOKENS * CHARS_PER_TOKEN
+
+    async def embed(batch):
+        async with semaphore:
+            return batch, await get_embeddings([plant.description[:max_chars] for plant in batch],
+                                               client=client)
+
+    return await asyncio.gather(*(embed(batch) for batch in batches))
+
+
+def write_plants(plants: List[PlantData]) -> int:
+    """
+    Upserts plants on trefle_id in one statement per batch. bulk_create
+    sends no signals, so the caches and reminders the save() signals would
+    have refreshed are updated here.
+    """
+    # The last record wins when a dump repeats an id within a batch.
+    plants = list({plant.trefle_id: plant for plant in plants}.values())
+    with transaction.atomic():
+        PlantData.objects.bulk_create(plants, update_conflicts=True, unique_fields=['trefle_id'],
+                                      update_fields=LOADED_FIELDS, batch_size=500)
+        for plant in plants:
+            if plant._requirements_changed:
+                refresh_plant_intervals(plant)
+    invalidate_responses(PlantData, [plant.pk for plant in plants if plant.pk is not None])
+    return len(plants)
+
+
+def load_plants(records: Iterable[Dict[str, Any]], batch_size: int = 500,
+                concurrency: int = 4, limit: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Loads plant records through the shared pipeline: map, reuse or create
+    embeddings, then bulk upsert. Records are consumed lazily, one window of
+    `concurrency` batches at a time, so memory stays flat for any input size.
+
+    Returns:
+        dict: Counts of written, embedded, failed and skipped rows, plus rows/s.
+    """
+    stats = {'written': 0, 'embedded': 0, 'failed': 0, 'skipped': 0}
+    plants = build_plants(itertools.islice(records, limit), stats)
+    batches = iter(lambda: list(itertools.islice(plants, batch_size)), [])
+    started = time.monotonic()
+    with asyncio.Runner() as runner, tqdm(desc="Loading plants", unit="rows") as progress:
+        client = AsyncOpenAI()
+        while True:
+            window = list(itertools.islice(batches, concurrency))
+            if not window:
+                break
+            to_embed = [plant for batch in window for plant in reuse_vectors(batch)]
+            embedding_batches = list(batch_by_tokens(to_embed, text_of=lambda plant: plant.description))
+            for embedded, vectors in runner.run(embed_plants(client, embedding_batches, concurrency)):
+                if vectors is None:
+                    stats['failed'] += len(embedded)
+                    continue
+                for plant, vector in zip(embedded, vectors):
+                    plant.vector_data = vector
+                stats['embedded'] += len(embedded)
+            for batch in window:
+                written = write_plants(batch)
+                stats['written'] += written
+                progress.update(written)
+            progress.set_postfix(rows_per_s=f"{progress.n / (time.monotonic() - started):.1f}")
+    if stats['written']:
+        bump_catalog_version()
+    elapsed = time.monotonic() - started
+    stats['seconds'] = round(elapsed, 1)
+    stats['rows_per_second'] = round(stats['written'] / elapsed, 1) if elapsed else None
+    return stats
+
+
+def main():
+    """Loads plant data from the Trefle API or from a local dump file."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('--dump', help="Path to a CSV/TSV, JSON or NDJSON dump, optionally gzipped.")
+    parser.add_argument('--format', choices=list(READERS),
+                        help="Dump format; guessed from the file extension by default.")
+    parser.add_argument('--batch-size', type=int, default=500, help="Rows per bulk upsert.")
+    parser.add_argument('--concurrency', type=int, default=4,
+                        help="Batches loaded at once, and embedding requests in flight.")
+    parser.add_argument('--limit', type=int, default=None, help="Stop after this many records.")
+    parser.add_argument('--no-bundle', action='store_true',
+                        help="Skip rebuilding the client catalog bundle afterwards.")
+    args = parser.parse_args()
+
+    if args.dump:
+        records = iter_dump_records(args.dump, args.format)
+    else:
+        trefle_api_key()
+        records = iter_api_records()
+    stats = load_plants(records, batch_size=args.batch_size, concurrency=args.concurrency,
+                        limit=args.limit)
+    print(f"Finished loading plant data. Total Plants loaded: {stats['written']} "
+          f"({stats['rows_per_second']} rows/s over {stats['seconds']}s; "
+          f"{stats['embedded']} embedded, {stats['failed']} embedding failures, "
+          f"{stats['skipped']} records without an id skipped)")
+    if stats['written'] and not args.no_bundle:
+        manifest = build_catalog_bundle()
+        print(f"Catalog bundle {manifest['version']} is being served ({manifest['rows']} plants).")
 
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO,
                         format='%(asctime)s - %(levelname)s - %(message)s')
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,149 @@
+import asyncio
+import itertools
+import logging
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from openai import AsyncOpenAI
+from tqdm import tqdm
+
+from backend.httpcache import invalidate_responses
+from backend.models import PlantData, QAEntry
+from backend.utils import CHARS_PER_TOKEN, batch_by_tokens, estimate_tokens, get_embeddings
+
+logger = logging.getLogger(__name__)
+
+# target -> (model, vector field, source text field)
+BACKFILL_TARGETS = {
+    'plants': (PlantData, 'vector_data', 'description'),
+    'questions': (QAEntry, 'question_vector', 'question_text'),
+    'answers': (QAEntry, 'answer_vector', 'answer_text'),
+}
+
+# text-embedding-ada-002 accepts at most 8191 tokens per input.
+MAX_INPUT_TOKENS = 8000
+
+
+class Command(BaseCommand):
+    help = ("Embeds rows whose vectors are missing (PlantData.vector_data, "
+            "QAEntry.question_vector/answer_vector). Safe to re-run: it only "
+            "selects rows that are still NULL and resumes from --after-id.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', choices=[*BACKFILL_TARGETS, 'all'], default='all')
+        parser.add_argument('--batch-tokens', type=int, default=8000,
+                            help="Estimated tokens per embedding request.")
+        parser.add_argument('--max-batch-size', type=int, default=512,
+                            help="Maximum texts per embedding request.")
+        parser.add_argument('--concurrency', type=int, default=4,
+                            help="Embedding requests in flight at once.")
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help="Rows fetched per server-side cursor round trip.")
+        parser.add_argument('--after-id', type=int, default=0,
+                            help="Only process rows with a primary key above this id.")
+        parser.add_argument('--limit', type=int, default=None,
+                            help="Stop after this many rows per target.")
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1:
+            raise CommandError("--concurrency must be at least 1.")
+        targets = list(BACKFILL_TARGETS) if options['target'] == 'all' else [options['target']]
+        with asyncio.Runner() as runner:
+            client = AsyncOpenAI()
+            for target in targets:
+                self.backfill(runner, client, target, options)
+
+    def missing_rows(self, model, vector_field, text_field, after_id):
+        return (model.objects
+                .filter(**{f'{vector_field}__isnull': True, 'pk__gt': after_id,
+                           f'{text_field}__isnull': False})
+                .exclude(**{text_field: ''}))
+
+    def stream_missing(self, model, vector_field, text_field, after_id, chunk_size, limit):
+        """
+        Streams (pk, text) for rows missing a vector in primary key order.
+
+        QuerySet.iterator() uses a server-side cursor on PostgreSQL, so memory
+        stays flat however many rows are missing.
+        """
+        rows = (self.missing_rows(model, vector_field, text_field, after_id)
+                .order_by('pk')
+                .values_list('pk', text_field))
+        if limit is not None:
+            rows = rows[:limit]
+        for pk, text in rows.iterator(chunk_size=chunk_size):
+            yield pk, text[:MAX_INPUT_TOKENS * CHARS_PER_TOKEN]
+
+    async def embed_batches(self, client, batches, concurrency):
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def embed(batch):
+            async with semaphore:
+                return batch, await get_embeddings([text for _, text in batch], client=client)
+
+        return await asyncio.gather(*(embed(batch) for batch in batches))
+
+    def write_vectors(self, model, vector_field, pairs):
+        """
+        Writes vectors for rows that are still NULL, skipping rows another
+        transaction has locked. Returns the number of rows updated.
+        """
+        vectors = dict(pairs)
+        with transaction.atomic():
+            pks = list(model.objects.select_for_update(skip_locked=True)
+                       .filter(pk__in=list(vectors), **{f'{vector_field}__isnull': True})
+                       .values_list('pk', flat=True))
+            objs = [model(pk=pk, **{vector_field: vectors[pk]}) for pk in pks]
+            model.objects.bulk_update(objs, [vector_field], batch_size=500)
+            # bulk_update sends no signals
+            invalidate_responses(model, pks)
+        return len(objs)
+
+    def backfill(self, runner, client, target, options):
+        model, vector_field, text_field = BACKFILL_TARGETS[target]
+        total = self.missing_rows(model, vector_field, text_field, options['after_id']).count()
+        if options['limit'] is not None:
+            total = min(total, options['limit'])
+        self.stdout.write(f"{target}: {total} rows missing {model.__name__}.{vector_field}")
+
+        rows = self.stream_missing(model, vector_field, text_field, options['after_id'],
+                                   options['chunk_size'], options['limit'])
+        batches = batch_by_tokens(rows, text_of=lambda row: row[1],
+                                  max_tokens=options['batch_tokens'],
+                                  max_items=options['max_batch_size'])
+
+        written = failed = skipped = tokens = 0
+        last_pk = options['after_id']
+        started = time.monotonic()
+        with tqdm(total=total, desc=f"Backfilling {target}", unit="rows") as progress:
+            while True:
+                # Materialise one window of batches, then embed it concurrently.
+                window = list(itertools.islice(batches, options['concurrency']))
+                if not window:
+                    break
+                for batch, embeddings in runner.run(
+                        self.embed_batches(client, window, options['concurrency'])):
+                    last_pk = max(last_pk, batch[-1][0])
+                    tokens += sum(estimate_tokens(text) for _, text in batch)
+                    if embeddings is None:
+                        failed += len(batch)
+                    else:
+                        updated = self.write_vectors(
+                            model, vector_field, [(pk, vector) for (pk, _), vector in zip(batch, embeddings)])
+                        written += updated
+                        skipped += len(batch) - updated
+                    progress.update(len(batch))
+                elapsed = time.monotonic() - started
+                progress.set_postfix(rows_per_s=f"{progress.n / elapsed:.1f}",
+                                     tokens_per_s=f"{tokens / elapsed:.0f}", last_id=last_pk)
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"{target}: wrote {written}, skipped {skipped} (already filled or locked), "
+            f"failed {failed} in {elapsed:.1f}s "
+            f"({(written + skipped + failed) / max(elapsed, 1e-9):.1f} rows/s). "
+            f"Last processed id: {last_pk}."))
+        if failed:
+            logger.warning(f"{failed} {target} rows could not be embedded; "
+                           f"re-run without --after-id to retry them.")
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.catalog import CATALOG_BUNDLE_DIR, CATALOG_BUNDLE_KEEP, brotli, build_catalog_bundle
+
+
+class Command(BaseCommand):
+    help = ("Exports the plant catalog as a content-hashed, compressed bundle with "
+            "deltas from the previous versions, for clients to browse locally. "
+            "load_trefel_data runs this after every load that wrote rows.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--directory', default=CATALOG_BUNDLE_DIR,
+                            help="Where bundles and manifest.json are written.")
+        parser.add_argument('--keep', type=int, default=CATALOG_BUNDLE_KEEP,
+                            help="Versions to keep, each with a delta to the newest.")
+
+    def handle(self, *args, **options):
+        if options['keep'] < 1:
+            raise CommandError("--keep must be at least 1.")
+        if brotli is None:
+            self.stdout.write(self.style.WARNING("brotli is not installed; writing gzip only."))
+        manifest = build_catalog_bundle(options['directory'], options['keep'])
+        sizes = ", ".join(f"{encoding} {size / 1024:.0f} KiB"
+                          for encoding, size in manifest['bundle']['bytes'].items())
+        self.stdout.write(self.style.SUCCESS(
+            f"Catalog version {manifest['version']}: {manifest['rows']} plants ({sizes}), "
+            f"{len(manifest['deltas'])} deltas."))
+        for old_version, delta in manifest['deltas'].items():
+            self.stdout.write(f"  from {old_version}: {delta['upserts']} changed, "
+                              f"{delta['deletes']} deleted, {delta['bytes'].get('gzip', 0)} bytes gzipped")
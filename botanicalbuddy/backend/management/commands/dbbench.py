@@ -0,0 +1,129 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connections
+from django.db.backends.signals import connection_created
+
+from backend.management.commands.loadtest import percentile
+from backend.models import PlantData
+
+MODES = ('fresh', 'persistent', 'pool')
+
+
+class Command(BaseCommand):
+    help = ("Measures per-request database connection overhead for fresh "
+            "connections (CONN_MAX_AGE=0), persistent connections and the psycopg "
+            "pool, running a plant lookup inside Django's request start/finish "
+            "connection handling.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modes', default=','.join(MODES),
+                            help="Comma-separated modes to compare.")
+        parser.add_argument('--requests', type=int, default=500, help="Requests per mode.")
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--server', choices=['asgi', 'wsgi'], default='asgi',
+                            help="asgi runs each request's sync work on a new thread, like "
+                                 "Django's ASGI handler; wsgi reuses a fixed set of threads.")
+        parser.add_argument('--conn-max-age', type=int, default=60,
+                            help="CONN_MAX_AGE for the persistent mode.")
+        parser.add_argument('--output', help="Optional path to save the results as JSON.")
+
+    def handle(self, *args, **options):
+        modes = [mode.strip() for mode in options['modes'].split(',') if mode.strip()]
+        unknown = set(modes) - set(MODES)
+        if unknown:
+            raise CommandError(f"Unknown modes: {', '.join(sorted(unknown))}")
+        base = connections['default'].settings_dict
+        if 'pool' in modes and base['ENGINE'] != 'django.db.backends.postgresql':
+            raise CommandError("The pool mode needs the PostgreSQL backend.")
+
+        self.plant_ids = list(PlantData.objects.values_list('pk', flat=True)[:1000]) or [0]
+        results = {}
+        for mode in modes:
+            alias = self.configure_alias(mode, base, options['conn_max_age'])
+            try:
+                results[mode] = self.run_mode(alias, options)
+            finally:
+                if mode == 'pool':
+                    connections[alias].close_pool()
+                connections[alias].close()
+            self.report(mode, results[mode])
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results saved to {options['output']}"))
+
+    def configure_alias(self, mode, base, conn_max_age):
+        alias = f'dbbench_{mode}'
+        options = {k: v for k, v in base.get('OPTIONS', {}).items() if k != 'pool'}
+        if mode == 'pool':
+            options['pool'] = {'min_size': 1, 'max_size': 20, 'timeout': 10}
+        settings_dict = {
+            **base,
+            'OPTIONS': options,
+            'CONN_MAX_AGE': conn_max_age if mode == 'persistent' else 0,
+            'CONN_HEALTH_CHECKS': mode == 'persistent',
+            'TEST': {**base.get('TEST', {}), 'MIRROR': None},
+        }
+        # configure_settings fills in the remaining defaults; it insists on a 'default' key.
+        connections.settings[alias] = connections.configure_settings({'default': settings_dict})['default']
+        return alias
+
+    def run_mode(self, alias, options):
+        opened = []
+        lock = threading.Lock()
+
+        def count_connection(sender, connection, **kwargs):
+            if connection.alias == alias:
+                with lock:
+                    opened.append(connection.alias)
+
+        def request(i):
+            # What the request_started/request_finished handlers do around a view.
+            started = time.perf_counter()
+            close_old_connections()
+            PlantData.objects.using(alias).defer('vector_data').filter(
+                pk=self.plant_ids[i % len(self.plant_ids)]).first()
+            close_old_connections()
+            return (time.perf_counter() - started) * 1000
+
+        def on_new_thread(i):
+            result = []
+            thread = threading.Thread(target=lambda: result.append(request(i)))
+            thread.start()
+            thread.join()
+            return result[0]
+
+        work = on_new_thread if options['server'] == 'asgi' else request
+        connection_created.connect(count_connection, weak=False)
+        try:
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+                latencies = list(executor.map(work, range(options['requests'])))
+            elapsed = time.perf_counter() - started
+        finally:
+            connection_created.disconnect(count_connection)
+
+        result = {
+            'requests': len(latencies),
+            'throughput_rps': round(len(latencies) / elapsed, 2),
+            'p50_ms': percentile(latencies, 50),
+            'p90_ms': percentile(latencies, 90),
+            'p99_ms': percentile(latencies, 99),
+            'connections_opened': len(opened),
+        }
+        if alias.endswith('pool'):
+            # With a pool, connection_created fires per checkout; count the
+            # server connections the pool actually opened instead.
+            result['connections_opened'] = connections[alias].pool.get_stats().get('connections_num', 0)
+        return result
+
+    def report(self, mode, result):
+        self.stdout.write(
+            f"{mode:<10} n={result['requests']:<6} rps={result['throughput_rps']:<8} "
+            f"p50={result['p50_ms']:.2f}ms p90={result['p90_ms']:.2f}ms "
+            f"p99={result['p99_ms']:.2f}ms connections={result['connections_opened']}")
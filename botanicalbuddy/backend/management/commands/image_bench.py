@@ -0,0 +1,127 @@
+import asyncio
+import json
+import os
+import time
+from io import BytesIO
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image
+
+from backend.inference import (IMAGE_BATCH_WINDOW_MS, IMAGE_INFERENCE_WORKERS, IMAGE_MODEL_LABELS,
+                               IMAGE_MODEL_PATH, IMAGE_MODEL_THREADS, IMAGE_SIZE, DynamicBatcher,
+                               OnnxImageClassifier)
+from backend.management.commands.loadtest import percentile
+
+
+class SyntheticClassifier:
+    """
+    A stand-in classifier of fixed cost (pooled patches through two dense
+    layers) for exercising the batcher where no ONNX model is available.
+    """
+    disease_labels = ['healthy', 'powdery mildew', 'leaf spot', 'rust']
+    pest_labels = ['none', 'aphids', 'spider mites', 'mealybugs']
+
+    def __init__(self, hidden=512, seed=0):
+        rng = np.random.default_rng(seed)
+        features = 3 * (IMAGE_SIZE // 4) ** 2
+        self.hidden = rng.standard_normal((features, hidden), dtype=np.float32) / np.sqrt(features)
+        self.disease = rng.standard_normal((hidden, len(self.disease_labels)), dtype=np.float32)
+        self.pest = rng.standard_normal((hidden, len(self.pest_labels)), dtype=np.float32)
+
+    def __call__(self, batch):
+        n, c, h, w = batch.shape
+        pooled = batch.reshape(n, c, h // 4, 4, w // 4, 4).mean(axis=(3, 5)).reshape(n, -1)
+        hidden = np.maximum(pooled @ self.hidden, 0)
+        return hidden @ self.disease, hidden @ self.pest
+
+
+class Command(BaseCommand):
+    help = ("Benchmarks the in-process image diagnosis engine: images per second, "
+            "images per second per core and latency percentiles at each maximum "
+            "batch size, with many uploads in flight at once.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', default=IMAGE_MODEL_PATH, help="ONNX model path.")
+        parser.add_argument('--labels', default=IMAGE_MODEL_LABELS, help="Labels JSON path.")
+        parser.add_argument('--synthetic', action='store_true',
+                            help="Use a synthetic numpy classifier instead of an ONNX model.")
+        parser.add_argument('--images', type=int, default=512, help="Predictions per batch size.")
+        parser.add_argument('--concurrency', type=int, default=32, help="Uploads in flight at once.")
+        parser.add_argument('--batch-sizes', default='1,4,8,16',
+                            help="Comma-separated maximum batch sizes to compare.")
+        parser.add_argument('--window-ms', type=float, default=IMAGE_BATCH_WINDOW_MS)
+        parser.add_argument('--workers', type=int, default=IMAGE_INFERENCE_WORKERS)
+        parser.add_argument('--output', help="Optional path to save the results as JSON.")
+
+    def handle(self, *args, **options):
+        if options['synthetic']:
+            model, threads = SyntheticClassifier(), 1
+        elif options['model'] and options['labels']:
+            model, threads = OnnxImageClassifier(options['model'], options['labels']), IMAGE_MODEL_THREADS
+        else:
+            raise CommandError("Pass --model and --labels (or set IMAGE_MODEL_PATH and "
+                               "IMAGE_MODEL_LABELS), or use --synthetic.")
+        try:
+            batch_sizes = [int(size) for size in options['batch_sizes'].split(',')]
+        except ValueError:
+            raise CommandError("--batch-sizes must be comma-separated integers.")
+        cores = min(options['workers'] * threads, os.cpu_count() or 1)
+        images = self.make_images(16)
+
+        results = {'cores': cores, 'by_batch_size': {}}
+        for max_batch in batch_sizes:
+            batcher = DynamicBatcher(model, max_batch=max_batch, window_ms=options['window_ms'],
+                                     workers=options['workers'])
+            try:
+                asyncio.run(self.run(batcher, images, options['concurrency'], options['concurrency']))
+                batcher.images = batcher.batches = 0
+                result = asyncio.run(self.run(batcher, images, options['images'], options['concurrency']))
+            finally:
+                batcher.executor.shutdown()
+            result['images_per_second_per_core'] = round(result['images_per_second'] / cores, 2)
+            result.update(batcher.stats())
+            results['by_batch_size'][max_batch] = result
+            self.report(max_batch, result)
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results saved to {options['output']}"))
+
+    def make_images(self, count):
+        rng = np.random.default_rng(0)
+        images = []
+        for _ in range(count):
+            pixels = rng.integers(0, 256, (480, 640, 3), dtype=np.uint8)
+            buffer = BytesIO()
+            Image.fromarray(pixels).save(buffer, format='JPEG', quality=85)
+            images.append(buffer.getvalue())
+        return images
+
+    async def run(self, batcher, images, count, concurrency):
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+
+        async def one(i):
+            async with semaphore:
+                started = time.perf_counter()
+                await batcher.predict(images[i % len(images)])
+                latencies.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(count)))
+        elapsed = time.perf_counter() - started
+        return {
+            'images': count,
+            'images_per_second': round(count / elapsed, 2),
+            'p50_ms': percentile(latencies, 50),
+            'p99_ms': percentile(latencies, 99),
+        }
+
+    def report(self, max_batch, result):
+        self.stdout.write(
+            f"max_batch={max_batch:<4} img/s={result['images_per_second']:<9} "
+            f"img/s/core={result['images_per_second_per_core']:<8} "
+            f"mean_batch={result['mean_batch_size']:<6} "
+            f"p50={result['p50_ms']:.1f}ms p99={result['p99_ms']:.1f}ms")
@@ -0,0 +1,373 @@
+import asyncio
+import json
+import os
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.core.management.base import BaseCommand, CommandError
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from django.test.utils import override_settings, setup_databases, teardown_databases
+from django.urls import reverse
+from PIL import Image
+from rest_framework_simplejwt.tokens import AccessToken
+
+from backend.admission import user_quotas
+from backend.models import PlantData
+from backend.offline import (OfflineAgent, make_offline_embedding,
+                             make_offline_image_prediction, offline_vector)
+from backend.writebehind import QAEntryWriteBuffer
+
+HOST = 'loadtest.local'
+
+# Shared caches would otherwise keep responses and users keyed by the
+# throwaway database's ids after it is dropped.
+LOADTEST_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                               'LOCATION': 'loadtest'}}
+
+QUESTIONS = [
+    "How often should I water my {plant}?",
+    "How much sunlight does {plant} need?",
+    "What soil is best for {plant}?",
+    "When should I fertilize {plant}?",
+    "How do I care for {plant} in winter?",
+    "My {plant} has yellow leaves, what is wrong?",
+]
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(latencies, statuses, elapsed):
+    # Throttled (429) responses return at once, so they are counted apart and
+    # kept out of the percentiles, which describe requests that were served.
+    throttled = sum(1 for s in statuses if s == 429)
+    errors = sum(1 for s in statuses if s is None or s >= 500)
+    latencies = [latency for latency, s in zip(latencies, statuses) if s != 429]
+    return {
+        'requests': len(statuses),
+        'throughput_rps': round(len(statuses) / elapsed, 2) if elapsed else None,
+        'error_rate': round(errors / len(statuses), 4) if statuses else None,
+        'throttled': throttled,
+        'throttled_rate': round(throttled / len(statuses), 4) if statuses else None,
+        'client_errors': sum(1 for s in statuses if s is not None and 400 <= s < 500 and s != 429),
+        'p50_ms': percentile(latencies, 50),
+        'p90_ms': percentile(latencies, 90),
+        'p99_ms': percentile(latencies, 99),
+        'max_ms': max(latencies) if latencies else None,
+    }
+
+
+class Command(BaseCommand):
+    help = ("Drives a question/image/plant-read request mix at a fixed arrival rate "
+            "against the in-process ASGI and/or WSGI application, with offline "
+            "stand-ins for OpenAI and the image model, and reports latency "
+            "percentiles, error rates and event-loop lag. Runs against a throwaway "
+            "test database that is dropped afterwards.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rps', type=float, default=20.0, help="Target arrival rate.")
+        parser.add_argument('--duration', type=float, default=30.0, help="Seconds per mode.")
+        parser.add_argument('--mix', default='question=60,image=10,plant=30',
+                            help="Relative weights of question, image and plant requests.")
+        parser.add_argument('--mode', choices=['asgi', 'wsgi', 'both'], default='both')
+        parser.add_argument('--wsgi-threads', type=int, default=8,
+                            help="Worker threads for the WSGI mode (like gunicorn --threads).")
+        parser.add_argument('--agent-latency', type=float, default=0.8)
+        parser.add_argument('--embedding-latency', type=float, default=0.05)
+        parser.add_argument('--image-latency', type=float, default=0.3)
+        parser.add_argument('--users', type=int, default=100,
+                            help="Virtual users to spread requests over, so per-user quotas "
+                                 "see realistic traffic rather than one user at the full rate.")
+        parser.add_argument('--seed-plants', type=int, default=200,
+                            help="Synthetic plants to create in the throwaway database.")
+        parser.add_argument('--output', default='loadtest-results.json',
+                            help="Where to save the results and the WSGI/ASGI comparison.")
+
+    def handle(self, *args, **options):
+        weights = {}
+        for part in options['mix'].split(','):
+            kind, _, weight = part.partition('=')
+            if kind not in ('question', 'image', 'plant'):
+                raise CommandError(f"Unknown request kind in --mix: {kind}")
+            weights[kind] = float(weight)
+
+        if options['users'] < 1:
+            raise CommandError("--users must be at least 1.")
+
+        # views builds the real Agent at import time, which only needs a key to be set.
+        os.environ.setdefault('OPENAI_API_KEY', 'offline')
+        from backend import views
+
+        # Everything the run writes (users, plants, answers) goes to a test
+        # database that is dropped at the end, never the configured one.
+        # Connections are closed after each request so none is left open in a
+        # worker thread when the database is dropped.
+        for alias in connections:
+            settings.DATABASES[alias]['CONN_MAX_AGE'] = 0
+        self.stdout.write("Creating a throwaway load-test database...")
+        old_config = setup_databases(verbosity=0, interactive=False, aliases=set(connections))
+        try:
+            with override_settings(CACHES=LOADTEST_CACHES):
+                results = self.run(views, weights, options)
+        finally:
+            connections.close_all()
+            teardown_databases(old_config, verbosity=0)
+            self.stdout.write("Dropped the load-test database.")
+
+        with open(options['output'], 'w') as f:
+            json.dump(results, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Results saved to {options['output']}"))
+
+    def run(self, views, weights, options):
+        self.seed_plants(options['seed_plants'])
+        plants = list(PlantData.objects.exclude(common_name__isnull=True)
+                      .values_list('pk', 'common_name')[:500])
+        if not plants:
+            raise CommandError("No plants to query; pass a positive --seed-plants.")
+
+        self.tokens = [str(AccessToken.for_user(user)) for user in self.get_users(options['users'])]
+        self.check_quota(weights, options)
+        self.plants = plants
+        self.image = self.make_image()
+
+        modes = ['wsgi', 'asgi'] if options['mode'] == 'both' else [options['mode']]
+        results = {'config': {k: options[k] for k in (
+            'rps', 'duration', 'mix', 'users', 'wsgi_threads', 'agent_latency',
+            'embedding_latency', 'image_latency')}}
+        with override_settings(ALLOWED_HOSTS=[HOST], MEDIA_ROOT='/tmp/loadtest-media'), \
+                mock.patch.object(views, 'agent', OfflineAgent(options['agent_latency'])), \
+                mock.patch.object(views, 'get_embedding', make_offline_embedding(options['embedding_latency'])), \
+                mock.patch.object(views, 'predict_image', make_offline_image_prediction(options['image_latency'])), \
+                mock.patch.object(views, 'qa_write_buffer', QAEntryWriteBuffer(writer=lambda rows: None)), \
+                mock.patch.object(views.DjangoPlantData, 'asave', mock.AsyncMock()):
+            for mode in modes:
+                self.stdout.write(f"Running {mode.upper()} for {options['duration']}s at {options['rps']} rps...")
+                results[mode] = asyncio.run(self.run_mode(mode, weights, options))
+                self.report(mode, results[mode])
+
+        if len(modes) == 2:
+            results['comparison'] = {
+                kind: {
+                    'asgi_p99_ms': results['asgi']['by_kind'].get(kind, {}).get('p99_ms'),
+                    'wsgi_p99_ms': results['wsgi']['by_kind'].get(kind, {}).get('p99_ms'),
+                    'asgi_error_rate': results['asgi']['by_kind'].get(kind, {}).get('error_rate'),
+                    'wsgi_error_rate': results['wsgi']['by_kind'].get(kind, {}).get('error_rate'),
+                    'asgi_throttled_rate': results['asgi']['by_kind'].get(kind, {}).get('throttled_rate'),
+                    'wsgi_throttled_rate': results['wsgi']['by_kind'].get(kind, {}).get('throttled_rate'),
+                }
+                for kind in weights
+            }
+        return results
+
+    def seed_plants(self, count):
+        missing = count - PlantData.objects.count()
+        if missing <= 0:
+            return
+        PlantData.objects.bulk_create([
+            PlantData(common_name=f"Loadtest plant {i}", scientific_name=f"Plantae loadtestii {i}",
+                      description="A synthetic plant created by the load-testing harness.",
+                      water_requirements="moderate", sunlight_requirements="partial shade",
+                      common_diseases=["powdery mildew"], common_pests=["aphids"],
+                      vector_data=offline_vector(f"Loadtest plant {i}"))
+            for i in range(missing)
+        ])
+        self.stdout.write(f"Seeded {missing} synthetic plants.")
+
+    def get_users(self, count):
+        User = get_user_model()
+        users = []
+        for i in range(count):
+            user, _ = User.objects.get_or_create(
+                username=f'loadtest-{i}', defaults={'email': f'loadtest-{i}@example.com'})
+            users.append(user)
+        return users
+
+    def check_quota(self, weights, options):
+        """
+        Warns when the questions and uploads each virtual user sends would
+        outrun the per-user quota, since most of them would then be throttled.
+        """
+        quota_kinds = weights.get('question', 0) + weights.get('image', 0)
+        per_user_rps = options['rps'] * quota_kinds / sum(weights.values()) / options['users']
+        if per_user_rps > user_quotas.rate:
+            self.stderr.write(self.style.WARNING(
+                f"Each virtual user sends {per_user_rps:.2f} quota-limited requests/s, above the "
+                f"quota of {user_quotas.rate}/s; raise --users or USER_QUOTA_RATE, or expect 429s."))
+
+    def make_image(self):
+        buffer = BytesIO()
+        Image.new('RGB', (320, 240), color=(80, 140, 60)).save(buffer, format='PNG')
+        return buffer.getvalue()
+
+    def build_request(self, kind):
+        """
+        Returns (method, path, content_type, body) for one request of the given kind.
+        """
+        pk, name = random.choice(self.plants)
+        if kind == 'question':
+            body = json.dumps({'query': random.choice(QUESTIONS).format(plant=name),
+                               'plant_name': name}).encode()
+            return 'POST', reverse('backend:ask_botanical_question'), 'application/json', body
+        if kind == 'image':
+            image = BytesIO(self.image)
+            image.name = 'leaf.png'
+            body = encode_multipart(BOUNDARY, {'image': image, 'plant_id': str(pk)})
+            return 'POST', reverse('backend:upload_image'), MULTIPART_CONTENT, body
+        return 'GET', reverse('backend:get_plant_data', kwargs={'pk': pk}), '', b''
+
+    async def call_asgi(self, application, token, method, path, content_type, body):
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+            'method': method, 'scheme': 'http', 'path': path, 'raw_path': path.encode(),
+            'query_string': b'', 'root_path': '', 'client': ('127.0.0.1', 0),
+            'server': (HOST, 80),
+            'headers': [(b'host', HOST.encode()),
+                        (b'authorization', f'Bearer {token}'.encode()),
+                        (b'content-type', content_type.encode()),
+                        (b'content-length', str(len(body)).encode())],
+        }
+        sent = False
+        disconnect = asyncio.Event()
+
+        async def receive():
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {'type': 'http.request', 'body': body, 'more_body': False}
+            await disconnect.wait()
+            return {'type': 'http.disconnect'}
+
+        status_code = None
+
+        async def send(message):
+            nonlocal status_code
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+
+        await application(scope, receive, send)
+        disconnect.set()
+        return status_code
+
+    def call_wsgi(self, application, token, method, path, content_type, body):
+        environ = {
+            'REQUEST_METHOD': method, 'PATH_INFO': path, 'SCRIPT_NAME': '',
+            'QUERY_STRING': '', 'SERVER_NAME': HOST, 'SERVER_PORT': '80',
+            'HTTP_HOST': HOST, 'SERVER_PROTOCOL': 'HTTP/1.1', 'REMOTE_ADDR': '127.0.0.1',
+            'HTTP_AUTHORIZATION': f'Bearer {token}',
+            'CONTENT_TYPE': content_type, 'CONTENT_LENGTH': str(len(body)),
+            'wsgi.input': BytesIO(body), 'wsgi.errors': BytesIO(), 'wsgi.url_scheme': 'http',
+            'wsgi.version': (1, 0), 'wsgi.multithread': True, 'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        status_line = []
+        response = application(environ, lambda status, headers, exc_info=None: status_line.append(status))
+        for _ in response:
+            pass
+        if hasattr(response, 'close'):
+            response.close()
+        return int(status_line[0].split()[0])
+
+    async def monitor_loop_lag(self, samples, stop, interval=0.01):
+        """
+        Records how late the event loop wakes up from a short sleep.
+        """
+        loop = asyncio.get_running_loop()
+        while not stop.is_set():
+            expected = loop.time() + interval
+            await asyncio.sleep(interval)
+            samples.append((loop.time() - expected) * 1000)
+
+    async def run_mode(self, mode, weights, options):
+        if mode == 'asgi':
+            from django.core.asgi import get_asgi_application
+            application = get_asgi_application()
+            executor = None
+        else:
+            from django.core.wsgi import get_wsgi_application
+            application = get_wsgi_application()
+            executor = ThreadPoolExecutor(max_workers=options['wsgi_threads'])
+
+        loop = asyncio.get_running_loop()
+        kinds, kind_weights = zip(*weights.items())
+        records = []
+        lag_samples = []
+        stop = asyncio.Event()
+        monitor = asyncio.create_task(self.monitor_loop_lag(lag_samples, stop))
+
+        async def fire(kind, scheduled):
+            request = self.build_request(kind)
+            token = random.choice(self.tokens)
+            try:
+                if executor is None:
+                    status_code = await self.call_asgi(application, token, *request)
+                else:
+                    status_code = await loop.run_in_executor(executor, self.call_wsgi, application,
+                                                             token, *request)
+            except Exception as e:
+                self.stderr.write(f"{kind} request failed: {e}")
+                status_code = None
+            # Latency is measured from the scheduled start to avoid coordinated omission.
+            records.append((kind, (loop.time() - scheduled) * 1000, status_code))
+
+        tasks = []
+        started = loop.time()
+        next_at = started
+        while next_at - started < options['duration']:
+            delay = next_at - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            kind = random.choices(kinds, kind_weights)[0]
+            tasks.append(asyncio.create_task(fire(kind, next_at)))
+            next_at += random.expovariate(options['rps'])
+        await asyncio.gather(*tasks)
+        elapsed = loop.time() - started
+        stop.set()
+        await monitor
+        if executor is not None:
+            executor.shutdown()
+
+        result = {
+            'overall': summarize([r[1] for r in records], [r[2] for r in records], elapsed),
+            'by_kind': {
+                kind: summarize([r[1] for r in records if r[0] == kind],
+                                [r[2] for r in records if r[0] == kind], elapsed)
+                for kind in kinds
+            },
+            # In WSGI mode the app runs on worker threads, so this only shows
+            # that the load generator itself kept up.
+            ('event_loop_lag_ms' if mode == 'asgi' else 'driver_loop_lag_ms'): {
+                'p50': percentile(lag_samples, 50),
+                'p99': percentile(lag_samples, 99),
+                'max': max(lag_samples) if lag_samples else None,
+                'mean': statistics.fmean(lag_samples) if lag_samples else None,
+            },
+        }
+        return result
+
+    def report(self, mode, result):
+        self.stdout.write(f"{mode.upper()} results:")
+        for kind, stats in [('overall', result['overall']), *result['by_kind'].items()]:
+            if not stats['requests']:
+                continue
+            self.stdout.write(
+                f"  {kind:<9} n={stats['requests']:<6} rps={stats['throughput_rps']:<7} "
+                f"err={stats['error_rate']:.2%} 429={stats['throttled_rate']:.2%} "
+                + (f"p50={stats['p50_ms']:.0f}ms p90={stats['p90_ms']:.0f}ms "
+                   f"p99={stats['p99_ms']:.0f}ms max={stats['max_ms']:.0f}ms"
+                   if stats['p50_ms'] is not None else "no served requests"))
+        label, lag = next((k, v) for k, v in result.items() if k.endswith('loop_lag_ms'))
+        if lag['p50'] is not None:
+            self.stdout.write(f"  {label[:-3].replace('_', ' ')} p50={lag['p50']:.1f}ms p99={lag['p99']:.1f}ms "
+                              f"max={lag['max']:.1f}ms")
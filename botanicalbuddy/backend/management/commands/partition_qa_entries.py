@@ -0,0 +1,328 @@
+import logging
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from tqdm import tqdm
+
+from backend.models import QAEntry
+
+logger = logging.getLogger(__name__)
+
+TABLE = QAEntry._meta.db_table
+NEW_TABLE = f'{TABLE}_partitioned'
+OLD_TABLE = f'{TABLE}_unpartitioned'
+SEQUENCE = f'{NEW_TABLE}_id_seq'
+MIRROR = f'{TABLE}_mirror'
+DEFAULT_PARTITION = f'{TABLE}_default'
+MOVED_ROWS = f'{TABLE}_moved_rows'
+HNSW_INDEX = next(index for index in QAEntry._meta.indexes if index.name == 'qaentry_question_hnsw')
+TRIGRAM_INDEX = 'qaentry_question_trgm'
+# Ids per range when the swap compares row counts between the tables.
+COUNT_RANGE_SIZE = 100_000
+
+# The partition key must be part of the primary key of a partitioned table.
+STRATEGIES = {'hash': 'plant_id', 'range': 'created_at'}
+
+
+def month_start(day, months=0):
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+class Command(BaseCommand):
+    help = ("Moves QAEntry into PostgreSQL declarative partitions, hashed by plant "
+            "or ranged by month of created_at, without taking the table offline. "
+            "Run the phases in order: prepare (partitioned copy of the table plus "
+            "a trigger mirroring new writes), copy (backfills existing rows in "
+            "batches), index (builds each partition's HNSW and plant indexes "
+            "concurrently) and swap (renames the tables in one short transaction). "
+            "The old table is kept as backend_qaentry_unpartitioned.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('phase', choices=['prepare', 'copy', 'index', 'swap', 'extend',
+                                              'status', 'abort'])
+        parser.add_argument('--strategy', choices=list(STRATEGIES), default='hash',
+                            help="hash: by plant_id, so per-plant lookups scan one partition. "
+                                 "range: monthly by created_at, so old months can be detached.")
+        parser.add_argument('--partitions', type=int, default=16,
+                            help="Number of hash partitions.")
+        parser.add_argument('--months-ahead', type=int, default=3,
+                            help="Range strategy: future monthly partitions to create.")
+        parser.add_argument('--batch-size', type=int, default=10_000,
+                            help="Rows copied per transaction.")
+        parser.add_argument('--pause', type=float, default=0.0,
+                            help="Seconds to sleep between copy batches.")
+        parser.add_argument('--after-id', type=int, default=0,
+                            help="Resume the copy above this id.")
+        parser.add_argument('--maintenance-work-mem', default='1GB',
+                            help="maintenance_work_mem for index builds.")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("Partitioning needs PostgreSQL.")
+        getattr(self, options['phase'])(options)
+
+    # --- helpers ---
+
+    def run_sql(self, sql, params=None):
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall() if cursor.description else None
+
+    def copy_mismatches(self, range_size=COUNT_RANGE_SIZE, limit=5, after_id=0):
+        """
+        Compares row counts of the two tables per range of `range_size` ids,
+        considering only ids above `after_id`.
+
+        Returns:
+            list: (first id of the range, rows in the old table, rows in the
+            copy) for up to `limit` ranges whose counts differ, lowest first.
+        """
+        return self.run_sql(f"""
+            WITH old AS (SELECT id / %s AS bucket, count(*) AS n FROM {TABLE} WHERE id > %s GROUP BY 1),
+                 new AS (SELECT id / %s AS bucket, count(*) AS n FROM {NEW_TABLE} WHERE id > %s GROUP BY 1)
+            SELECT coalesce(old.bucket, new.bucket) * %s, coalesce(old.n, 0), coalesce(new.n, 0)
+              FROM old FULL JOIN new ON new.bucket = old.bucket
+             WHERE old.n IS DISTINCT FROM new.n
+             ORDER BY 1 LIMIT %s
+        """, [range_size, after_id, range_size, after_id, range_size, limit])
+
+    def check_copy(self, after_id=0):
+        mismatches = self.copy_mismatches(after_id=after_id)
+        if mismatches:
+            ranges = ", ".join(f"ids {start}-{start + COUNT_RANGE_SIZE - 1}: {new} of {old} rows"
+                               for start, old, new in mismatches)
+            raise CommandError(f"The copy is incomplete ({ranges}); run copy again with "
+                               f"--after-id {max(mismatches[0][0] - 1, 0)}.")
+
+    def table_exists(self, name):
+        return self.run_sql("SELECT to_regclass(%s) IS NOT NULL", [name])[0][0]
+
+    def partition_key(self, table):
+        """
+        Returns the partition key column of a partitioned table, or None.
+        """
+        rows = self.run_sql("""
+            SELECT a.attname
+              FROM pg_partitioned_table p
+              JOIN pg_attribute a ON a.attrelid = p.partrelid AND a.attnum = p.partattrs[0]
+             WHERE p.partrelid = to_regclass(%s)
+        """, [table])
+        return rows[0][0] if rows else None
+
+    def partitions(self, table):
+        return [row[0] for row in self.run_sql("""
+            SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+             WHERE i.inhparent = to_regclass(%s) ORDER BY c.relname
+        """, [table])]
+
+    def require_prepared(self):
+        if not self.table_exists(NEW_TABLE):
+            raise CommandError(f"{NEW_TABLE} does not exist; run the prepare phase first.")
+
+    def take_from_default(self, table, start, end):
+        """
+        Moves the default partition's rows for [start, end) into a temporary
+        table, since PostgreSQL will not create a partition for a range the
+        default partition already holds rows in. Must run in a transaction.
+
+        Returns:
+            int: The number of rows moved.
+        """
+        if not self.table_exists(DEFAULT_PARTITION):
+            return 0
+        self.run_sql(f"CREATE TEMPORARY TABLE {MOVED_ROWS} (LIKE {table}) ON COMMIT DROP")
+        with connection.cursor() as cursor:
+            cursor.execute(f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} "
+                           f"WHERE created_at >= %s AND created_at < %s RETURNING *) "
+                           f"INSERT INTO {MOVED_ROWS} SELECT * FROM moved", [start, end])
+            return cursor.rowcount
+
+    def create_month_partitions(self, table, start, months_ahead):
+        end = month_start(date.today(), months_ahead + 1)
+        created = 0
+        month = month_start(start)
+        while month < end:
+            following = month_start(month, 1)
+            name = f'{TABLE}_y{month.year}m{month.month:02d}'
+            if not self.table_exists(name):
+                with transaction.atomic():
+                    moved = self.take_from_default(table, month, following)
+                    self.run_sql(f"CREATE TABLE {name} PARTITION OF {table} "
+                                 f"FOR VALUES FROM ('{month.isoformat()}') TO ('{following.isoformat()}')")
+                    if moved:
+                        self.run_sql(f"INSERT INTO {table} SELECT * FROM {MOVED_ROWS}")
+                        logger.info(f"Moved {moved} rows from {DEFAULT_PARTITION} into {name}")
+                created += 1
+            month = following
+        return created
+
+    # --- phases ---
+
+    def prepare(self, options):
+        if self.partition_key(TABLE):
+            raise CommandError(f"{TABLE} is already partitioned.")
+        if self.table_exists(NEW_TABLE):
+            raise CommandError(f"{NEW_TABLE} already exists; run abort to start over.")
+        key = STRATEGIES[options['strategy']]
+        with transaction.atomic():
+            # LIKE copies columns, NOT NULLs and defaults but not the identity,
+            # whose sequence would restart at 1; ids come from the old table
+            # until the swap.
+            self.run_sql(f"CREATE TABLE {NEW_TABLE} (LIKE {TABLE} INCLUDING DEFAULTS) "
+                         f"PARTITION BY {options['strategy'].upper()} ({key})")
+            self.run_sql(f"CREATE SEQUENCE {SEQUENCE} OWNED BY {NEW_TABLE}.id")
+            self.run_sql(f"ALTER TABLE {NEW_TABLE} ALTER COLUMN id SET DEFAULT nextval('{SEQUENCE}')")
+            self.run_sql(f"ALTER TABLE {NEW_TABLE} ADD PRIMARY KEY (id, {key})")
+            self.run_sql(f"ALTER TABLE {NEW_TABLE} ADD CONSTRAINT {NEW_TABLE}_plant_fk "
+                         f"FOREIGN KEY (plant_id) REFERENCES backend_plantdata (id) "
+                         f"DEFERRABLE INITIALLY DEFERRED")
+            if options['strategy'] == 'hash':
+                for remainder in range(options['partitions']):
+                    self.run_sql(f"CREATE TABLE {TABLE}_p{remainder:03d} PARTITION OF {NEW_TABLE} "
+                                 f"FOR VALUES WITH (MODULUS {options['partitions']}, REMAINDER {remainder})")
+            else:
+                oldest = self.run_sql(f"SELECT min(created_at)::date FROM {TABLE}")[0][0]
+                self.create_month_partitions(NEW_TABLE, oldest or date.today(), options['months_ahead'])
+                self.run_sql(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {NEW_TABLE} DEFAULT")
+            # Mirror every write made from now on; the copy fills in the rest.
+            self.run_sql(f"""
+                CREATE FUNCTION {MIRROR}() RETURNS trigger LANGUAGE plpgsql AS $$
+                BEGIN
+                    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                        DELETE FROM {NEW_TABLE} WHERE id = OLD.id AND {key} = OLD.{key};
+                    END IF;
+                    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                        INSERT INTO {NEW_TABLE} SELECT NEW.* ON CONFLICT DO NOTHING;
+                    END IF;
+                    RETURN NULL;
+                END $$
+            """)
+            self.run_sql(f"CREATE TRIGGER {MIRROR} AFTER INSERT OR UPDATE OR DELETE ON {TABLE} "
+                         f"FOR EACH ROW EXECUTE FUNCTION {MIRROR}()")
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {NEW_TABLE} ({options['strategy']} on {key}) with "
+            f"{len(self.partitions(NEW_TABLE))} partitions; new writes are mirrored. Next: copy."))
+
+    def copy(self, options):
+        self.require_prepared()
+        last_id, max_id = options['after_id'], self.run_sql(f"SELECT coalesce(max(id), 0) FROM {TABLE}")[0][0]
+        copied = 0
+        started = time.monotonic()
+        with tqdm(total=max(max_id - last_id, 0), desc="Copying QAEntry", unit="ids") as progress:
+            while last_id < max_id:
+                upper = min(last_id + options['batch_size'], max_id)
+                # FOR SHARE holds off concurrent updates and deletes of the
+                # batch until it commits, so their mirrored changes land after
+                # the copied rows instead of being overwritten by them.
+                with transaction.atomic():
+                    with connection.cursor() as cursor:
+                        cursor.execute(f"INSERT INTO {NEW_TABLE} SELECT * FROM {TABLE} "
+                                       f"WHERE id > %s AND id <= %s FOR SHARE ON CONFLICT DO NOTHING",
+                                       [last_id, upper])
+                        copied += cursor.rowcount
+                progress.update(upper - last_id)
+                progress.set_postfix(rows_per_s=f"{copied / (time.monotonic() - started):.0f}",
+                                     last_id=upper)
+                last_id = upper
+                if options['pause']:
+                    time.sleep(options['pause'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Copied {copied} rows up to id {max_id}; later rows arrive through the trigger. Next: index."))
+
+    def index(self, options):
+        self.require_prepared()
+        hnsw_options = f"m = {HNSW_INDEX.m}, ef_construction = {HNSW_INDEX.ef_construction}"
+        specs = [
+            ('question_hnsw', f"USING hnsw (question_vector vector_cosine_ops) WITH ({hnsw_options})"),
+            ('plant', "(plant_id)"),
+            ('question_trgm', "USING gin (upper(question_text) gin_trgm_ops)"),
+        ]
+        self.run_sql("SELECT set_config('maintenance_work_mem', %s, false)", [options['maintenance_work_mem']])
+        for suffix, definition in specs:
+            parent = f'{NEW_TABLE}_{suffix}'
+            self.run_sql(f"CREATE INDEX IF NOT EXISTS {parent} ON ONLY {NEW_TABLE} {definition}")
+            attached = set(self.partitions(parent))
+            for partition in tqdm(self.partitions(NEW_TABLE), desc=f"Building {suffix} indexes"):
+                name = f'{partition}_{suffix}'
+                if name in attached:
+                    continue
+                # Concurrent builds keep the partitions writable, one at a time.
+                self.run_sql(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {partition} {definition}")
+                self.run_sql(f"ALTER INDEX {parent} ATTACH PARTITION {name}")
+        self.stdout.write(self.style.SUCCESS("Partition indexes are built and attached. Next: swap."))
+
+    def swap(self, options):
+        self.require_prepared()
+        invalid = self.run_sql(f"""
+            SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+             WHERE c.relname LIKE %s AND NOT i.indisvalid
+        """, [f'{NEW_TABLE}_%'])
+        if invalid or not self.table_exists(f'{NEW_TABLE}_question_hnsw'):
+            raise CommandError("Partition indexes are missing or incomplete; run the index phase first.")
+        # The full comparison runs without the lock, so a gap is found before
+        # anyone waits. Under the lock only ids above the ones it covered are
+        # compared, through the primary key; changes to the verified rows since
+        # then reached the copy through the mirror trigger.
+        verified_max = self.run_sql(f"SELECT coalesce(max(id), 0) FROM {TABLE}")[0][0]
+        self.check_copy()
+        with transaction.atomic():
+            # Readers and writers wait here for the final count and the renames below.
+            self.run_sql(f"LOCK TABLE {TABLE} IN ACCESS EXCLUSIVE MODE")
+            self.check_copy(after_id=verified_max)
+            old_max = self.run_sql(f"SELECT coalesce(max(id), 0) FROM {TABLE}")[0][0]
+            self.run_sql(f"DROP TRIGGER {MIRROR} ON {TABLE}")
+            self.run_sql(f"DROP FUNCTION {MIRROR}()")
+            self.run_sql(f"ALTER TABLE {TABLE} RENAME TO {OLD_TABLE}")
+            self.run_sql(f"ALTER INDEX {HNSW_INDEX.name} RENAME TO {HNSW_INDEX.name}_unpartitioned")
+            self.run_sql(f"ALTER INDEX IF EXISTS {TRIGRAM_INDEX} RENAME TO {TRIGRAM_INDEX}_unpartitioned")
+            self.run_sql(f"ALTER TABLE {NEW_TABLE} RENAME TO {TABLE}")
+            # Keep the index name the model's Meta and migrations refer to.
+            self.run_sql(f"ALTER INDEX {NEW_TABLE}_question_hnsw RENAME TO {HNSW_INDEX.name}")
+            self.run_sql(f"ALTER INDEX {NEW_TABLE}_question_trgm RENAME TO {TRIGRAM_INDEX}")
+            self.run_sql("SELECT setval(%s, %s, true)", [SEQUENCE, max(old_max, 1)])
+        self.stdout.write(self.style.SUCCESS(
+            f"{TABLE} is now partitioned; the previous table is kept as {OLD_TABLE}. "
+            f"Drop it once you are satisfied."))
+
+    def extend(self, options):
+        """
+        Creates upcoming monthly partitions for a range-partitioned table.
+
+        Run it ahead of time (e.g. monthly from cron) so rows land in their
+        month's partition. Rows that already reached the default partition
+        for a month being created are moved into it; that locks the default
+        partition while it is scanned.
+        """
+        table = TABLE if self.partition_key(TABLE) else NEW_TABLE
+        if self.partition_key(table) != 'created_at':
+            raise CommandError("extend only applies to the range strategy.")
+        created = self.create_month_partitions(table, date.today(), options['months_ahead'])
+        self.stdout.write(self.style.SUCCESS(f"Created {created} monthly partitions."))
+
+    def status(self, options):
+        key = self.partition_key(TABLE)
+        if key:
+            self.stdout.write(f"{TABLE} is partitioned on {key} into {len(self.partitions(TABLE))} partitions.")
+            return
+        if not self.table_exists(NEW_TABLE):
+            self.stdout.write(f"{TABLE} is not partitioned.")
+            return
+        old_count, new_count = self.run_sql(
+            f"SELECT (SELECT count(*) FROM {TABLE}), (SELECT count(*) FROM {NEW_TABLE})")[0]
+        self.stdout.write(f"Migration in progress on {self.partition_key(NEW_TABLE)}: "
+                          f"{new_count} of {old_count} rows copied.")
+
+    def abort(self, options):
+        """
+        Drops the mirror trigger and the partitioned copy before a swap.
+        """
+        if self.partition_key(TABLE):
+            raise CommandError(f"{TABLE} is already swapped; {OLD_TABLE} holds the previous table.")
+        with transaction.atomic():
+            self.run_sql(f"DROP TRIGGER IF EXISTS {MIRROR} ON {TABLE}")
+            self.run_sql(f"DROP FUNCTION IF EXISTS {MIRROR}()")
+            self.run_sql(f"DROP TABLE IF EXISTS {NEW_TABLE} CASCADE")
+        self.stdout.write(self.style.SUCCESS(f"Dropped {NEW_TABLE} and the mirror trigger."))
@@ -0,0 +1,170 @@
+import asyncio
+import logging
+import os
+import time
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from openai import AsyncOpenAI
+from tqdm import tqdm
+
+from backend.intents import adapt_question, is_covered, mine_intents, normalize_rows
+from backend.models import PlantData, QAEntry
+from backend.pydanticai import Agent, VectorData
+from backend.retrieval import CONTEXT_TOKEN_BUDGET, retrieve_context
+from backend.utils import batch_by_tokens, estimate_tokens, get_embeddings
+
+logger = logging.getLogger(__name__)
+
+# Matches max_tokens in pydanticai.Agent.run_sync.
+ANSWER_TOKENS = 250
+
+
+class Command(BaseCommand):
+    help = ("Pre-generates answers for the most asked question intents on the most "
+            "popular plants that cannot yet be served from the Q&A cache. Intents "
+            "are mined by clustering QAEntry.question_vector.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sample', type=int, default=20000,
+                            help="Most recent questions used to mine intents.")
+        parser.add_argument('--intents', type=int, default=20,
+                            help="Number of question clusters to fit.")
+        parser.add_argument('--min-cluster-size', type=int, default=3,
+                            help="Ignore intents asked fewer times than this.")
+        parser.add_argument('--plants', type=int, default=50,
+                            help="Number of most popular plants to fill.")
+        parser.add_argument('--threshold', type=float,
+                            default=float(os.environ.get("SIMILARITY_THRESHOLD", 0.75)),
+                            help="Similarity at which an existing answer already covers an intent.")
+        parser.add_argument('--concurrency', type=int, default=4,
+                            help="Agent requests in flight at once.")
+        parser.add_argument('--max-cost', type=float, default=5.0,
+                            help="Stop once the estimated spend reaches this many dollars.")
+        parser.add_argument('--price-per-1k-tokens', type=float, default=0.02,
+                            help="Completion price used for the cost estimate.")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Print the plan and its estimated cost without calling the API.")
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1:
+            raise CommandError("--concurrency must be at least 1.")
+
+        intents = self.load_intents(options)
+        if not intents:
+            self.stdout.write("No question intents found; nothing to pre-generate.")
+            return
+        plants = list(PlantData.objects
+                      .filter(common_name__isnull=False)
+                      .annotate(popularity=Count('qa_entries', distinct=True) + Count('user', distinct=True))
+                      .order_by('-popularity', 'pk')[:options['plants']])
+        jobs = self.plan(intents, plants, options['threshold'])
+
+        budget = self.job_cost(options)
+        jobs = jobs[:int(options['max_cost'] // budget)] if budget else jobs
+        self.stdout.write(f"{len(intents)} intents x {len(plants)} plants: {len(jobs)} answers "
+                          f"to generate, estimated at most ${len(jobs) * budget:.2f}.")
+        if options['dry_run']:
+            for plant, question, _ in jobs:
+                self.stdout.write(f"  {plant.common_name}: {question}")
+            return
+
+        started = time.monotonic()
+        written, failed, spent = self.generate(jobs, options)
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {written} answers, {failed} failed, ~${spent:.2f} spent "
+            f"in {time.monotonic() - started:.1f}s."))
+
+    def load_intents(self, options):
+        rows = list(QAEntry.objects
+                    .filter(question_vector__isnull=False)
+                    .order_by('-created_at')
+                    .values_list('plant_id', 'question_text', 'question_vector')[:options['sample']])
+        if not rows:
+            return []
+        plant_ids, texts, vectors = zip(*rows)
+        return mine_intents(vectors, list(texts), plant_ids, options['intents'],
+                            options['min_cluster_size'])
+
+    def plan(self, intents, plants, threshold):
+        """
+        Lists (plant, question, intent) for intents a plant's cached answers do
+        not cover, most popular plants and intents first.
+        """
+        answered = defaultdict(list)
+        for plant_id, vector in (QAEntry.objects
+                                 .filter(plant__in=plants, question_vector__isnull=False)
+                                 .values_list('plant_id', 'question_vector')
+                                 .iterator(chunk_size=2000)):
+            answered[plant_id].append(vector)
+        answered = {plant_id: normalize_rows(vectors) for plant_id, vectors in answered.items()}
+
+        source_names = {plant.pk: (plant.common_name, plant.scientific_name)
+                        for plant in PlantData.objects.filter(pk__in={i.plant_id for i in intents})}
+        jobs = []
+        for plant in plants:
+            for intent in intents:
+                if is_covered(intent.vector, answered.get(plant.pk), threshold):
+                    continue
+                question = adapt_question(intent.question_text, source_names.get(intent.plant_id, ()),
+                                          plant.common_name)
+                jobs.append((plant, question, intent))
+        jobs.sort(key=lambda job: (job[0].popularity + 1) * job[2].size, reverse=True)
+        return jobs
+
+    def job_cost(self, options):
+        """
+        Upper bound on the cost of one answer: a full context plus the answer.
+        """
+        return (CONTEXT_TOKEN_BUDGET + ANSWER_TOKENS) * options['price_per_1k_tokens'] / 1000
+
+    def generate(self, jobs, options):
+        agent = Agent()
+        client = AsyncOpenAI()
+        written = failed = 0
+        spent = 0.0
+        window_size = options['concurrency'] * 8
+        with asyncio.Runner() as runner, tqdm(total=len(jobs), desc="Pre-generating", unit="answers") as progress:
+            for start in range(0, len(jobs), window_size):
+                window = jobs[start:start + window_size]
+                results = runner.run(self.answer_window(agent, client, window, options['concurrency']))
+                entries = []
+                for (plant, question, _), (vector, answer, tokens) in zip(window, results):
+                    spent += tokens * options['price_per_1k_tokens'] / 1000
+                    if answer is None:
+                        failed += 1
+                        continue
+                    entries.append(QAEntry(plant=plant, question_text=question,
+                                           question_vector=vector, answer_text=answer))
+                # Written per window so an interrupted run keeps what it paid for.
+                QAEntry.objects.bulk_create(entries, batch_size=500)
+                written += len(entries)
+                progress.update(len(window))
+                progress.set_postfix(spent=f"${spent:.2f}", failed=failed)
+        return written, failed, spent
+
+    async def answer_window(self, agent, client, window, concurrency):
+        vectors = {}
+        for batch in batch_by_tokens(list(dict.fromkeys(question for _, question, _ in window))):
+            embeddings = await get_embeddings(batch, client=client)
+            if embeddings is not None:
+                vectors.update(zip(batch, embeddings))
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def answer(plant, question):
+            vector = vectors.get(question)
+            if vector is None:
+                return None, None, 0
+            async with semaphore:
+                context = await retrieve_context(vector, plant)
+                result = await agent.run_sync(VectorData(data=vector), context.plants, question,
+                                              related_answers=context.answers)
+            tokens = context.token_count + estimate_tokens(question) + ANSWER_TOKENS
+            if result.error:
+                logger.warning(f"Failed to pre-generate '{question}' for {plant.common_name}: {result.error}")
+                return vector, None, tokens
+            return vector, result.inference, tokens
+
+        return await asyncio.gather(*(answer(plant, question) for plant, question, _ in window))
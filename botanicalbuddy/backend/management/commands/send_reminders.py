@@ -0,0 +1,60 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from backend.notifications import get_notification_sink
+from backend.reminders import backfill_reminders, next_wakeup, send_due_reminders
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = ("Sends due watering and light reminders. Runs until interrupted, "
+            "sleeping until the next reminder is due; several workers may run "
+            "at once.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help="Reminders claimed per transaction.")
+        parser.add_argument('--max-sleep', type=float, default=60.0,
+                            help="Longest time to sleep between checks, in seconds.")
+        parser.add_argument('--once', action='store_true',
+                            help="Send everything currently due, then exit.")
+        parser.add_argument('--backfill', action='store_true',
+                            help="First create reminders for existing favourite plants.")
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be at least 1.")
+        if options['backfill']:
+            processed = backfill_reminders()
+            self.stdout.write(f"Scheduled reminders for {processed} favourite plants.")
+
+        sink = get_notification_sink()
+        total = 0
+        try:
+            while True:
+                sent = self.drain(sink, options['batch_size'])
+                total += sent
+                if options['once']:
+                    break
+                self.sleep_until_due(options['max_sleep'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f"Sent {total} reminders."))
+
+    def drain(self, sink, batch_size):
+        sent = 0
+        while True:
+            claimed = send_due_reminders(sink, batch_size)
+            sent += claimed
+            if claimed < batch_size:
+                return sent
+
+    def sleep_until_due(self, max_sleep):
+        due_at = next_wakeup()
+        delay = max_sleep if due_at is None else (due_at - timezone.now()).total_seconds()
+        # Rows locked by other workers stay due; don't spin on them.
+        time.sleep(min(max(delay, 1.0), max_sleep))
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.4 on 2026-10-19 11:45
+
+import pgvector.django.indexes
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='plantdata',
+            index=pgvector.django.indexes.HnswIndex(ef_construction=64, fields=['vector_data'], m=16, name='plantdata_vector_hnsw', opclasses=['vector_cosine_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='qaentry',
+            index=pgvector.django.indexes.HnswIndex(ef_construction=64, fields=['question_vector'], m=16, name='qaentry_question_hnsw', opclasses=['vector_cosine_ops']),
+        ),
+    ]
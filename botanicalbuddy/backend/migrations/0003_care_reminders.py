@@ -0,0 +1,31 @@
+# Generated by Django 5.1.4 on 2026-10-19 12:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0002_vector_hnsw_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CareReminder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('watering', 'Watering'), ('light', 'Light check')], max_length=20)),
+                ('interval', models.DurationField()),
+                ('next_due_at', models.DateTimeField()),
+                ('last_sent_at', models.DateTimeField(blank=True, null=True)),
+                ('enabled', models.BooleanField(default=True)),
+                ('plant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='care_reminders', to='backend.plantdata')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='care_reminders', to='backend.user')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('enabled', True)), fields=['next_due_at'], name='carereminder_due_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'plant', 'kind'), name='unique_care_reminder')],
+            },
+        ),
+    ]
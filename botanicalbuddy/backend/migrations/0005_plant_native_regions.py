@@ -0,0 +1,65 @@
+# Generated by Django 5.1.4 on 2026-10-19 12:02
+
+import re
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+# Frozen copies of backend.regions.normalize_region(s) as of this migration,
+# so later changes to the app code cannot change what it writes.
+def normalize_region(name):
+    return re.sub(r'\s+', ' ', str(name)).strip(' .,;').lower()
+
+
+def normalize_regions(native_to):
+    if native_to is None:
+        return []
+    if isinstance(native_to, dict):
+        native_to = native_to.get('native', list(native_to.values()))
+    if isinstance(native_to, str):
+        native_to = native_to.split(',')
+    regions = set()
+    for item in native_to if isinstance(native_to, (list, tuple)) else [native_to]:
+        if isinstance(item, dict):
+            item = item.get('name')
+        if isinstance(item, (list, tuple)):
+            regions.update(normalize_regions(item))
+        elif item is not None and normalize_region(item):
+            regions.add(normalize_region(item))
+    return sorted(regions)
+
+
+def populate_native_regions(apps, schema_editor):
+    PlantData = apps.get_model('backend', 'PlantData')
+    batch = []
+    for plant in (PlantData.objects.filter(native_to__isnull=False)
+                  .only('pk', 'native_to').iterator(chunk_size=2000)):
+        plant.native_regions = normalize_regions(plant.native_to)
+        batch.append(plant)
+        if len(batch) >= 2000:
+            PlantData.objects.bulk_update(batch, ['native_regions'])
+            batch = []
+    PlantData.objects.bulk_update(batch, ['native_regions'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0004_user_taste_profile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='plantdata',
+            name='native_regions',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.CharField(max_length=100), blank=True, default=list, size=None),
+        ),
+        # Filled before the index exists so the GIN index is built once.
+        migrations.RunPython(populate_native_regions, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='plantdata',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['native_regions'], name='plantdata_native_regions_gin'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.1.4 on 2026-10-19 12:03
+
+import django.db.models.deletion
+import pgvector.django.indexes
+import pgvector.django.vector
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0005_plant_native_regions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vectordatabase',
+            name='chunk_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='VectorChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(blank=True, max_length=255)),
+                ('position', models.PositiveIntegerField(default=0)),
+                ('text', models.TextField()),
+                ('embedding', pgvector.django.vector.VectorField(dimensions=1536)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('collection', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='backend.vectordatabase')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='vector_chunks', to='backend.user')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'collection'], name='vectorchunk_user_collection'), pgvector.django.indexes.HnswIndex(ef_construction=64, fields=['embedding'], m=16, name='vectorchunk_embedding_hnsw', opclasses=['vector_cosine_ops'])],
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.1.4 on 2026-10-19 15:10
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0006_vector_chunks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='plantdata',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.1.4 on 2026-10-19 12:18
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+import django.contrib.postgres.operations
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # Concurrent index builds keep the tables writable but cannot run in a transaction.
+    atomic = False
+
+    dependencies = [
+        ('backend', '0007_plantdata_updated_at'),
+    ]
+
+    operations = [
+        django.contrib.postgres.operations.TrigramExtension(),
+        django.contrib.postgres.operations.AddIndexConcurrently(
+            model_name='plantdata',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('common_name'), name='gin_trgm_ops'), name='plantdata_common_name_trgm'),
+        ),
+        django.contrib.postgres.operations.AddIndexConcurrently(
+            model_name='plantdata',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('scientific_name'), name='gin_trgm_ops'), name='plantdata_sci_name_trgm'),
+        ),
+        django.contrib.postgres.operations.AddIndexConcurrently(
+            model_name='plantdata',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('family'), name='gin_trgm_ops'), name='plantdata_family_trgm'),
+        ),
+        django.contrib.postgres.operations.AddIndexConcurrently(
+            model_name='plantdata',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('genus'), name='gin_trgm_ops'), name='plantdata_genus_trgm'),
+        ),
+        django.contrib.postgres.operations.AddIndexConcurrently(
+            model_name='qaentry',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('question_text'), name='gin_trgm_ops'), name='qaentry_question_trgm'),
+        ),
+    ]
@@ -1,7 +1,10 @@
 # backend/models.py
 from django.db import models
 from django.contrib.auth.models import AbstractUser
-from pgvector.django import VectorField
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.db.models.functions import Upper
+from pgvector.django import VectorField, HnswIndex
 from django.core.validators import validate_email, RegexValidator
 
 class User(AbstractUser):
@@ -56,6 +59,8 @@ class PlantData(models.Model):
     maximum_height = models.FloatField(blank=True, null=True)
     flower_color = models.CharField(max_length=255, blank=True, null=True)
     native_to = models.JSONField(blank=True, null=True)
+    # Normalized copy of native_to for indexed region lookups; kept in sync by save()
+    native_regions = ArrayField(models.CharField(max_length=100), default=list, blank=True)
     description = models.TextField(blank=True, null=True)
     care_instructions = models.TextField(blank=True, null=True)
     soil_type = models.CharField(max_length=255, blank=True, null=True)
@@ -65,10 +70,36 @@ class PlantData(models.Model):
     image = models.ImageField(upload_to='plant_images/', blank=True, null=True)
     common_diseases = models.JSONField(blank=True, null=True)
     common_pests = models.JSONField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            HnswIndex(name='plantdata_vector_hnsw', fields=['vector_data'],
+                      m=16, ef_construction=64, opclasses=['vector_cosine_ops']),
+            GinIndex(name='plantdata_native_regions_gin', fields=['native_regions']),
+            # Trigram indexes on UPPER(col) serve the admin's icontains search.
+            GinIndex(OpClass(Upper('common_name'), name='gin_trgm_ops'), name='plantdata_common_name_trgm'),
+            GinIndex(OpClass(Upper('scientific_name'), name='gin_trgm_ops'), name='plantdata_sci_name_trgm'),
+            GinIndex(OpClass(Upper('family'), name='gin_trgm_ops'), name='plantdata_family_trgm'),
+            GinIndex(OpClass(Upper('genus'), name='gin_trgm_ops'), name='plantdata_genus_trgm'),
+        ]
 
     def __str__(self):
         return self.common_name or self.scientific_name or f"Plant ID: {self.trefle_id}"
 
+    def save(self, *args, **kwargs):
+        from .regions import normalize_regions
+
+        self.native_regions = normalize_regions(self.native_to)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            # auto_now only applies to fields that are written
+            update_fields = {*update_fields, 'updated_at'}
+            if 'native_to' in update_fields:
+                update_fields.add('native_regions')
+            kwargs['update_fields'] = update_fields
+        super().save(*args, **kwargs)
+
 class QAEntry(models.Model):
     plant = models.ForeignKey(PlantData, on_delete=models.CASCADE, related_name='qa_entries')
     question_text = models.TextField()
@@ -77,15 +108,110 @@ class QAEntry(models.Model):
     answer_vector = VectorField(dimensions=1536, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            HnswIndex(name='qaentry_question_hnsw', fields=['question_vector'],
+                      m=16, ef_construction=64, opclasses=['vector_cosine_ops']),
+            GinIndex(OpClass(Upper('question_text'), name='gin_trgm_ops'), name='qaentry_question_trgm'),
+        ]
+
     def __str__(self):
         return f"Q&A for {self.plant.common_name}: {self.question_text[:50]}..."
 
+class CareReminder(models.Model):
+    WATERING = 'watering'
+    LIGHT = 'light'
+    KIND_CHOICES = [
+        (WATERING, 'Watering'),
+        (LIGHT, 'Light check'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='care_reminders')
+    plant = models.ForeignKey(PlantData, on_delete=models.CASCADE, related_name='care_reminders')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    interval = models.DurationField()
+    next_due_at = models.DateTimeField()
+    last_sent_at = models.DateTimeField(blank=True, null=True)
+    enabled = models.BooleanField(default=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'plant', 'kind'], name='unique_care_reminder'),
+        ]
+        indexes = [
+            # Workers read due reminders in next_due_at order from this index only.
+            models.Index(fields=['next_due_at'], name='carereminder_due_idx',
+                         condition=models.Q(enabled=True)),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} for {self.plant} ({self.user})"
+
+class UserTasteProfile(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='taste_profile')
+    # Running mean of the favourite plants' vector_data
+    vector = VectorField(dimensions=1536, null=True, blank=True)
+    favorite_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Taste profile for {self.user} ({self.favorite_count} plants)"
+
 class VectorDatabase(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     vector_data = VectorField(dimensions=1536, null=True, blank=True)
     name = models.CharField(max_length=255)
     description = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Kept up to date by ingestion; chooses the search strategy
+    chunk_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name} (by {self.user.username})"
+
+class VectorChunk(models.Model):
+    collection = models.ForeignKey(VectorDatabase, on_delete=models.CASCADE, related_name='chunks')
+    # Denormalized from the collection so searches filter on one index
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='vector_chunks')
+    title = models.CharField(max_length=255, blank=True)
+    position = models.PositiveIntegerField(default=0)
+    text = models.TextField()
+    embedding = VectorField(dimensions=1536)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'collection'], name='vectorchunk_user_collection'),
+            HnswIndex(name='vectorchunk_embedding_hnsw', fields=['embedding'],
+                      m=16, ef_construction=64, opclasses=['vector_cosine_ops']),
+        ]
+
+    def __str__(self):
+        return f"{self.title or 'Untitled'} #{self.position} in {self.collection.name}"
+
+class Conversation(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='conversations')
+    plant = models.ForeignKey(PlantData, on_delete=models.SET_NULL, null=True, blank=True,
+                              related_name='conversations')
+    # Rolling summary of every turn up to and including summarized_through
+    summary = models.TextField(blank=True)
+    summarized_through = models.BigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Conversation {self.pk} with {self.user.username}"
+
+class ConversationTurn(models.Model):
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='turns')
+    question_text = models.TextField()
+    answer_text = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # The newest unsummarized turns are read from this index only.
+            models.Index(fields=['conversation', '-id'], name='conversationturn_recent_idx'),
+        ]
 
     def __str__(self):
-        return f"{self.name} (by {self.user.username})"
\ No newline at end of file
+        return f"Turn {self.pk} of conversation {self.conversation_id}: {self.question_text[:50]}..."
@@ -0,0 +1,52 @@
+import json
+import logging
+import os
+import threading
+from collections import deque
+from dataclasses import asdict, dataclass
+from datetime import datetime
+
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+NOTIFICATION_SINK = os.environ.get("NOTIFICATION_SINK", "backend.notifications.LocalNotificationSink")
+
+
+@dataclass
+class Notification:
+    user_id: int
+    recipient: str
+    plant_id: int
+    plant_name: str
+    kind: str
+    message: str
+    due_at: datetime
+
+
+class LocalNotificationSink:
+    """
+    Keeps the most recent notifications in memory and, if an outbox path is
+    set, appends them to it as JSON lines. Meant for development and tests;
+    production sinks implement the same send() method.
+    """
+
+    def __init__(self, outbox_path=None, keep=1000):
+        self.outbox_path = outbox_path or os.environ.get("NOTIFICATION_OUTBOX")
+        self.sent = deque(maxlen=keep)
+        self._lock = threading.Lock()
+
+    def send(self, notification):
+        with self._lock:
+            self.sent.append(notification)
+            if self.outbox_path:
+                with open(self.outbox_path, 'a') as outbox:
+                    outbox.write(json.dumps(asdict(notification), default=str) + "\n")
+        logger.info(f"Notify {notification.recipient}: {notification.message}")
+
+
+def get_notification_sink():
+    """
+    Instantiates the sink class named by NOTIFICATION_SINK.
+    """
+    return import_string(NOTIFICATION_SINK)()
@@ -0,0 +1,58 @@
+import asyncio
+import hashlib
+
+import numpy as np
+
+from .pydanticai import InferenceResult
+
+EMBEDDING_DIMENSIONS = 1536
+
+
+class OfflineAgent:
+    """
+    Stand-in for pydanticai.Agent that answers after a fixed delay without
+    calling OpenAI. Used by the load-testing harness and local benchmarks.
+    """
+
+    def __init__(self, latency=0.8, system_message="You are a helpful botanical assistant."):
+        self.latency = latency
+        self.system_message = system_message
+
+    async def run_sync(self, query_vector, plant_data, user_query="", related_answers=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        plant = plant_data[0].plant_name if plant_data else "this plant"
+        return InferenceResult(inference=f"Offline answer about {plant}: {user_query}",
+                               system_message=self.system_message)
+
+
+def offline_vector(text):
+    """
+    Returns a deterministic unit vector for text, so equal texts embed equally.
+    """
+    seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(EMBEDDING_DIMENSIONS)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+def make_offline_embedding(latency=0.05):
+    """
+    Builds a stand-in for utils.get_embedding with the given network latency.
+    """
+    async def get_embedding(text, model="text-embedding-ada-002"):
+        await asyncio.sleep(latency)
+        return offline_vector(text)
+
+    return get_embedding
+
+
+def make_offline_image_prediction(latency=0.3):
+    """
+    Builds a stand-in for inference.predict_image that answers after the
+    given model latency.
+    """
+    async def predict(image):
+        await asyncio.sleep(latency)
+        return {'disease_label': "powdery mildew", 'disease_probability': 0.91,
+                'pest_label': "aphids", 'pest_probability': 0.12}
+
+    return predict
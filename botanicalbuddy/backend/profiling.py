@@ -0,0 +1,365 @@
+"""
+Opt-in sampling profiler for individual requests.
+
+A request is profiled when it carries a valid signed `X-Profile` header (see
+make_profile_token), when it is picked by PROFILE_SAMPLE_RATE, or when it is
+still running PROFILE_SLOW_THRESHOLD seconds after it started. In the last
+case only the remainder of the request is sampled.
+
+One shared sampler thread reads sys._current_frames() every PROFILE_INTERVAL
+seconds. For async views it records the await chain of the request's task,
+so time spent waiting on I/O is visible; for sync views it records the
+request thread. Threads running asgiref sync_to_async/async_to_sync work are
+recorded under their own root, since they may be serving other requests as
+well. Views mark their phases with stage(), which tags samples and records
+stage timings.
+
+Each profile is written to PROFILE_OUTPUT_DIR as <request id>.collapsed
+(for flamegraph.pl / inferno), <request id>.speedscope.json and
+<request id>.meta.json. With every trigger disabled the middleware only
+reads one header.
+"""
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core import signing
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_SALT = 'backend.profiling'
+SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", 0))
+SLOW_THRESHOLD = float(os.environ.get("PROFILE_SLOW_THRESHOLD", 0))
+SAMPLE_INTERVAL = float(os.environ.get("PROFILE_INTERVAL", 0.005))
+TOKEN_MAX_AGE = int(os.environ.get("PROFILE_TOKEN_MAX_AGE", 3600))
+OUTPUT_DIR = os.environ.get("PROFILE_OUTPUT_DIR")
+
+_active_profile = contextvars.ContextVar('active_profile', default=None)
+
+
+def make_profile_token():
+    """
+    Returns a value for the X-Profile header, valid for PROFILE_TOKEN_MAX_AGE
+    seconds. Mint one with `manage.py shell -c "from backend.profiling import
+    make_profile_token; print(make_profile_token())"`.
+    """
+    return signing.TimestampSigner(salt=PROFILE_SALT).sign(uuid.uuid4().hex)
+
+
+def is_valid_token(token):
+    try:
+        signing.TimestampSigner(salt=PROFILE_SALT).unsign(token, max_age=TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return False
+    return True
+
+
+@contextmanager
+def stage(name):
+    """
+    Marks a phase of the current request, e.g. `with stage("retrieval"):`.
+    Does nothing unless the request is being profiled.
+    """
+    profile = _active_profile.get()
+    if profile is None:
+        yield
+        return
+    started = time.perf_counter()
+    profile.stage_stack.append(name)
+    try:
+        yield
+    finally:
+        profile.stage_stack.pop()
+        profile.stages.append((name, started - profile.started, time.perf_counter() - profile.started))
+
+
+def _frame_key(frame):
+    code = frame.f_code
+    filename = "/".join(Path(code.co_filename).parts[-2:])
+    return getattr(code, 'co_qualname', code.co_name), filename, code.co_firstlineno
+
+
+def thread_stack(frame):
+    stack = []
+    while frame is not None:
+        stack.append(_frame_key(frame))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+def task_stack(task):
+    """
+    Follows a task's chain of awaited coroutines from the outermost inwards.
+    """
+    stack = []
+    coro = task.get_coro()
+    while coro is not None:
+        frame = getattr(coro, 'cr_frame', None) or getattr(coro, 'gi_frame', None)
+        if frame is None:
+            break
+        stack.append(_frame_key(frame))
+        coro = getattr(coro, 'cr_await', None) or getattr(coro, 'gi_yieldfrom', None)
+    return stack
+
+
+def is_asgiref_thread(frame):
+    while frame is not None:
+        if frame.f_code.co_filename.endswith(os.path.join('asgiref', 'sync.py')):
+            return True
+        frame = frame.f_back
+    return False
+
+
+class RequestProfile:
+    def __init__(self, request_id, label, trigger, delay=0.0, task=None):
+        self.request_id = request_id
+        self.label = label
+        self.trigger = trigger
+        self.started = time.perf_counter()
+        self.start_at = self.started + delay
+        self.thread_id = threading.get_ident()
+        self.task = task
+        self.samples = Counter()
+        self.sample_count = 0
+        self.stages = []
+        self.stage_stack = []
+
+    def record(self, frames, helper_threads):
+        if self.task is not None:
+            stack = task_stack(self.task)
+        elif self.thread_id in frames:
+            stack = thread_stack(frames[self.thread_id])
+        else:
+            return
+        stage_name = self.stage_stack[-1] if self.stage_stack else None
+        root = ('request', f"stage:{stage_name}" if stage_name else None)
+        self.samples[(root, tuple(stack))] += 1
+        for ident, frame in helper_threads.items():
+            if ident != self.thread_id:
+                self.samples[(('sync threads', f"thread:{ident}"), tuple(thread_stack(frame)))] += 1
+        self.sample_count += 1
+
+
+class StackSampler:
+    """
+    A single daemon thread that samples every active profile. It sleeps on a
+    condition while nothing is being profiled.
+    """
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self._profiles = set()
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def add(self, profile):
+        with self._condition:
+            self._profiles.add(profile)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def remove(self, profile):
+        with self._condition:
+            self._profiles.discard(profile)
+
+    def _run(self):
+        own = threading.get_ident()
+        while True:
+            with self._condition:
+                while not self._profiles:
+                    self._condition.wait()
+                profiles = list(self._profiles)
+            now = time.perf_counter()
+            due = [profile for profile in profiles if now >= profile.start_at]
+            if due:
+                frames = sys._current_frames()
+                helpers = {ident: frame for ident, frame in frames.items()
+                           if ident != own and is_asgiref_thread(frame)}
+                for profile in due:
+                    try:
+                        profile.record(frames, helpers)
+                    except Exception as e:  # The task or thread may finish mid-sample.
+                        logger.debug(f"Skipped a profiler sample: {e}")
+            time.sleep(self.interval)
+
+
+sampler = StackSampler()
+
+
+def _frame_name(frame):
+    name, filename, line = frame
+    return f"{name} ({filename}:{line})"
+
+
+def to_collapsed(profile):
+    lines = []
+    for (root, stack), count in sorted(profile.samples.items(), key=lambda item: -item[1]):
+        names = [f"{root[0]} {profile.label}"] + [r for r in root[1:] if r] + [_frame_name(f) for f in stack]
+        lines.append(f"{';'.join(name.replace(';', ':') for name in names)} {count}")
+    return "\n".join(lines) + "\n"
+
+
+def to_speedscope(profile, duration):
+    frames, index = [], {}
+
+    def frame_id(name, file=None, line=None):
+        key = (name, file, line)
+        if key not in index:
+            index[key] = len(frames)
+            frames.append({'name': name, **({'file': file, 'line': line} if file else {})})
+        return index[key]
+
+    sampled = {}
+    for (root, stack), count in profile.samples.items():
+        entry = sampled.setdefault(root[0], {'samples': [], 'weights': []})
+        ids = [frame_id(r) for r in root[1:] if r] + [frame_id(*f) for f in stack]
+        entry['samples'].append(ids)
+        entry['weights'].append(count * sampler.interval)
+    profiles = [{
+        'type': 'sampled', 'name': f"{name} {profile.label} [{profile.request_id}]",
+        'unit': 'seconds', 'startValue': 0, 'endValue': duration, **entry,
+    } for name, entry in sampled.items()]
+
+    events = []
+    for name, start, end in sorted(profile.stages, key=lambda s: (s[1], -s[2])):
+        events.append((start, 1, frame_id(f"stage:{name}")))
+        events.append((end, 0, frame_id(f"stage:{name}")))
+    events.sort(key=lambda event: (event[0], event[1]))
+    open_stack, nested = [], True
+    for _, opening, frame in events:
+        if opening:
+            open_stack.append(frame)
+        elif not open_stack or open_stack.pop() != frame:
+            nested = False
+            break
+    # Speedscope rejects evented profiles whose events overlap without nesting.
+    if events and nested:
+        profiles.append({
+            'type': 'evented', 'name': f"stages [{profile.request_id}]", 'unit': 'seconds',
+            'startValue': 0, 'endValue': duration,
+            'events': [{'type': 'O' if opening else 'C', 'frame': frame, 'at': at}
+                       for at, opening, frame in events],
+        })
+    return {
+        '$schema': 'https://www.speedscope.app/file-format-schema.json',
+        'name': f"{profile.label} [{profile.request_id}]",
+        'exporter': 'botanicalbuddy.backend.profiling',
+        'shared': {'frames': frames},
+        'profiles': profiles,
+    }
+
+
+def write_profile(profile, duration, status_code):
+    output_dir = Path(OUTPUT_DIR or Path(settings.BASE_DIR) / 'profiles')
+    output_dir.mkdir(parents=True, exist_ok=True)
+    base = output_dir / profile.request_id
+    Path(f"{base}.collapsed").write_text(to_collapsed(profile))
+    Path(f"{base}.speedscope.json").write_text(json.dumps(to_speedscope(profile, duration)))
+    meta = {
+        'request_id': profile.request_id, 'request': profile.label, 'trigger': profile.trigger,
+        'status': status_code, 'duration': duration, 'samples': profile.sample_count,
+        'sampling_started_after': profile.start_at - profile.started,
+        'interval': sampler.interval,
+        'stages': [{'name': name, 'start': start, 'duration': end - start}
+                   for name, start, end in profile.stages],
+    }
+    Path(f"{base}.meta.json").write_text(json.dumps(meta, indent=2))
+    return base
+
+
+class ProfilingMiddleware:
+    """
+    Profiles requests selected by the signed header, the sampling rate or the
+    slow-request threshold. Place it first in MIDDLEWARE.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def start_profile(self, request, task=None):
+        token = request.headers.get(PROFILE_HEADER)
+        delay = 0.0
+        if token and is_valid_token(token):
+            trigger = 'header'
+        elif SAMPLE_RATE and random.random() < SAMPLE_RATE:
+            trigger = 'sampled'
+        elif SLOW_THRESHOLD:
+            trigger, delay = 'slow', SLOW_THRESHOLD
+        else:
+            if token:
+                logger.warning(f"Ignoring invalid {PROFILE_HEADER} header on {request.path}.")
+            return None
+        request_id = re.sub(r'[^A-Za-z0-9_-]', '', request.headers.get('X-Request-ID', ''))[:64]
+        profile = RequestProfile(request_id or uuid.uuid4().hex, f"{request.method} {request.path}",
+                                 trigger, delay=delay, task=task)
+        sampler.add(profile)
+        return profile
+
+    def finish_profile(self, profile, response):
+        sampler.remove(profile)
+        duration = time.perf_counter() - profile.started
+        if not profile.sample_count:
+            return
+        status_code = getattr(response, 'status_code', None)
+        try:
+            base = write_profile(profile, duration, status_code)
+        except OSError as e:
+            logger.error(f"Failed to write profile {profile.request_id}: {e}")
+            return
+        stages = ", ".join(f"{name}={(end - start) * 1000:.0f}ms" for name, start, end in profile.stages)
+        logger.info(f"Profiled {profile.label} ({profile.trigger}, {duration * 1000:.0f}ms) "
+                    f"[{stages}] -> {base}.*")
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        profile = self.start_profile(request)
+        if profile is None:
+            return self.get_response(request)
+        token = _active_profile.set(profile)
+        response = None
+        try:
+            response = self.get_response(request)
+        finally:
+            _active_profile.reset(token)
+            self.finish_profile(profile, response)
+        if profile.sample_count:
+            response['X-Profile-Id'] = profile.request_id
+        return response
+
+    async def __acall__(self, request):
+        profile = self.start_profile(request, task=asyncio.current_task())
+        if profile is None:
+            return await self.get_response(request)
+        token = _active_profile.set(profile)
+        response = None
+        try:
+            response = await self.get_response(request)
+        finally:
+            _active_profile.reset(token)
+            await asyncio.to_thread(self.finish_profile, profile, response)
+        if profile.sample_count:
+            response['X-Profile-Id'] = profile.request_id
+        return response
@@ -1,6 +1,7 @@
 from typing import List, Optional
 from pydantic import BaseModel, field_validator
 import openai
+from openai import AsyncOpenAI
 import os
 import logging
 
@@ -17,13 +18,13 @@ class VectorData(BaseModel):
 
 class PlantData(BaseModel):
     plant_name: str
-    scientific_name: str = None
-    description: str = None
-    care_instructions: str = None
-    soil_type: str = None
-    water_requirements: str = None
-    sunlight_requirements: str = None
-    vector_data: List[float] = None
+    scientific_name: Optional[str] = None
+    description: Optional[str] = None
+    care_instructions: Optional[str] = None
+    soil_type: Optional[str] = None
+    water_requirements: Optional[str] = None
+    sunlight_requirements: Optional[str] = None
+    vector_data: Optional[List[float]] = None
     similarity: Optional[float] = None
 
     @field_validator('plant_name')
@@ -32,11 +33,69 @@ class PlantData(BaseModel):
             raise ValueError(f"Field 'plant_name' is required.")
         return v
 
+    def to_prompt(self) -> str:
+        """Renders the plant as the block of lines used in agent prompts."""
+        return (
+            f"- Common Name: {self.plant_name or 'N/A'}\n"
+            f"- Scientific Name: {self.scientific_name or 'N/A'}\n"
+            f"- Description: {self.description or 'N/A'}\n"
+            f"- Care Instructions: {self.care_instructions or 'N/A'}\n"
+            f"- Soil Type: {self.soil_type or 'N/A'}\n"
+            f"- Water Requirements: {self.water_requirements or 'N/A'}\n"
+            f"- Sunlight Requirements: {self.sunlight_requirements or 'N/A'}"
+        )
+
+class RelatedAnswer(BaseModel):
+    question_text: str
+    answer_text: str
+    similarity: Optional[float] = None
+
+    def to_prompt(self) -> str:
+        """Renders the Q&A pair as the block of lines used in agent prompts."""
+        return f"- Q: {self.question_text}\n  A: {self.answer_text}"
+
+class UserNote(BaseModel):
+    title: str = ""
+    text: str
+    similarity: Optional[float] = None
+
+    def to_prompt(self) -> str:
+        """Renders the note as the block of lines used in agent prompts."""
+        return f"- {self.title + ': ' if self.title else ''}{self.text}"
+
+class ChatTurn(BaseModel):
+    question_text: str
+    answer_text: str
+
+    def to_prompt(self) -> str:
+        """Renders the exchange as the block of lines used in agent prompts."""
+        return f"User: {self.question_text}\nAssistant: {self.answer_text}"
+
+class ConversationHistory(BaseModel):
+    summary: str = ""
+    turns: List[ChatTurn] = []
+    token_count: int = 0
+
+    def to_prompt(self) -> str:
+        """Renders the summary and the recent turns, oldest first."""
+        parts = [f"Summary of earlier turns: {self.summary}"] if self.summary else []
+        parts.extend(t.to_prompt() for t in self.turns)
+        return "\n".join(parts)
+
 class InferenceResult(BaseModel):
     inference: str
     system_message: str = ""
     temperature: int = 0
     top_k: int = 0
+    error: Optional[str] = None
+    retry_after: Optional[float] = None
+
+def retry_after_seconds(error) -> Optional[float]:
+    """Reads the Retry-After header of an OpenAI error response, if it has one."""
+    try:
+        return float(error.response.headers["retry-after"])
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return None
 
 class Agent:
     def __init__(self):
@@ -45,11 +104,16 @@ class Agent:
             raise ValueError("OPENAI_API_KEY environment variable not found.")
 
         self.system_message = os.environ.get("OPENAI_SYSTEM_MESSAGE", "You are a helpful botanical assistant.")
-        openai.api_key = self.openai_api_key
+        self.model = os.environ.get("OPENAI_CHAT_MODEL", "gpt-4o-mini")
+        self.client = AsyncOpenAI(api_key=self.openai_api_key)
 
-    async def run_sync(self, query_vector: VectorData, plant_data: List[PlantData], user_query: str = "") -> InferenceResult:
+    async def run_sync(self, query_vector: VectorData, plant_data: List[PlantData], user_query: str = "",
+                       related_answers: Optional[List[RelatedAnswer]] = None,
+                       user_notes: Optional[List[UserNote]] = None,
+                       history: Optional[ConversationHistory] = None) -> InferenceResult:
         try:
-            most_similar_plant = max(plant_data, key=lambda p: p.similarity) if plant_data else None
+            ranked_plants = sorted(plant_data, key=lambda p: p.similarity or 0.0, reverse=True)
+            most_similar_plant = ranked_plants[0] if ranked_plants else None
 
             if most_similar_plant:
                 plant = most_similar_plant
@@ -63,41 +127,45 @@ class Agent:
                 else:
                     instructions = "Provide general information about this plant."
 
-                prompt = f"""
-                Plant Information:
-                - Common Name: {plant.plant_name or "N/A"}
-                - Scientific Name: {plant.scientific_name or "N/A"}
-                - Description: {plant.description or "N/A"}
-                - Care Instructions: {plant.care_instructions or "N/A"}
-                - Soil Type: {plant.soil_type or "N/A"}
-                - Water Requirements: {plant.water_requirements or "N/A"}
-                - Sunlight Requirements: {plant.sunlight_requirements or "N/A"}
-
-                User Query: {user_query}
-
-                {instructions}
-                """
-
-                response = await openai.Completion.acreate(
-                    model="text-davinci-003",  # Or your preferred model
-                    prompt=prompt,
+                sections = [f"Plant Information:\n{plant.to_prompt()}"]
+                if len(ranked_plants) > 1:
+                    related = "\n\n".join(p.to_prompt() for p in ranked_plants[1:])
+                    sections.append(f"Related Plants:\n{related}")
+                if related_answers:
+                    answers = "\n".join(a.to_prompt() for a in related_answers)
+                    sections.append(f"Previously Answered Questions:\n{answers}")
+                if user_notes:
+                    notes = "\n".join(n.to_prompt() for n in user_notes)
+                    sections.append(f"The User's Garden Notes:\n{notes}")
+                if history and (history.summary or history.turns):
+                    sections.append(f"Conversation So Far:\n{history.to_prompt()}")
+                sections.append(f"User Query: {user_query}")
+                sections.append(instructions)
+                prompt = "\n\n".join(sections)
+
+                response = await self.client.chat.completions.create(
+                    model=self.model,
+                    messages=[{"role": "system", "content": self.system_message},
+                              {"role": "user", "content": prompt}],
                     max_tokens=250,
                 )
-                inference = response.choices[0].text.strip()
+                inference = response.choices[0].message.content.strip()
             else:
                 inference = "No similar plants found."
 
             return InferenceResult(inference=inference, system_message=self.system_message)
 
-        except openai.APIError as e:
-            logger.error(f"OpenAI API error: {e}")
-            return InferenceResult(inference=f"An OpenAI API error occurred: {e}", system_message=self.system_message)
+        # RateLimitError is an APIError, so it has to be caught first. The
+        # error text is logged only; callers map `error` to their own message.
         except openai.RateLimitError as e:
             logger.error(f"OpenAI API rate limit exceeded: {e}")
-            return InferenceResult(inference="OpenAI API rate limit exceeded.", system_message=self.system_message)
-        except openai.InvalidRequestError as e:
-            logger.error(f"Invalid OpenAI API request: {e}")
-            return InferenceResult(inference="Invalid OpenAI API request.", system_message=self.system_message)
+            return InferenceResult(inference="OpenAI API rate limit exceeded.", system_message=self.system_message,
+                                   error="rate_limit", retry_after=retry_after_seconds(e))
+        except openai.APIError as e:
+            logger.error(f"OpenAI API error: {e}")
+            return InferenceResult(inference="An OpenAI API error occurred.", system_message=self.system_message,
+                                   error="api_error")
         except Exception as e:
             logger.exception(f"An unexpected error occurred: {e}") # Log full traceback
-            return InferenceResult(inference=f"An unexpected error occurred: {e}", system_message=self.system_message)
\ No newline at end of file
+            return InferenceResult(inference="An unexpected error occurred.", system_message=self.system_message,
+                                   error="unexpected")
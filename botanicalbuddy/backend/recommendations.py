@@ -0,0 +1,143 @@
+import logging
+import os
+
+import numpy as np
+from django.db import connections, router, transaction
+from django.db.models import Count, Q
+from pgvector.django import CosineDistance
+
+from .models import PlantData, User, UserTasteProfile
+from .regions import normalize_region
+
+logger = logging.getLogger(__name__)
+
+RECOMMENDATION_TOP_K = int(os.environ.get("RECOMMENDATION_TOP_K", 10))
+# Candidates the HNSW scan visits; raised so filtered queries still fill top-k.
+RECOMMENDATION_EF_SEARCH = int(os.environ.get("RECOMMENDATION_EF_SEARCH", 200))
+
+
+def running_mean(mean, count, vector, sign):
+    """
+    Adds (sign=1) or removes (sign=-1) one vector from a running mean.
+
+    Args:
+        mean (array-like): The current mean, or None when count is 0.
+        count (int): Number of vectors in the mean.
+        vector (array-like): The vector to add or remove.
+        sign (int): 1 to add, -1 to remove.
+
+    Returns:
+        tuple: (new mean or None, new count).
+    """
+    vector = np.asarray(vector, dtype=np.float64)
+    new_count = count + sign
+    if new_count <= 0:
+        return None, 0
+    if mean is None or count == 0:
+        return vector, new_count
+    mean = np.asarray(mean, dtype=np.float64)
+    return (mean * count + sign * vector) / new_count, new_count
+
+
+def update_taste_profile(user_id, plant_ids, sign):
+    """
+    Folds favourites that were just added or removed into the user's profile.
+    Only the changed plants are read, so the cost does not grow with the
+    number of favourites.
+    """
+    vectors = list(PlantData.objects.filter(pk__in=plant_ids, vector_data__isnull=False)
+                   .values_list('vector_data', flat=True))
+    if not vectors:
+        return
+    with transaction.atomic():
+        profile, _ = UserTasteProfile.objects.select_for_update().get_or_create(user_id=user_id)
+        mean, count = profile.vector, profile.favorite_count
+        for vector in vectors:
+            if sign < 0 and count == 0:
+                # Out of step with the favourites (e.g. vectors added after
+                # favouriting); start again from the current favourites.
+                return rebuild_taste_profile(user_id)
+            mean, count = running_mean(mean, count, vector, sign)
+        profile.vector = None if mean is None else mean.tolist()
+        profile.favorite_count = count
+        profile.save(update_fields=['vector', 'favorite_count', 'updated_at'])
+
+
+def rebuild_taste_profile(user_id):
+    """
+    Recomputes a profile from all of the user's favourites.
+    """
+    vectors = [np.asarray(v) for v in PlantData.objects
+               .filter(user__pk=user_id, vector_data__isnull=False)
+               .values_list('vector_data', flat=True)]
+    UserTasteProfile.objects.update_or_create(user_id=user_id, defaults={
+        'vector': np.mean(vectors, axis=0).tolist() if vectors else None,
+        'favorite_count': len(vectors),
+    })
+
+
+def catalog_filters(light=None, location=None):
+    """
+    Builds plant filters from a light preference (comma separated, e.g.
+    "full sun, partial shade") and a native region, matched exactly after
+    normalization as in search_native_plants.
+    """
+    filters = Q()
+    terms = [term.strip() for term in (light or "").split(',') if term.strip()]
+    if terms:
+        light_filter = Q()
+        for term in terms:
+            light_filter |= Q(sunlight_requirements__icontains=term)
+        filters &= light_filter
+    if location:
+        # native_regions @> ARRAY[region] is answered by its GIN index.
+        filters &= Q(native_regions__contains=[normalize_region(location)])
+    return filters
+
+
+def recommend_plants(user, k=RECOMMENDATION_TOP_K, light=None, location=None):
+    """
+    Returns up to k plants nearest to the user's taste profile that are not
+    already favourites, optionally filtered by light and native region.
+    Users without a profile get the most favourited matching plants. When
+    the region filter leaves nothing, the region is dropped rather than
+    returning no recommendations.
+    """
+    if not UserTasteProfile.objects.filter(user=user).exists() and user.favorite_plants.exists():
+        # Favourites saved before profiles existed are folded in on first use.
+        rebuild_taste_profile(user.pk)
+    profile = UserTasteProfile.objects.filter(user=user, vector__isnull=False).first()
+    results = nearest_plants(user, profile, k, catalog_filters(light, location))
+    if not results and location:
+        logger.info(f"No recommendations native to {location!r}; ignoring the region")
+        results = nearest_plants(user, profile, k, catalog_filters(light))
+    return results
+
+
+def nearest_plants(user, profile, k, filters):
+    """
+    Returns up to k plants matching filters that are not favourites, nearest
+    to the profile first, or the most favourited first without a profile.
+    """
+    plants = (PlantData.objects
+              .filter(filters)
+              .exclude(pk__in=user.favorite_plants.values('pk')))
+    fields = ('id', 'common_name', 'scientific_name', 'image_url', 'sunlight_requirements')
+    if profile is None:
+        popular = (plants.annotate(favorites=Count('user'))
+                   .order_by('-favorites', 'pk').values(*fields)[:k])
+        return [dict(plant, similarity=None) for plant in popular]
+
+    # ef_search is set per transaction, so the query runs on the same database.
+    db = router.db_for_read(PlantData)
+    nearest = (plants.using(db).filter(vector_data__isnull=False)
+               .annotate(distance=CosineDistance('vector_data', profile.vector))
+               .order_by('distance')
+               .values(*fields, 'distance')[:k])
+    with transaction.atomic(using=db):
+        if connections[db].vendor == 'postgresql':
+            with connections[db].cursor() as cursor:
+                cursor.execute("SELECT set_config('hnsw.ef_search', %s, true)",
+                               [str(max(RECOMMENDATION_EF_SEARCH, k))])
+        rows = list(nearest)
+    return [{**{f: row[f] for f in fields}, 'similarity': 1.0 - row['distance']} for row in rows]
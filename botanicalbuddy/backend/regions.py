@@ -0,0 +1,135 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+REGION_CACHE_TTL = int(os.environ.get("REGION_CACHE_TTL", 600))
+CATALOG_VERSION_KEY = 'plant_catalog_version'
+# Seconds between checks of the shared catalog version by in-memory indexes.
+CATALOG_CHECK_INTERVAL = float(os.environ.get("CATALOG_CHECK_INTERVAL", 5))
+
+
+def normalize_region(name):
+    """
+    Normalizes a region name for exact matching: lower case, single spaces,
+    no surrounding punctuation ("  South-East Asia." -> "south-east asia").
+    """
+    return re.sub(r'\s+', ' ', str(name)).strip(' .,;').lower()
+
+
+def normalize_regions(native_to):
+    """
+    Flattens the shapes native_to is stored in into a sorted list of
+    normalized region names.
+
+    Args:
+        native_to: None, a string ("Europe, Western Asia"), a list of
+            strings, a list of objects with a "name", or a dict such as
+            Trefle's distribution ({"native": [...], "introduced": [...]}),
+            of which only "native" is used when present.
+
+    Returns:
+        list: Unique normalized region names.
+    """
+    if native_to is None:
+        return []
+    if isinstance(native_to, dict):
+        native_to = native_to.get('native', list(native_to.values()))
+    if isinstance(native_to, str):
+        native_to = native_to.split(',')
+    regions = set()
+    for item in native_to if isinstance(native_to, (list, tuple)) else [native_to]:
+        if isinstance(item, dict):
+            item = item.get('name')
+        if isinstance(item, (list, tuple)):
+            regions.update(normalize_regions(item))
+        elif item is not None and normalize_region(item):
+            regions.add(normalize_region(item))
+    return sorted(regions)
+
+
+def catalog_version():
+    return cache.get_or_set(CATALOG_VERSION_KEY, 1, timeout=None)
+
+
+def bump_catalog_version():
+    """
+    Invalidates every cached catalog query by moving to a new key version.
+    """
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        cache.set(CATALOG_VERSION_KEY, 2, timeout=None)
+
+
+class CatalogWatcher:
+    """
+    Notices catalog changes made by any process, for indexes held in memory.
+
+    Signals only reach the process that saved a plant, so other processes
+    compare the shared catalog version with the last one they saw, at most
+    every `interval` seconds.
+    """
+
+    def __init__(self, interval=CATALOG_CHECK_INTERVAL):
+        self.interval = interval
+        self.version = None
+        self.checked_at = None
+
+    def due(self):
+        return self.checked_at is None or time.monotonic() - self.checked_at >= self.interval
+
+    def changed(self):
+        """
+        Reads the shared version; True on the first call and whenever it moved since.
+        """
+        self.checked_at = time.monotonic()
+        version = catalog_version()
+        changed, self.version = version != self.version, version
+        return changed
+
+
+def region_cache_key(params):
+    digest = hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()[:32]
+    return f"native_plants:{catalog_version()}:{digest}"
+
+
+def search_native_plants(queryset, region, filters, limit, offset, fields):
+    """
+    Returns the plants native to `region` that match the other catalog
+    filters, served from cache while the catalog is unchanged.
+
+    The region lookup uses native_regions @> ARRAY[region], which the GIN
+    index on native_regions answers without reading native_to.
+
+    Args:
+        queryset (QuerySet): PlantData queryset to search.
+        region (str): The region name; normalized before matching.
+        filters (dict): Additional field lookups, e.g. {'family__iexact': 'Rosaceae'}.
+        limit (int): Page size.
+        offset (int): Page start.
+        fields (tuple): Fields to return for each plant.
+
+    Returns:
+        dict: {'region', 'count', 'results'}.
+    """
+    region = normalize_region(region)
+    key = region_cache_key({'region': region, 'filters': filters, 'limit': limit,
+                            'offset': offset, 'fields': fields})
+    result = cache.get(key)
+    if result is not None:
+        return result
+    matches = queryset.filter(native_regions__contains=[region], **filters)
+    result = {
+        'region': region,
+        'count': matches.count(),
+        'results': list(matches.order_by('common_name', 'pk').values(*fields)[offset:offset + limit]),
+    }
+    cache.set(key, result, REGION_CACHE_TTL)
+    return result
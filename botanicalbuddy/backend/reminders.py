@@ -0,0 +1,212 @@
+import logging
+import os
+import re
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import CareReminder, User
+from .notifications import Notification
+
+logger = logging.getLogger(__name__)
+
+RETRY_DELAY = timedelta(seconds=int(os.environ.get("REMINDER_RETRY_DELAY", 300)))
+
+# Keyword -> days between waterings, checked in order.
+WATERING_KEYWORDS = [
+    (('aquatic', 'wet', 'boggy', 'high', 'frequent', 'moist'), 2),
+    (('moderate', 'medium', 'average', 'regular'), 7),
+    (('drought', 'dry', 'low', 'minimal', 'sparing', 'infrequent'), 14),
+]
+# Keyword -> days between light checks (rotating the pot, moving it).
+LIGHT_KEYWORDS = [
+    (('full sun', 'direct'), 14),
+    (('partial', 'part shade', 'indirect', 'bright'), 21),
+    (('shade', 'low light'), 30),
+]
+DEFAULT_INTERVAL_DAYS = {CareReminder.WATERING: 7, CareReminder.LIGHT: 21}
+
+MESSAGES = {
+    CareReminder.WATERING: "Time to water your {plant}.",
+    CareReminder.LIGHT: "Check the light for your {plant}: rotate it or move it if it is stretching.",
+}
+
+
+def interval_from_text(text, keywords, default_days):
+    """
+    Derives a reminder interval from a free-text requirement such as
+    "Keep soil moist", "every 10 days" or "Full sun".
+
+    Args:
+        text (str): The plant's requirement text; may be empty.
+        keywords (list): (keywords, days) pairs, checked in order.
+        default_days (int): Interval when nothing matches.
+
+    Returns:
+        timedelta: The interval between reminders.
+    """
+    text = (text or "").lower()
+    explicit = re.search(r'(\d+)\s*(day|week)', text)
+    if explicit:
+        days = int(explicit.group(1)) * (7 if explicit.group(2) == 'week' else 1)
+        return timedelta(days=max(days, 1))
+    for words, days in keywords:
+        if any(re.search(rf'\b{re.escape(word)}\b', text) for word in words):
+            return timedelta(days=days)
+    return timedelta(days=default_days)
+
+
+def reminder_interval(plant, kind):
+    if kind == CareReminder.WATERING:
+        return interval_from_text(plant.water_requirements, WATERING_KEYWORDS,
+                                  DEFAULT_INTERVAL_DAYS[kind])
+    return interval_from_text(plant.sunlight_requirements, LIGHT_KEYWORDS, DEFAULT_INTERVAL_DAYS[kind])
+
+
+def kind_enabled(preferences, kind):
+    """
+    Reads notification_preferences, e.g. {"reminders": true, "watering": false,
+    "quiet_hours": {"start": 22, "end": 7}}. Everything is on by default.
+    """
+    preferences = preferences or {}
+    return bool(preferences.get('reminders', True)) and bool(preferences.get(kind, True))
+
+
+def apply_quiet_hours(due_at, preferences):
+    """
+    Moves a due time that falls within the user's quiet hours (UTC, start
+    inclusive, end exclusive, may wrap midnight) to the end of them.
+    """
+    quiet = (preferences or {}).get('quiet_hours')
+    if not quiet:
+        return due_at
+    start, end = int(quiet.get('start', 0)) % 24, int(quiet.get('end', 0)) % 24
+    hour = due_at.hour
+    inside = start <= hour < end if start <= end else (hour >= start or hour < end)
+    if not inside:
+        return due_at
+    resume = due_at.replace(hour=end, minute=0, second=0, microsecond=0)
+    return resume if resume > due_at else resume + timedelta(days=1)
+
+
+def next_due(due_at, interval, now):
+    """
+    Advances a reminder by whole intervals past `now`, so a worker that was
+    down sends one catch-up reminder rather than one per missed interval.
+    """
+    if due_at + interval > now:
+        return due_at + interval
+    missed = (now - due_at) // interval
+    return due_at + (missed + 1) * interval
+
+
+def build_reminders(user, plants, now=None):
+    now = now or timezone.now()
+    preferences = user.notification_preferences
+    return [
+        CareReminder(user=user, plant=plant, kind=kind, interval=reminder_interval(plant, kind),
+                     next_due_at=apply_quiet_hours(now + reminder_interval(plant, kind), preferences),
+                     enabled=kind_enabled(preferences, kind))
+        for plant in plants
+        for kind, _ in CareReminder.KIND_CHOICES
+    ]
+
+
+def schedule_favorites(user, plants):
+    """
+    Creates reminders for newly favourited plants; existing ones are kept.
+    """
+    CareReminder.objects.bulk_create(build_reminders(user, plants), ignore_conflicts=True,
+                                     batch_size=1000)
+
+
+def refresh_plant_intervals(plant):
+    for kind, _ in CareReminder.KIND_CHOICES:
+        CareReminder.objects.filter(plant=plant, kind=kind).update(interval=reminder_interval(plant, kind))
+
+
+def refresh_user_preferences(user):
+    for kind, _ in CareReminder.KIND_CHOICES:
+        CareReminder.objects.filter(user=user, kind=kind).update(
+            enabled=kind_enabled(user.notification_preferences, kind))
+
+
+def send_due_reminders(sink, batch_size=500, now=None):
+    """
+    Claims up to `batch_size` due reminders, reschedules them and sends them.
+
+    Due rows are read in next_due_at order through the partial index on
+    enabled reminders and locked with SKIP LOCKED, so any number of workers
+    can run side by side without sending a reminder twice or scanning rows
+    that are not due. The claim moves each reminder to its next due time and
+    commits before anything is sent, so a slow sink never holds the row
+    locks; a reminder whose send fails is moved back to retry after
+    RETRY_DELAY.
+
+    Returns:
+        int: The number of reminders claimed.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        due = list(CareReminder.objects
+                   .select_for_update(skip_locked=True, of=('self',))
+                   .select_related('user', 'plant')
+                   .defer('plant__vector_data')
+                   .filter(enabled=True, next_due_at__lte=now)
+                   .order_by('next_due_at')[:batch_size])
+        claimed = []
+        for reminder in due:
+            plant_name = str(reminder.plant)
+            notification = Notification(
+                user_id=reminder.user_id, recipient=reminder.user.email or reminder.user.username,
+                plant_id=reminder.plant_id, plant_name=plant_name, kind=reminder.kind,
+                message=MESSAGES[reminder.kind].format(plant=plant_name), due_at=reminder.next_due_at)
+            claimed.append((reminder, notification, reminder.last_sent_at))
+            reminder.last_sent_at = now
+            reminder.next_due_at = apply_quiet_hours(
+                next_due(reminder.next_due_at, reminder.interval, now),
+                reminder.user.notification_preferences)
+        CareReminder.objects.bulk_update(due, ['next_due_at', 'last_sent_at'], batch_size=batch_size)
+
+    for reminder, notification, last_sent_at in claimed:
+        try:
+            sink.send(notification)
+        except Exception as e:
+            logger.error(f"Failed to send {reminder.kind} reminder {reminder.pk}: {e}")
+            # Only if no other worker has claimed it again since.
+            CareReminder.objects.filter(pk=reminder.pk, next_due_at=reminder.next_due_at).update(
+                next_due_at=now + RETRY_DELAY, last_sent_at=last_sent_at)
+    return len(due)
+
+
+def next_wakeup():
+    """
+    Returns the earliest next_due_at among enabled reminders, or None.
+    """
+    return (CareReminder.objects.filter(enabled=True).order_by('next_due_at')
+            .values_list('next_due_at', flat=True).first())
+
+
+def backfill_reminders(chunk_size=2000):
+    """
+    Creates missing reminders for every existing favourite, streaming the
+    favourites table in user order.
+
+    Returns:
+        int: The number of favourites processed.
+    """
+    Favorite = User.favorite_plants.through
+    processed = 0
+    pending_user, pending_plants = None, []
+    for favorite in (Favorite.objects.select_related('user', 'plantdata')
+                     .order_by('user_id').iterator(chunk_size=chunk_size)):
+        if pending_user is not None and favorite.user_id != pending_user.pk:
+            schedule_favorites(pending_user, pending_plants)
+            pending_plants = []
+        pending_user = favorite.user
+        pending_plants.append(favorite.plantdata)
+        processed += 1
+    if pending_plants:
+        schedule_favorites(pending_user, pending_plants)
+    return processed
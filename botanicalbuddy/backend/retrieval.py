@@ -0,0 +1,211 @@
+import logging
+import os
+from typing import List, Optional
+
+from asgiref.sync import sync_to_async
+from django.db import connections, router
+from pgvector.utils import Vector
+from pydantic import BaseModel
+
+from .models import QAEntry
+from .pydanticai import PlantData, RelatedAnswer
+from .utils import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+TOP_K_PLANTS = int(os.environ.get("RETRIEVAL_TOP_K_PLANTS", 3))
+TOP_K_ANSWERS = int(os.environ.get("RETRIEVAL_TOP_K_ANSWERS", 3))
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("RETRIEVAL_TOKEN_BUDGET", 1500))
+# Only consider answers from the last N days. With QAEntry range-partitioned
+# by created_at (see partition_qa_entries) older partitions are then pruned;
+# hash partitions by plant are pruned by the plant_id filter alone.
+ANSWER_MAX_AGE_DAYS = int(os.environ.get("RETRIEVAL_ANSWER_MAX_AGE_DAYS", 0)) or None
+
+# A plant's answers are ranked by an exact scan of that plant's rows.
+# Ordering by `<=>` over the whole table would be answered by the shared
+# HNSW index, which returns its ef_search nearest answers across all plants
+# and only then drops other plants' rows, so a plant with few answers would
+# often get none. MATERIALIZED keeps the planner from doing that; the rows
+# come from the plant_id b-tree (or a single hash partition).
+PLANT_ANSWERS_CTE = """
+    plant_answers AS MATERIALIZED (
+        SELECT q.question_text, q.answer_text, q.question_vector
+          FROM backend_qaentry q
+         WHERE q.question_vector IS NOT NULL AND q.plant_id = %s
+           AND (%s::int IS NULL OR q.created_at >= now() - make_interval(days => %s::int))
+    )
+"""
+
+# The plants half is ordered by the `<=>` operator so that it is served by
+# the HNSW index (see PlantData.Meta).
+NEIGHBOURS_SQL = """
+    (SELECT 'plant' AS kind, p.vector_data <=> {vector} AS distance,
+            jsonb_build_object(
+                'plant_name', p.common_name,
+                'scientific_name', p.scientific_name,
+                'description', p.description,
+                'care_instructions', p.care_instructions,
+                'soil_type', p.soil_type,
+                'water_requirements', p.water_requirements,
+                'sunlight_requirements', p.sunlight_requirements
+            ) AS payload
+       FROM backend_plantdata p
+      WHERE p.vector_data IS NOT NULL AND p.common_name IS NOT NULL AND p.id <> %s
+      ORDER BY p.vector_data <=> {vector}
+      LIMIT %s)
+    UNION ALL
+    (SELECT 'answer' AS kind, a.question_vector <=> {vector} AS distance,
+            jsonb_build_object(
+                'question_text', a.question_text,
+                'answer_text', a.answer_text
+            ) AS payload
+       FROM plant_answers a
+      ORDER BY distance
+      LIMIT %s)
+"""
+RETRIEVAL_SQL = "WITH {answers} {neighbours}".format(
+    answers=PLANT_ANSWERS_CTE, neighbours=NEIGHBOURS_SQL.format(vector="%s::vector"))
+
+# The same neighbour search for many questions at once: one lateral HNSW
+# search per row of the vector array, in a single round trip. The plant's
+# answers are read once and ranked against every question.
+BATCH_RETRIEVAL_SQL = """
+    WITH {answers}
+    SELECT question.ord, neighbour.kind, neighbour.distance, neighbour.payload
+      FROM unnest(%s::vector[]) WITH ORDINALITY AS question(vector, ord)
+     CROSS JOIN LATERAL ({neighbours}) AS neighbour
+""".format(answers=PLANT_ANSWERS_CTE, neighbours=NEIGHBOURS_SQL.format(vector="question.vector"))
+
+
+class RetrievalContext(BaseModel):
+    plants: List[PlantData]
+    answers: List[RelatedAnswer]
+    top_answer: Optional[RelatedAnswer] = None
+    token_count: int = 0
+
+
+def plant_from_model(django_plant, similarity=None) -> PlantData:
+    """
+    Builds the agent's PlantData from a backend.models.PlantData instance.
+    """
+    return PlantData(
+        plant_name=django_plant.common_name or django_plant.scientific_name or "",
+        scientific_name=django_plant.scientific_name,
+        description=django_plant.description,
+        care_instructions=django_plant.care_instructions,
+        soil_type=django_plant.soil_type,
+        water_requirements=django_plant.water_requirements,
+        sunlight_requirements=django_plant.sunlight_requirements,
+        similarity=similarity,
+    )
+
+
+def pack_context(primary: PlantData, plants: List[PlantData], answers: List[RelatedAnswer],
+                 token_budget: int = CONTEXT_TOKEN_BUDGET) -> RetrievalContext:
+    """
+    Packs retrieved plants and answers into a token-budgeted context.
+
+    The primary plant is always kept. The remaining candidates are taken in
+    order of similarity; one that would exceed the budget is skipped, and
+    smaller, less similar ones after it may still fit.
+
+    Args:
+        primary (PlantData): The plant the user asked about.
+        plants (list): Related plants, each with a similarity score.
+        answers (list): Related Q&A pairs, each with a similarity score.
+        token_budget (int, optional): Maximum estimated tokens for the context.
+
+    Returns:
+        RetrievalContext: The selected plants (primary first) and answers, plus
+        the most similar answer regardless of budget.
+    """
+    used = estimate_tokens(primary.to_prompt())
+    selected_plants = [primary]
+    selected_answers = []
+    candidates = sorted(plants + answers, key=lambda c: c.similarity or 0.0, reverse=True)
+    for candidate in candidates:
+        cost = estimate_tokens(candidate.to_prompt())
+        if used + cost > token_budget:
+            continue
+        used += cost
+        if isinstance(candidate, PlantData):
+            selected_plants.append(candidate)
+        else:
+            selected_answers.append(candidate)
+    top_answer = max(answers, key=lambda a: a.similarity or 0.0, default=None)
+    return RetrievalContext(plants=selected_plants, answers=selected_answers,
+                            top_answer=top_answer, token_count=used)
+
+
+def add_neighbour(plants, answers, kind, distance, payload):
+    similarity = 1.0 - distance
+    if kind == 'plant':
+        plants.append(PlantData(similarity=similarity, **payload))
+    else:
+        answers.append(RelatedAnswer(similarity=similarity, **payload))
+
+
+def fetch_neighbours(question_vector, plant_id, k_plants=TOP_K_PLANTS, k_answers=TOP_K_ANSWERS):
+    """
+    Fetches the top-k related plants and the top-k Q&A entries for a plant in one query.
+
+    Returns:
+        tuple: (list of PlantData, list of RelatedAnswer), each with similarity set.
+    """
+    vector = Vector._to_db(question_vector)
+    params = [plant_id, ANSWER_MAX_AGE_DAYS, ANSWER_MAX_AGE_DAYS,
+              vector, plant_id, vector, k_plants, vector, k_answers]
+    plants, answers = [], []
+    # Raw SQL bypasses the router; ask it which database serves catalog reads.
+    with connections[router.db_for_read(QAEntry)].cursor() as cursor:
+        cursor.execute(RETRIEVAL_SQL, params)
+        for kind, distance, payload in cursor.fetchall():
+            add_neighbour(plants, answers, kind, distance, payload)
+    return plants, answers
+
+
+def fetch_neighbours_batch(question_vectors, plant_id, k_plants=TOP_K_PLANTS, k_answers=TOP_K_ANSWERS):
+    """
+    Fetches the neighbours of several questions about one plant in one query.
+
+    Returns:
+        list: One (plants, answers) tuple per question vector, in input order.
+    """
+    vectors = "{" + ",".join(f'"{Vector._to_db(v)}"' for v in question_vectors) + "}"
+    params = [plant_id, ANSWER_MAX_AGE_DAYS, ANSWER_MAX_AGE_DAYS,
+              vectors, plant_id, k_plants, k_answers]
+    neighbours = [([], []) for _ in question_vectors]
+    with connections[router.db_for_read(QAEntry)].cursor() as cursor:
+        cursor.execute(BATCH_RETRIEVAL_SQL, params)
+        for ordinal, kind, distance, payload in cursor.fetchall():
+            add_neighbour(*neighbours[ordinal - 1], kind, distance, payload)
+    return neighbours
+
+
+@sync_to_async
+def retrieve_context(question_vector, django_plant, k_plants=TOP_K_PLANTS,
+                     k_answers=TOP_K_ANSWERS, token_budget=CONTEXT_TOKEN_BUDGET) -> RetrievalContext:
+    """
+    Retrieves and packs the context the agent needs to answer a question about a plant.
+
+    The plant the user named is ranked first with a similarity of 1.0.
+    """
+    plants, answers = fetch_neighbours(question_vector, django_plant.id, k_plants, k_answers)
+    primary = plant_from_model(django_plant, similarity=1.0)
+    context = pack_context(primary, plants, answers, token_budget)
+    logger.debug(f"Retrieved {len(context.plants)} plants and {len(context.answers)} answers "
+                 f"(~{context.token_count} tokens) for {primary.plant_name}")
+    return context
+
+
+@sync_to_async
+def retrieve_contexts(question_vectors, django_plant, k_plants=TOP_K_PLANTS,
+                      k_answers=TOP_K_ANSWERS, token_budget=CONTEXT_TOKEN_BUDGET) -> List[RetrievalContext]:
+    """
+    Retrieves and packs the contexts for several questions about one plant
+    with a single query; see retrieve_context.
+    """
+    primary = plant_from_model(django_plant, similarity=1.0)
+    return [pack_context(primary, plants, answers, token_budget)
+            for plants, answers in fetch_neighbours_batch(question_vectors, django_plant.id,
+                                                          k_plants, k_answers)]
@@ -0,0 +1,214 @@
+"""
+Read-replica routing for the catalog and Q&A tables.
+
+Reads of PlantData and QAEntry go to a replica from DATABASE_REPLICAS; every
+other model and every write uses the primary. A replica is skipped while its
+replay lag exceeds REPLICA_MAX_LAG_SECONDS or it cannot be reached, and reads
+fall back to the primary when no replica qualifies.
+
+Read-your-writes: a write to a routed model pins the rest of the request to
+the primary, and ReplicaPinningMiddleware keeps the same client (by JWT or
+session cookie) pinned for REPLICA_STICKY_SECONDS so the next request sees
+the write too. Pins live in the default cache, so multi-process deployments
+need a shared cache for them to hold across workers.
+
+To try it locally, run two Postgres instances (a primary and a streaming
+replica) and set DATABASE_REPLICA_HOSTS, or add a SQLite `replica_0` alias
+with a copy of the primary's file to a local settings module; lag is only
+measured on Postgres.
+"""
+import asyncio
+import contextvars
+import hashlib
+import logging
+import os
+import random
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+logger = logging.getLogger(__name__)
+
+REPLICA_MAX_LAG = float(os.environ.get("REPLICA_MAX_LAG_SECONDS", 5))
+REPLICA_LAG_CHECK_INTERVAL = float(os.environ.get("REPLICA_LAG_CHECK_INTERVAL", 2))
+REPLICA_STICKY_SECONDS = int(os.environ.get("REPLICA_STICKY_SECONDS", 10))
+ROUTED_MODELS = {'backend.plantdata', 'backend.qaentry'}
+
+# Zero on a primary or a fully replayed standby, NULL before anything replayed.
+LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+"""
+
+_pinned = contextvars.ContextVar('replica_pinned', default=False)
+_client_key = contextvars.ContextVar('replica_client_key', default=None)
+
+
+def pin_key(client_key):
+    return f"replica_pin:{client_key}"
+
+
+def pin_to_primary():
+    """
+    Sends the rest of this request's reads, and the client's reads for the
+    next REPLICA_STICKY_SECONDS, to the primary.
+    """
+    if _pinned.get():
+        return
+    _pinned.set(True)
+    client_key = _client_key.get()
+    if client_key:
+        cache.set(pin_key(client_key), True, REPLICA_STICKY_SECONDS)
+
+
+def is_pinned():
+    return _pinned.get()
+
+
+class ReplicaLagMonitor:
+    """
+    Measures each replica's replay lag at most once per `interval` seconds
+    per process, so routing a read rarely costs a query.
+    """
+
+    def __init__(self, interval=REPLICA_LAG_CHECK_INTERVAL):
+        self.interval = interval
+        self._lags = {}
+        self._lock = threading.Lock()
+
+    def measure(self, alias):
+        connection = connections[alias]
+        if connection.vendor != 'postgresql':
+            return 0.0
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(LAG_SQL)
+                lag = cursor.fetchone()[0]
+        except Exception as e:
+            logger.warning(f"Replica {alias} is unavailable: {e}")
+            return float('inf')
+        return float('inf') if lag is None else float(lag)
+
+    def lag(self, alias):
+        """
+        Returns the replica's lag in seconds; inf if it is down or unknown.
+        """
+        now = time.monotonic()
+        with self._lock:
+            checked_at, lag = self._lags.get(alias, (None, None))
+        if checked_at is not None and now - checked_at < self.interval:
+            return lag
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            pass
+        else:
+            # Queries can't run on the event loop; use the last reading.
+            return float('inf') if lag is None else lag
+        lag = self.measure(alias)
+        if lag > REPLICA_MAX_LAG:
+            logger.info(f"Replica {alias} is {lag:.1f}s behind; reading from the primary.")
+        with self._lock:
+            self._lags[alias] = (now, lag)
+        return lag
+
+    def reset(self):
+        with self._lock:
+            self._lags.clear()
+
+
+lag_monitor = ReplicaLagMonitor()
+
+
+class ReplicaRouter:
+    """
+    Sends PlantData and QAEntry reads to a replica that is keeping up, and
+    everything else to the primary.
+    """
+
+    def replicas(self):
+        return list(getattr(settings, 'DATABASE_REPLICAS', ()))
+
+    def db_for_read(self, model, **hints):
+        if model._meta.label_lower not in ROUTED_MODELS:
+            return None
+        # Reads inside a transaction on the primary must see its writes,
+        # and select_for_update has to run there.
+        if _pinned.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        healthy = [alias for alias in self.replicas() if lag_monitor.lag(alias) <= REPLICA_MAX_LAG]
+        return random.choice(healthy) if healthy else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        if model._meta.label_lower not in ROUTED_MODELS:
+            return None
+        pin_to_primary()
+        # Instances read from a replica are saved to the primary.
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *self.replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in self.replicas():
+            return False
+        return None
+
+
+def client_key(request):
+    """
+    Identifies the client across requests by its Authorization header or
+    session cookie, hashed; None for anonymous clients without a session.
+    """
+    credential = (request.headers.get('Authorization')
+                  or request.COOKIES.get(settings.SESSION_COOKIE_NAME))
+    if not credential:
+        return None
+    return hashlib.sha256(credential.encode()).hexdigest()[:32]
+
+
+class ReplicaPinningMiddleware:
+    """
+    Pins a request to the primary when the same client wrote to a routed
+    model within the last REPLICA_STICKY_SECONDS.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        key = client_key(request) if getattr(settings, 'DATABASE_REPLICAS', None) else None
+        pinned = bool(key) and bool(cache.get(pin_key(key)))
+        tokens = (_client_key.set(key), _pinned.set(pinned))
+        try:
+            return self.get_response(request)
+        finally:
+            _pinned.reset(tokens[1])
+            _client_key.reset(tokens[0])
+
+    async def __acall__(self, request):
+        key = client_key(request) if getattr(settings, 'DATABASE_REPLICAS', None) else None
+        pinned = bool(key) and bool(await cache.aget(pin_key(key)))
+        tokens = (_client_key.set(key), _pinned.set(pinned))
+        try:
+            return await self.get_response(request)
+        finally:
+            _pinned.reset(tokens[1])
+            _client_key.reset(tokens[0])
@@ -11,7 +11,8 @@ class UserSerializer(serializers.ModelSerializer):
 class VectorDatabaseSerializer(serializers.ModelSerializer):
     class Meta:
         model = VectorDatabase
-        fields = ['id', 'user', 'vector_data', 'name', 'description', 'created_at']
+        fields = ['id', 'user', 'vector_data', 'name', 'description', 'created_at', 'chunk_count']
+        read_only_fields = ['user', 'vector_data', 'created_at', 'chunk_count']
 
 class PlantDataSerializer(serializers.ModelSerializer):
     class Meta:
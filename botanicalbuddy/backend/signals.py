@@ -0,0 +1,167 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from . import httpcache, recommendations, regions, reminders
+from .authentication import user_cache
+from .diagnosis import diagnosis_index
+from .entities import gazetteer
+from .models import CareReminder, PlantData, QAEntry, User, UserTasteProfile
+
+ISSUE_FIELDS = {'common_diseases', 'common_pests'}
+REQUIREMENT_FIELDS = {'water_requirements', 'sunlight_requirements'}
+
+
+def _untouched(update_fields, fields):
+    return update_fields is not None and not fields & set(update_fields)
+
+
+def _issues_untouched(update_fields):
+    return _untouched(update_fields, ISSUE_FIELDS)
+
+
+@receiver(post_save, sender=PlantData)
+def update_entity_gazetteer(sender, instance, update_fields=None, **kwargs):
+    """
+    Keeps this process's pest/disease gazetteer in step with a saved plant;
+    other processes reload theirs when the catalog version moves.
+    """
+    if gazetteer.loaded and not _issues_untouched(update_fields):
+        gazetteer.update_plant(instance.pk, instance.common_diseases, instance.common_pests)
+
+
+@receiver(post_delete, sender=PlantData)
+def remove_from_entity_gazetteer(sender, instance, **kwargs):
+    """
+    Releases the pest/disease terms contributed by a deleted plant.
+    """
+    if gazetteer.loaded:
+        gazetteer.remove_plant(instance.pk)
+
+
+@receiver(post_save, sender=PlantData)
+@receiver(post_delete, sender=PlantData)
+def mark_diagnosis_index_stale(sender, instance, update_fields=None, **kwargs):
+    """
+    Rebuilds the symptom-to-diagnosis index in the background on next use
+    after a catalog change.
+    """
+    if not _issues_untouched(update_fields):
+        diagnosis_index.mark_stale()
+
+
+@receiver(post_save, sender=PlantData)
+@receiver(post_delete, sender=PlantData)
+def invalidate_catalog_caches(sender, instance, **kwargs):
+    """
+    Moves cached catalog queries (e.g. native-region lookups) and the
+    in-memory indexes of every process to a new version. After commit, so
+    no process reloads before the change is visible to it.
+    """
+    transaction.on_commit(regions.bump_catalog_version)
+
+
+@receiver(post_save, sender=PlantData)
+@receiver(post_delete, sender=PlantData)
+@receiver(post_save, sender=QAEntry)
+@receiver(post_delete, sender=QAEntry)
+def invalidate_cached_responses(sender, instance, **kwargs):
+    """
+    Drops the cached API representation of a changed plant or Q&A entry.
+    """
+    httpcache.invalidate_responses(sender, [instance.pk])
+
+
+@receiver(m2m_changed, sender=User.favorite_plants.through)
+def sync_care_reminders(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Schedules care reminders for favourited plants and drops them when a
+    plant is unfavourited.
+    """
+    if action == 'post_add':
+        if reverse:
+            for user in User.objects.filter(pk__in=pk_set):
+                reminders.schedule_favorites(user, [instance])
+        else:
+            reminders.schedule_favorites(instance, PlantData.objects.filter(pk__in=pk_set))
+    elif action == 'post_remove':
+        lookup = {'plant': instance, 'user_id__in': pk_set} if reverse else \
+            {'user': instance, 'plant_id__in': pk_set}
+        CareReminder.objects.filter(**lookup).delete()
+    elif action == 'post_clear':
+        CareReminder.objects.filter(**{'plant' if reverse else 'user': instance}).delete()
+
+
+@receiver(post_save, sender=PlantData)
+def refresh_reminder_intervals(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Recomputes reminder intervals when a plant's care requirements change.
+    """
+    if not created and not _untouched(update_fields, REQUIREMENT_FIELDS):
+        reminders.refresh_plant_intervals(instance)
+
+
+@receiver(post_save, sender=User)
+def refresh_reminder_preferences(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Enables or disables a user's reminders to match notification_preferences.
+    """
+    if not created and not _untouched(update_fields, {'notification_preferences'}):
+        reminders.refresh_user_preferences(instance)
+
+
+@receiver(m2m_changed, sender=User.favorite_plants.through)
+def update_taste_profiles(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Adds or removes changed favourites from the users' running-mean taste vectors.
+    """
+    if action in ('post_add', 'post_remove'):
+        sign = 1 if action == 'post_add' else -1
+        if reverse:
+            for user_id in pk_set:
+                recommendations.update_taste_profile(user_id, [instance.pk], sign)
+        else:
+            recommendations.update_taste_profile(instance.pk, pk_set, sign)
+    elif action == 'pre_clear' and reverse:
+        # Remember who favourited the plant; post_clear does not say.
+        instance._cleared_favorite_user_ids = list(instance.user_set.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        if reverse:
+            for user_id in getattr(instance, '_cleared_favorite_user_ids', []):
+                recommendations.update_taste_profile(user_id, [instance.pk], -1)
+        else:
+            UserTasteProfile.objects.filter(user=instance).update(vector=None, favorite_count=0)
+
+
+def _invalidate_users(user_ids):
+    # After commit, so a concurrent request can't cache the old row again.
+    transaction.on_commit(lambda: [user_cache.invalidate(user_id) for user_id in user_ids])
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def invalidate_cached_user(sender, instance, **kwargs):
+    """
+    Drops the cached authentication user after a save (including password
+    changes and deactivation) or delete.
+    """
+    _invalidate_users([instance.pk])
+
+
+@receiver(m2m_changed, sender=get_user_model().groups.through)
+@receiver(m2m_changed, sender=get_user_model().user_permissions.through)
+def invalidate_cached_user_permissions(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Drops cached users whose groups or permissions changed.
+    """
+    if action == 'pre_clear' and reverse:
+        # Remember the group's or permission's users; post_clear does not say.
+        instance._cleared_user_ids = list(instance.user_set.values_list('pk', flat=True))
+    elif action.startswith('post_'):
+        if not reverse:
+            _invalidate_users([instance.pk])
+        elif action == 'post_clear':
+            _invalidate_users(getattr(instance, '_cleared_user_ids', []))
+        else:
+            _invalidate_users(list(pk_set))
@@ -0,0 +1,100 @@
+# backend/tests/test_admin.py
+import json
+from unittest import mock
+
+from django.contrib.admin.sites import AdminSite
+from django.test import SimpleTestCase
+
+from backend.admin import (CareReminderAdmin, EstimatedCountPaginator, PlantDataAdmin, QAEntryAdmin,
+                           ScalableAdmin, vector_preview)
+from backend.models import QAEntry
+
+
+class FakeQuerySet:
+    db = 'default'
+    model = QAEntry
+    exact_counts = 0
+
+    def __init__(self, where):
+        self.query = mock.Mock(where=where)
+
+    def count(self):
+        self.exact_counts += 1
+        return 42
+
+    def explain(self, format=None):
+        return json.dumps([{'Plan': {'Plan Rows': 250_000}}])
+
+
+class EstimatedCountPaginatorTests(SimpleTestCase):
+    def paginator(self, where):
+        queryset = FakeQuerySet(where)
+        return EstimatedCountPaginator(queryset, 100), queryset
+
+    def test_large_tables_use_statistics(self):
+        """
+        Test that an unfiltered list of a large table is counted from pg_class, not COUNT(*).
+        """
+        paginator, queryset = self.paginator(where=None)
+        postgres = mock.MagicMock(vendor='postgresql')
+        with mock.patch('backend.admin.connections', {'default': postgres}), \
+                mock.patch.object(EstimatedCountPaginator, 'table_estimate', return_value=1_200_000.0):
+            self.assertEqual(paginator.count, 1_200_000)
+        self.assertEqual(queryset.exact_counts, 0)
+
+    def test_filtered_lists_use_the_plan_estimate(self):
+        """
+        Test that a searched list takes its count from the planner's row estimate.
+        """
+        paginator, queryset = self.paginator(where=['filter'])
+        with mock.patch('backend.admin.connections', {'default': mock.MagicMock(vendor='postgresql')}):
+            self.assertEqual(paginator.count, 250_000)
+        self.assertEqual(queryset.exact_counts, 0)
+
+    def test_small_or_unknown_estimates_count_exactly(self):
+        """
+        Test that small, never-analyzed or non-PostgreSQL tables still get an exact count.
+        """
+        for vendor, estimate in (('postgresql', 0), ('postgresql', 900), ('sqlite', 10 ** 9)):
+            paginator, queryset = self.paginator(where=None)
+            with mock.patch('backend.admin.connections', {'default': mock.MagicMock(vendor=vendor)}), \
+                    mock.patch.object(EstimatedCountPaginator, 'table_estimate', return_value=estimate):
+                self.assertEqual(paginator.count, 42)
+
+
+class VectorPreviewTests(SimpleTestCase):
+    def test_preview_is_compact(self):
+        """
+        Test that an embedding is shown as its size, norm and first values only.
+        """
+        preview = vector_preview([3.0, 4.0] + [0.0] * 1534)
+        self.assertEqual(preview, "1536 dims, norm 5.000: [3.0000, 4.0000, 0.0000, 0.0000, 0.0000, …]")
+        self.assertEqual(vector_preview(None), "—")
+
+    def test_change_list_skips_vectors(self):
+        """
+        Test that the Q&A change list joins the plant and leaves every vector column unread.
+        """
+        queryset = QAEntryAdmin(QAEntry, AdminSite()).get_queryset(mock.Mock())
+        deferred, _ = queryset.query.deferred_loading
+        self.assertEqual(set(deferred), {'question_vector', 'answer_vector', 'plant__vector_data'})
+
+
+class ChangeListTests(SimpleTestCase):
+    def test_plant_name_search_keeps_change_list_filters(self):
+        """
+        Test that entries matched by plant name are still limited by the filters already applied.
+        """
+        admin = QAEntryAdmin(QAEntry, AdminSite())
+        filtered = QAEntry.objects.filter(created_at__year=2024)
+        queryset, _ = admin.get_search_results(mock.Mock(), filtered, 'rose')
+        sql = str(queryset.query)
+        self.assertIn('"backend_qaentry"."plant_id" IN', sql)
+        self.assertEqual(sql.count('"backend_qaentry"."created_at" BETWEEN'), 2)
+
+    def test_large_tables_avoid_full_scans(self):
+        """
+        Test that reminders get estimated counts and plants have no DISTINCT-backed filter.
+        """
+        self.assertTrue(issubclass(CareReminderAdmin, ScalableAdmin))
+        self.assertEqual(PlantDataAdmin.list_filter, ())
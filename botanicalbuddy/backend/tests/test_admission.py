@@ -0,0 +1,102 @@
+# backend/tests/test_admission.py
+import asyncio
+
+from django.test import SimpleTestCase
+
+from backend.admission import (PRIORITY_HIGH, PRIORITY_LOW, AdmissionController, Overloaded,
+                               UserQuotas)
+
+
+class UserQuotasTests(SimpleTestCase):
+    def test_bucket_allows_burst_then_refills(self):
+        """
+        Test that a user can burst up to the bucket size and then waits for refills.
+        """
+        quotas = UserQuotas(rate=1.0, burst=2)
+        self.assertEqual(quotas.consume('u1', now=0.0), 0)
+        self.assertEqual(quotas.consume('u1', now=0.0), 0)
+        self.assertAlmostEqual(quotas.consume('u1', now=0.0), 1.0)
+        self.assertEqual(quotas.consume('u1', now=1.0), 0)
+
+    def test_buckets_are_per_user(self):
+        """
+        Test that one user's usage does not affect another user.
+        """
+        quotas = UserQuotas(rate=0.1, burst=1)
+        quotas.consume('u1', now=0.0)
+        self.assertGreater(quotas.consume('u1', now=0.0), 0)
+        self.assertEqual(quotas.consume('u2', now=0.0), 0)
+
+
+class AdmissionControllerTests(SimpleTestCase):
+    async def test_excess_requests_queue_by_priority(self):
+        """
+        Test that queued requests are admitted in priority order as slots free up.
+        """
+        controller = AdmissionController(max_in_flight=1, max_queue=5, max_wait=5)
+        order = []
+        await controller.acquire()
+
+        async def wait_for_slot(name, priority):
+            async with controller.slot(priority):
+                order.append(name)
+
+        low = asyncio.create_task(wait_for_slot('low', PRIORITY_LOW))
+        await asyncio.sleep(0)
+        high = asyncio.create_task(wait_for_slot('high', PRIORITY_HIGH))
+        await asyncio.sleep(0)
+        self.assertEqual(controller.queued, 2)
+
+        controller.release()
+        await asyncio.gather(low, high)
+        self.assertEqual(order, ['high', 'low'])
+        self.assertEqual(controller.in_flight, 0)
+
+    async def test_full_queue_is_shed_immediately(self):
+        """
+        Test that requests beyond the queue bound are rejected without waiting.
+        """
+        controller = AdmissionController(max_in_flight=1, max_queue=0, max_wait=5)
+        await controller.acquire()
+        with self.assertRaises(Overloaded) as cm:
+            await controller.acquire()
+        self.assertEqual(cm.exception.reason, "queue full")
+        self.assertGreaterEqual(cm.exception.retry_after, 1)
+
+    async def test_backlog_beyond_deadline_is_shed(self):
+        """
+        Test that a request is shed when its estimated wait exceeds the deadline.
+        """
+        controller = AdmissionController(max_in_flight=1, max_queue=10, max_wait=1,
+                                         initial_service_time=2.0)
+        await controller.acquire()
+        with self.assertRaises(Overloaded) as cm:
+            await controller.acquire()
+        self.assertEqual(cm.exception.reason, "queue deadline")
+
+    async def test_queued_request_times_out(self):
+        """
+        Test that a queued request gives up after max_wait and frees its place.
+        """
+        controller = AdmissionController(max_in_flight=1, max_queue=10, max_wait=0.05,
+                                         initial_service_time=0.01)
+        await controller.acquire()
+        with self.assertRaises(Overloaded) as cm:
+            await controller.acquire()
+        self.assertEqual(cm.exception.reason, "wait timeout")
+        self.assertEqual(controller.queued, 0)
+        controller.release()
+        self.assertEqual(controller.in_flight, 0)
+
+
+class LoadtestSummaryTests(SimpleTestCase):
+    def test_throttled_responses_are_counted_apart(self):
+        """
+        Test that 429s are reported on their own and kept out of the latency percentiles.
+        """
+        from backend.management.commands.loadtest import summarize
+
+        stats = summarize([100.0, 200.0, 1.0, 1.0], [200, 500, 429, 429], elapsed=1.0)
+        self.assertEqual((stats['throttled'], stats['client_errors']), (2, 0))
+        self.assertEqual((stats['error_rate'], stats['throttled_rate']), (0.25, 0.5))
+        self.assertEqual(stats['p50_ms'], 100.0)
@@ -0,0 +1,63 @@
+# backend/tests/test_agent.py
+import asyncio
+from types import SimpleNamespace
+from unittest import mock
+
+import httpx
+import openai
+from django.test import SimpleTestCase
+
+from backend.pydanticai import Agent, PlantData, VectorData
+
+
+def openai_error(error_class, status_code, headers=None):
+    response = httpx.Response(status_code, headers=headers,
+                              request=httpx.Request('POST', 'https://api.openai.com/v1/chat/completions'))
+    return error_class("upstream said something internal", response=response, body=None)
+
+
+class AgentErrorTests(SimpleTestCase):
+    def run_agent(self, error=None, answer="Water weekly."):
+        with mock.patch.dict('os.environ', {'OPENAI_API_KEY': 'test'}):
+            agent = Agent()
+        message = SimpleNamespace(content=f" {answer} ")
+        create = mock.AsyncMock(side_effect=error,
+                                return_value=SimpleNamespace(choices=[SimpleNamespace(message=message)]))
+        with mock.patch.object(agent.client.chat.completions, 'create', create):
+            result = asyncio.run(agent.run_sync(VectorData(data=[0.1]), [PlantData(plant_name='Fern')],
+                                                "How do I care for it?"))
+        return result, create
+
+    def test_answers_come_from_chat_completions(self):
+        """
+        Test that the agent sends the system message and prompt to the chat completions API.
+        """
+        result, create = self.run_agent()
+        self.assertEqual((result.inference, result.error), ("Water weekly.", None))
+        messages = create.call_args.kwargs['messages']
+        self.assertEqual([m['role'] for m in messages], ['system', 'user'])
+        self.assertIn("Fern", messages[1]['content'])
+
+    def test_rate_limit_is_reported_with_retry_after(self):
+        """
+        Test that a 429 from the API is flagged as a rate limit rather than a generic API error.
+        """
+        with mock.patch.dict('os.environ', {'OPENAI_API_KEY': 'test'}):
+            agent = Agent()
+        transport = httpx.MockTransport(lambda request: httpx.Response(
+            429, headers={'retry-after': '12'}, json={'error': {'message': 'Rate limit reached'}}))
+        agent.client = openai.AsyncOpenAI(api_key='test', max_retries=0,
+                                          http_client=httpx.AsyncClient(transport=transport))
+        result = asyncio.run(agent.run_sync(VectorData(data=[0.1]), [PlantData(plant_name='Fern')],
+                                            "How do I care for it?"))
+        self.assertEqual((result.error, result.retry_after), ('rate_limit', 12.0))
+
+    def test_error_text_is_not_returned(self):
+        """
+        Test that failed generations never carry the upstream or exception text.
+        """
+        api_error, _ = self.run_agent(openai_error(openai.InternalServerError, 500))
+        unexpected, _ = self.run_agent(RuntimeError("connection string with a password"))
+        self.assertEqual((api_error.error, unexpected.error), ('api_error', 'unexpected'))
+        self.assertNotIn("internal", api_error.inference)
+        self.assertNotIn("password", unexpected.inference)
@@ -0,0 +1,85 @@
+# backend/tests/test_authentication.py
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, override_settings
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.tokens import AccessToken
+
+from backend.authentication import CachedJWTAuthentication, UserCache
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                            'LOCATION': 'test-authentication'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class UserCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = UserCache(local_ttl=60)
+        self.load = mock.Mock(side_effect=lambda user_id: User(pk=user_id, username=f'user{user_id}'))
+
+    def tearDown(self):
+        self.cache.invalidate(1)
+
+    def test_loads_once_and_returns_fresh_instances(self):
+        """
+        Test that repeat lookups skip the loader and never share an instance.
+        """
+        first = self.cache.get(1, self.load)
+        second = self.cache.get(1, self.load)
+        self.assertEqual(self.load.call_count, 1)
+        self.assertEqual(second.username, 'user1')
+        self.assertIsNot(first, second)
+
+    def test_shared_cache_serves_other_processes(self):
+        """
+        Test that a process without a local copy reads the shared cache, not the loader.
+        """
+        self.cache.get(1, self.load)
+        other = UserCache(local_ttl=60)
+        other.get(1, self.load)
+        self.assertEqual(self.load.call_count, 1)
+
+    def test_invalidate_forces_reload(self):
+        """
+        Test that invalidation drops both the local and the shared copy.
+        """
+        self.cache.get(1, self.load)
+        self.cache.invalidate(1)
+        self.cache.get(1, self.load)
+        self.assertEqual(self.load.call_count, 2)
+
+    def test_late_write_after_invalidation_is_not_served(self):
+        """
+        Test that a copy loaded before an invalidation but cached after it is never read.
+        """
+        def load_during_invalidation(user_id):
+            user = User(pk=user_id, username='before-save')
+            self.cache.invalidate(user_id)
+            return user
+
+        self.cache.get(1, load_during_invalidation)
+        other = UserCache(local_ttl=60)
+        self.assertEqual(other.get(1, self.load).username, 'user1')
+        self.assertEqual(self.cache.get(1, self.load).username, 'user1')
+
+    def test_session_ids_are_invalidated_by_integer_pk(self):
+        """
+        Test that a user cached under a session's string id is dropped by the signals' integer pk.
+        """
+        self.cache.get('1', self.load)
+        self.cache.invalidate(1)
+        self.cache.get('1', self.load)
+        self.assertEqual(self.load.call_count, 2)
+
+    def test_inactive_users_are_rejected(self):
+        """
+        Test that a cached user who is inactive cannot authenticate with a token.
+        """
+        user = User(pk=2, username='gone', is_active=False)
+        token = AccessToken.for_user(user)
+        with mock.patch('backend.authentication.user_cache', self.cache):
+            self.cache.get(2, lambda user_id: user)
+            with self.assertRaises(AuthenticationFailed):
+                CachedJWTAuthentication().get_user(token)
+        self.cache.invalidate(2)
@@ -0,0 +1,79 @@
+# backend/tests/test_catalog.py
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from backend.catalog import CATALOG_FIELDS, bundle_file, build_catalog_bundle, read_manifest
+
+
+def plants(*names):
+    """values_list rows for plants with ids 1..n and the given common names."""
+    return [tuple(i if field == 'id' else name if field == 'common_name' else None
+                  for field in CATALOG_FIELDS)
+            for i, name in enumerate(names, start=1) if name is not None]
+
+
+def read(directory, name):
+    with gzip.open(os.path.join(directory, name + '.gz'), 'rt') as f:
+        return json.load(f)
+
+
+class CatalogBundleTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def build(self, rows):
+        with mock.patch('backend.catalog.PlantData.objects') as objects:
+            objects.order_by.return_value.values_list.return_value.iterator.return_value = iter(rows)
+            return build_catalog_bundle(self.directory, keep=3)
+
+    def test_bundle_is_content_addressed(self):
+        """
+        Test that the same catalog keeps its version and a changed one gets a new one.
+        """
+        first = self.build(plants('Fern', 'Moss'))
+        bundle = read(self.directory, first['bundle']['name'])
+        self.assertEqual(bundle['fields'], list(CATALOG_FIELDS))
+        self.assertEqual([row[2] for row in bundle['rows']], ['Fern', 'Moss'])
+        self.assertEqual(self.build(plants('Fern', 'Moss'))['version'], first['version'])
+        self.assertNotEqual(self.build(plants('Fern', 'Ivy'))['version'], first['version'])
+
+    def test_deltas_hold_only_changes(self):
+        """
+        Test that a delta from an older version lists changed, new and deleted plants only.
+        """
+        first = self.build(plants('Fern', 'Moss', 'Ivy'))
+        second = self.build(plants('Fern', None, 'English ivy', 'Thyme'))
+        delta = second['deltas'][first['version']]
+        changes = read(self.directory, delta['name'])
+        self.assertEqual((changes['from'], changes['to']), (first['version'], second['version']))
+        self.assertEqual(changes['deletes'], [2])
+        self.assertEqual([(row[0], row[2]) for row in changes['upserts']],
+                         [(3, 'English ivy'), (4, 'Thyme')])
+
+    def test_old_versions_are_pruned(self):
+        """
+        Test that only `keep` bundles are kept, each with a delta to the newest.
+        """
+        versions = [self.build(plants(f'Plant {n}'))['version'] for n in range(5)]
+        manifest = read_manifest(self.directory)
+        self.assertEqual(manifest['history'], versions[:-4:-1])
+        self.assertEqual(set(manifest['deltas']), set(versions[-3:-1]))
+        names = {name.split('.')[0] for name in os.listdir(self.directory) if name.startswith('catalog-')}
+        self.assertEqual(names, {f'catalog-{v}' for v in versions[-3:]})
+
+    def test_file_lookup_negotiates_encoding_and_rejects_other_names(self):
+        """
+        Test that the served file follows Accept-Encoding and that only bundle names resolve.
+        """
+        name = self.build(plants('Fern'))['bundle']['name']
+        path, encoding = bundle_file(name, 'gzip, deflate', self.directory)
+        self.assertEqual((path.endswith('.gz'), encoding), (True, 'gzip'))
+        self.assertEqual(bundle_file(name, '', self.directory)[1], None)
+        self.assertIsNone(bundle_file('../manifest.json', 'gzip', self.directory))
@@ -0,0 +1,66 @@
+# backend/tests/test_conversations.py
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from backend.conversations import ConversationSummarizer, budget_history
+from backend.pydanticai import ChatTurn
+from backend.utils import estimate_tokens
+
+
+def turns(count):
+    """Newest first, as load_history reads them."""
+    return [ChatTurn(question_text=f"Question {i} about watering my fern?",
+                     answer_text=f"Answer {i}: " + "keep the soil moist " * 10)
+            for i in range(count, 0, -1)]
+
+
+class BudgetHistoryTests(SimpleTestCase):
+    def test_history_size_is_bounded(self):
+        """
+        Test that the history stays within budget however many turns there are.
+        """
+        histories = [budget_history("Earlier: repotting.", turns(n), token_budget=300)
+                     for n in (10, 100, 1000)]
+        self.assertEqual({len(h.turns) for h in histories}, {4})
+        self.assertTrue(all(h.token_count <= 300 for h in histories))
+
+    def test_newest_turns_are_kept_in_order(self):
+        """
+        Test that the newest turns that fit are kept and rendered oldest first.
+        """
+        history = budget_history("", turns(5), token_budget=140)
+        self.assertEqual([t.question_text for t in history.turns],
+                         ["Question 4 about watering my fern?", "Question 5 about watering my fern?"])
+        self.assertTrue(history.to_prompt().endswith(history.turns[-1].to_prompt()))
+
+    def test_long_summary_is_truncated(self):
+        """
+        Test that a runaway summary cannot take over the budget.
+        """
+        history = budget_history("x" * 10_000, turns(3), token_budget=400, summary_tokens=100)
+        self.assertLessEqual(estimate_tokens(history.summary), 101)
+        self.assertTrue(history.turns)
+
+
+class ConversationSummarizerTests(SimpleTestCase):
+    def test_failures_are_counted_not_raised(self):
+        """
+        Test that a failed summary is logged and counted without stopping the worker.
+        """
+        summarizer = ConversationSummarizer(fold=mock.Mock(side_effect=[RuntimeError("down"), 4]))
+        with mock.patch('backend.conversations.close_old_connections'):
+            summarizer.run_one(1)
+            summarizer.run_one(1)
+        self.assertEqual((summarizer.failed, summarizer.summarized), (1, 1))
+
+    def test_repeat_submissions_are_coalesced(self):
+        """
+        Test that a conversation queued twice is summarized once.
+        """
+        summarizer = ConversationSummarizer(fold=mock.Mock(return_value=0))
+        with mock.patch.object(summarizer, '_ensure_thread'):
+            summarizer.submit(7)
+            summarizer.submit(7)
+            summarizer.submit(8)
+        self.assertEqual(list(summarizer._pending), [7, 8])
@@ -0,0 +1,97 @@
+# backend/tests/test_diagnosis.py
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from backend.diagnosis import DiagnosisIndex
+from backend.entities import DISEASE, PEST
+
+
+class DiagnosisIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.index = DiagnosisIndex()
+        self.index.build([
+            (["black spot", "powdery mildew"], ["aphids", "spider mites"]),
+            (["powdery mildew", "root rot"], ["aphids"]),
+            (["leaf spot"], ["scale insects"]),
+        ])
+
+    def test_symptoms_rank_linked_issues(self):
+        """
+        Test that symptoms alone produce a ranked differential diagnosis.
+        """
+        diagnoses = self.index.rank(symptoms=["webbing", "yellow leaves"])
+        self.assertEqual((diagnoses[0].name, diagnoses[0].label), ("spider mites", PEST))
+        self.assertIn("symptoms", diagnoses[0].evidence)
+        self.assertAlmostEqual(sum(d.confidence for d in self.index.rank(
+            symptoms=["webbing", "yellow leaves"], top_n=100)), 1.0, places=5)
+
+    def test_image_prediction_outweighs_symptoms(self):
+        """
+        Test that a confident image prediction leads the ranking.
+        """
+        prediction = {'disease_label': "Powdery Mildew", 'disease_probability': 0.9,
+                      'pest_label': "aphids", 'pest_probability': 0.1}
+        diagnoses = self.index.rank(prediction, symptoms=["black spots"])
+        self.assertEqual((diagnoses[0].name, diagnoses[0].label), ("powdery mildew", DISEASE))
+        self.assertEqual(diagnoses[1].name, "black spot")
+
+    def test_known_issues_break_ties(self):
+        """
+        Test that the plant's own known issues rank above equally likely ones.
+        """
+        diagnoses = self.index.rank(symptoms=["sticky residue"], common_pests=["scale insects"])
+        self.assertEqual(diagnoses[0].name, "scale insects")
+        self.assertIn("known issue", diagnoses[0].evidence)
+
+    def test_no_evidence_returns_nothing(self):
+        """
+        Test that known issues alone do not produce a diagnosis.
+        """
+        self.assertEqual(self.index.rank(common_diseases=["black spot"]), [])
+
+
+class DiagnosisIndexRefreshTests(SimpleTestCase):
+    def test_stale_index_keeps_serving_while_rebuilding(self):
+        """
+        Test that a catalog change starts one background rebuild and does not block ranking.
+        """
+        index = DiagnosisIndex()
+        index.build([(["black spot"], [])])
+        index.mark_stale()
+        with mock.patch.object(index, 'load_catalog') as load_catalog, \
+                mock.patch('backend.diagnosis.threading.Thread') as thread:
+            index.refresh()
+            index.refresh()
+        load_catalog.assert_not_called()
+        thread.assert_called_once()
+        self.assertEqual(index.rank(mentioned_diseases=["black spot"])[0].name, "black spot")
+
+    def test_change_during_build_leaves_index_stale(self):
+        """
+        Test that a catalog change made while the rows are read is picked up by the next rebuild.
+        """
+        index = DiagnosisIndex()
+
+        def rows():
+            index.mark_stale()
+            yield (["leaf spot"], [])
+
+        index.build(rows(), generation=index.generation)
+        self.assertTrue(index.built)
+        self.assertTrue(index.stale)
+
+    def test_catalog_change_elsewhere_marks_index_stale(self):
+        """
+        Test that a catalog version moved by another process makes the index stale.
+        """
+        index = DiagnosisIndex()
+        with mock.patch('backend.regions.catalog_version', return_value=1):
+            index.catalog.changed()
+        index.build([(["black spot"], [])])
+        index.catalog.interval = 0
+        with mock.patch('backend.regions.catalog_version', return_value=2), \
+                mock.patch('backend.diagnosis.threading.Thread') as thread:
+            index.refresh()
+        self.assertTrue(index.stale)
+        thread.assert_called_once()
@@ -0,0 +1,78 @@
+# backend/tests/test_entities.py
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from backend.entities import DISEASE, PEST, SYMPTOM, EntityGazetteer
+
+
+class EntityGazetteerTests(SimpleTestCase):
+    def setUp(self):
+        self.gazetteer = EntityGazetteer(symptoms=["yellow leaves", "black spots"])
+        self.gazetteer.update_plant(1, ["black spot", "powdery mildew"], ["aphids", "spider mites"])
+
+    def test_matches_catalog_terms_and_symptoms(self):
+        """
+        Test that diseases, pests and symptoms are labelled from the gazetteer.
+        """
+        entities = self.gazetteer.match("My rose has Black Spots, yellow leaves and an aphid.")
+        self.assertEqual(entities.diseases, ["Black Spots"])
+        self.assertEqual(entities.symptoms, ["yellow leaves"])
+        self.assertEqual(entities.pests, ["aphid"])
+        self.assertTrue(entities.is_diagnostic)
+
+    def test_respects_word_boundaries(self):
+        """
+        Test that terms inside longer words are not matched.
+        """
+        entities = self.gazetteer.match("Graphids and spider mitesque")
+        self.assertFalse(entities.is_diagnostic)
+
+    def test_prefers_longest_match(self):
+        """
+        Test that overlapping terms resolve to the longest leftmost match.
+        """
+        self.gazetteer.update_plant(2, ["mildew"], None)
+        entities = self.gazetteer.match("signs of powdery mildew")
+        self.assertEqual([(m.text, m.label) for m in entities.matches],
+                         [("powdery mildew", DISEASE)])
+
+    def test_updates_are_incremental(self):
+        """
+        Test that saving or deleting a plant only changes its own terms.
+        """
+        self.gazetteer.update_plant(2, ["rust"], ["aphids"])
+        self.assertEqual(self.gazetteer.match("rust").diseases, ["rust"])
+
+        self.gazetteer.update_plant(2, [], ["aphids"])
+        self.assertEqual(self.gazetteer.match("rust").matches, [])
+
+        self.gazetteer.remove_plant(2)
+        self.assertEqual([(m.text, m.label) for m in self.gazetteer.match("aphids").matches],
+                         [("aphids", PEST)])
+
+        self.gazetteer.remove_plant(1)
+        self.assertEqual([m.label for m in self.gazetteer.match("aphids on black spots").matches],
+                         [SYMPTOM])
+
+
+class EntityGazetteerRefreshTests(SimpleTestCase):
+    def test_catalog_change_elsewhere_starts_one_reload(self):
+        """
+        Test that a moved catalog version reloads in the background once, while matching continues.
+        """
+        gazetteer = EntityGazetteer(symptoms=["wilting"])
+        gazetteer.update_plant(1, ["rust"], None)
+        gazetteer.loaded = True
+        gazetteer.catalog.version = 1
+        with mock.patch('backend.regions.catalog_version', side_effect=[1, 1, 2, 2]), \
+                mock.patch.object(gazetteer, 'load_catalog') as load_catalog, \
+                mock.patch('backend.entities.threading.Thread') as thread:
+            gazetteer.catalog.interval = 0
+            gazetteer.refresh()
+            gazetteer.refresh()
+            gazetteer.refresh()
+            gazetteer.refresh()
+        load_catalog.assert_not_called()
+        thread.assert_called_once()
+        self.assertEqual(gazetteer.match("rust").diseases, ["rust"])
@@ -0,0 +1,57 @@
+# backend/tests/test_httpcache.py
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from backend.httpcache import (conditional_response, get_representation,
+                               invalidate_responses, response_cache_key)
+from backend.models import PlantData
+from backend.serializers import PlantDataSerializer
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                            'LOCATION': 'test-httpcache'}}
+
+REPRESENTATION = {'data': {'id': 1, 'common_name': 'Fern'}, 'etag': '"abc"',
+                  'last_modified': 1_700_000_000}
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class ConditionalResponseTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+
+    def test_full_response_carries_validators(self):
+        """
+        Test that a plain GET gets the body with ETag, Last-Modified and revalidation headers.
+        """
+        response = conditional_response(self.factory.get('/'), REPRESENTATION)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, REPRESENTATION['data'])
+        self.assertEqual(response['ETag'], '"abc"')
+        self.assertIn('Last-Modified', response)
+        self.assertIn('no-cache', response['Cache-Control'])
+
+    def test_matching_validators_return_not_modified(self):
+        """
+        Test that a matching If-None-Match or a later If-Modified-Since yields a 304.
+        """
+        response = conditional_response(self.factory.get('/', HTTP_IF_NONE_MATCH='"abc"'), REPRESENTATION)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], '"abc"')
+        response = conditional_response(
+            self.factory.get('/', HTTP_IF_MODIFIED_SINCE='Wed, 01 Jan 2025 00:00:00 GMT'), REPRESENTATION)
+        self.assertEqual(response.status_code, 304)
+        response = conditional_response(self.factory.get('/', HTTP_IF_NONE_MATCH='"old"'), REPRESENTATION)
+        self.assertEqual(response.status_code, 200)
+
+    def test_cached_representation_skips_database(self):
+        """
+        Test that a cached representation is served without a query, until invalidated.
+        """
+        cache.set(response_cache_key(PlantData, 1), REPRESENTATION)
+        self.assertEqual(get_representation(PlantData, 1, PlantDataSerializer), REPRESENTATION)
+        with mock.patch('backend.httpcache.transaction.on_commit', lambda func: func()):
+            invalidate_responses(PlantData, [1])
+        self.assertIsNone(cache.get(response_cache_key(PlantData, 1)))
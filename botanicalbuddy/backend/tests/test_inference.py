@@ -0,0 +1,110 @@
+# backend/tests/test_inference.py
+import asyncio
+import threading
+from io import BytesIO
+from unittest import mock
+
+import numpy as np
+from django.test import SimpleTestCase
+from PIL import Image
+
+from backend import inference
+from backend.inference import DynamicBatcher, ImageModelUnavailable, preprocess
+
+
+class FakeClassifier:
+    disease_labels = ['healthy', 'powdery mildew']
+    pest_labels = ['none', 'aphids']
+
+    def __init__(self):
+        self.batch_sizes = []
+
+    def __call__(self, batch):
+        self.batch_sizes.append(len(batch))
+        # Images brighter than average look mildewed and infested.
+        score = batch.mean(axis=(1, 2, 3))[:, None] * [-1.0, 1.0]
+        return score, score
+
+
+def png(value, size=(64, 48)):
+    buffer = BytesIO()
+    Image.new('RGB', size, (value, value, value)).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+class PreprocessTests(SimpleTestCase):
+    def test_images_become_normalized_chw_arrays(self):
+        """
+        Test that any image size is resized to the model input and ImageNet-normalized.
+        """
+        array = preprocess(png(124), size=32)
+        self.assertEqual(array.shape, (3, 32, 32))
+        self.assertEqual(array.dtype, np.float32)
+        self.assertAlmostEqual(float(array[1].mean()), (124 / 255 - 0.456) / 0.224, places=4)
+
+
+class DynamicBatcherTests(SimpleTestCase):
+    def test_concurrent_images_share_a_batch(self):
+        """
+        Test that images arriving within the window go through the model together.
+        """
+        model = FakeClassifier()
+        batcher = DynamicBatcher(model, max_batch=8, window_ms=200, workers=2)
+        arrays = [np.full((3, 4, 4), value, dtype=np.float32) for value in (-1.0, 1.0, 2.0)]
+        futures = [batcher.submit(array) for array in arrays]
+        predictions = [future.result(timeout=5) for future in futures]
+        batcher.executor.shutdown()
+        self.assertEqual(model.batch_sizes, [3])
+        self.assertEqual([p['disease_label'] for p in predictions],
+                         ['healthy', 'powdery mildew', 'powdery mildew'])
+        self.assertEqual(set(predictions[0]), {'disease_label', 'disease_probability',
+                                               'pest_label', 'pest_probability'})
+        self.assertGreater(predictions[2]['pest_probability'], predictions[1]['pest_probability'])
+
+    def test_batches_are_capped(self):
+        """
+        Test that a burst larger than max_batch is split across model calls.
+        """
+        model = FakeClassifier()
+        batcher = DynamicBatcher(model, max_batch=2, window_ms=50, workers=1)
+        futures = [batcher.submit(np.zeros((3, 4, 4), dtype=np.float32)) for _ in range(5)]
+        for future in futures:
+            future.result(timeout=5)
+        batcher.executor.shutdown()
+        self.assertEqual(sorted(model.batch_sizes), [1, 2, 2])
+
+    def test_model_errors_reach_every_caller(self):
+        """
+        Test that a failing model call fails each request in the batch instead of hanging it.
+        """
+        def broken(batch):
+            raise RuntimeError("bad model")
+
+        batcher = DynamicBatcher(broken, max_batch=4, window_ms=10, workers=1)
+        with self.assertLogs('backend.inference', 'ERROR'), self.assertRaises(RuntimeError):
+            asyncio.run(batcher.predict(png(10)))
+        batcher.executor.shutdown()
+
+
+class ImageEngineTests(SimpleTestCase):
+    def test_failed_load_is_not_retried(self):
+        """
+        Test that a model that fails to load is loaded off the event loop once and then fails fast.
+        """
+        on_main_thread = []
+
+        def broken(*args):
+            on_main_thread.append(threading.current_thread() is threading.main_thread())
+            raise OSError("model file is corrupt")
+
+        with mock.patch.object(inference, '_engine', None), \
+                mock.patch.object(inference, '_engine_error', None), \
+                mock.patch.object(inference, 'IMAGE_MODEL_PATH', 'model.onnx'), \
+                mock.patch.object(inference, 'IMAGE_MODEL_LABELS', 'labels.json'), \
+                mock.patch.object(inference, 'OnnxImageClassifier', side_effect=broken) as load:
+            with self.assertLogs('backend.inference', 'ERROR'):
+                for _ in range(3):
+                    with self.assertRaises(ImageModelUnavailable):
+                        asyncio.run(inference.predict_image(png(10)))
+        load.assert_called_once()
+        self.assertEqual(on_main_thread, [False])
@@ -0,0 +1,56 @@
+# backend/tests/test_intents.py
+import numpy as np
+from django.test import SimpleTestCase
+
+from backend.intents import adapt_question, is_covered, mine_intents, normalize_rows
+
+
+def around(axis, count, rng, dimensions=8):
+    base = np.zeros(dimensions)
+    base[axis] = 1.0
+    return [base + rng.normal(scale=0.02, size=dimensions) for _ in range(count)]
+
+
+class MineIntentsTests(SimpleTestCase):
+    def test_intents_are_ranked_by_distinct_plants(self):
+        """
+        Test that the intent asked about the most plants is ranked first and
+        that clusters below the minimum size are dropped.
+        """
+        rng = np.random.default_rng(0)
+        vectors = around(0, 6, rng) + around(1, 4, rng) + around(2, 1, rng)
+        texts = ["How often should I water my fern?"] * 6 + ["Why are the leaves yellow?"] * 4 + ["Odd"]
+        plant_ids = [1, 2, 3, 4, 5, 6] + [1, 1, 1, 1] + [7]
+        intents = mine_intents(vectors, texts, plant_ids, n_intents=3, min_size=2)
+        self.assertEqual([i.question_text for i in intents],
+                         ["How often should I water my fern?", "Why are the leaves yellow?"])
+        self.assertEqual((intents[0].size, intents[0].plant_count), (6, 6))
+        self.assertEqual((intents[1].size, intents[1].plant_count), (4, 1))
+
+    def test_no_questions_gives_no_intents(self):
+        """
+        Test that an empty Q&A table yields no intents.
+        """
+        self.assertEqual(mine_intents([], [], []), [])
+
+
+class CoverageTests(SimpleTestCase):
+    def test_is_covered_uses_threshold(self):
+        """
+        Test that an intent is covered only by a sufficiently similar answered question.
+        """
+        intent = normalize_rows([1.0, 0.0])[0]
+        answered = normalize_rows([[0.0, 1.0], [0.9, 0.1]])
+        self.assertTrue(is_covered(intent, answered, 0.9))
+        self.assertFalse(is_covered(intent, answered[:1], 0.9))
+        self.assertFalse(is_covered(intent, None, 0.9))
+
+    def test_adapt_question_swaps_plant_names(self):
+        """
+        Test that the source plant's name is replaced with the target plant's name.
+        """
+        self.assertEqual(adapt_question("How much light does my Boston Fern need?",
+                                        ("Boston fern", "Nephrolepis exaltata"), "Snake plant"),
+                         "How much light does my Snake plant need?")
+        self.assertEqual(adapt_question("Why are the leaves yellow?", ("Boston fern", None), "Snake plant"),
+                         "Why are the leaves yellow?")
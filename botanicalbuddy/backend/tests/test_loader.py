@@ -0,0 +1,78 @@
+# backend/tests/test_loader.py
+import gzip
+import io
+import json
+import os
+import tempfile
+
+from django.test import SimpleTestCase
+
+from backend.load_trefel_data import (iter_csv_records, iter_dump_records, iter_json_records,
+                                      plant_fields)
+
+RECORDS = [{'id': i, 'common_name': f'Plant {i}', 'description': 'A "quoted" [note] ' * i}
+           for i in range(1, 30)]
+
+
+class DumpReaderTests(SimpleTestCase):
+    def test_json_array_is_read_incrementally(self):
+        """
+        Test that a JSON array is parsed object by object across small read chunks.
+        """
+        text = json.dumps(RECORDS, indent=2)
+        self.assertEqual(list(iter_json_records(io.StringIO(text), chunk_size=7)), RECORDS)
+
+    def test_api_style_document(self):
+        """
+        Test that the records of a {"links": ..., "data": [...]} document are found.
+        """
+        text = json.dumps({'links': {'self': '/plants'}, 'data': RECORDS[:3], 'meta': {'total': 3}})
+        self.assertEqual(list(iter_json_records(io.StringIO(text), chunk_size=5)), RECORDS[:3])
+
+    def test_corrupt_record_stops_at_the_cap(self):
+        """
+        Test that a record that never decodes fails with its offset instead of reading to EOF.
+        """
+        good = json.dumps(RECORDS[0])
+        text = f'[{good}, {{"id": 2, "description": "unterminated' + 'x' * 5000 + '"}]'
+        stream = io.StringIO(text)
+        records = iter_json_records(stream, chunk_size=64, max_record_chars=1000)
+        self.assertEqual(next(records), RECORDS[0])
+        with self.assertRaisesRegex(ValueError, f"record at character {len(good) + 3} "):
+            next(records)
+        self.assertLess(stream.tell(), 2000)
+
+    def test_tsv_delimiter_is_detected(self):
+        """
+        Test that tab-separated dumps are split on tabs and empty cells dropped.
+        """
+        text = "id\tcommon_name\tyear\n1\tFern\t\n2\tMoss\t1753\n"
+        self.assertEqual(list(iter_csv_records(io.StringIO(text))),
+                         [{'id': '1', 'common_name': 'Fern'},
+                          {'id': '2', 'common_name': 'Moss', 'year': '1753'}])
+
+    def test_gzipped_ndjson_dump(self):
+        """
+        Test that a gzipped NDJSON dump is decompressed and read line by line.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'plants.jsonl.gz')
+            with gzip.open(path, 'wt') as f:
+                f.writelines(json.dumps(record) + "\n" for record in RECORDS[:4])
+            self.assertEqual(list(iter_dump_records(path)), RECORDS[:4])
+
+
+class PlantFieldsTests(SimpleTestCase):
+    def test_api_and_flat_records_map_alike(self):
+        """
+        Test that nested API records and flat CSV rows produce the same fields.
+        """
+        api = plant_fields({'common_name': 'Fern', 'maximum_height': {'cm': 40},
+                            'specifications': {'description': 'Shade lover'},
+                            'native_to': ['Europe', 'Western Asia']})
+        flat = plant_fields({'common_name': 'Fern', 'maximum_height_cm': '40',
+                             'description': 'Shade lover',
+                             'native_to': '["Europe", "Western Asia"]'})
+        self.assertEqual(api, flat)
+        self.assertEqual(api['maximum_height'], 40.0)
+        self.assertEqual(api['native_regions'], ['europe', 'western asia'])
@@ -0,0 +1,37 @@
+# backend/tests/test_partitioning.py
+from datetime import date
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase
+
+from backend.management.commands.partition_qa_entries import Command, month_start
+
+
+class PartitionCommandTests(SimpleTestCase):
+    def test_month_start_rolls_over_years(self):
+        """
+        Test that monthly partition bounds step across year boundaries.
+        """
+        self.assertEqual(month_start(date(2026, 11, 17)), date(2026, 11, 1))
+        self.assertEqual(month_start(date(2026, 11, 17), 2), date(2027, 1, 1))
+        self.assertEqual(month_start(date(2026, 1, 5), 12), date(2027, 1, 1))
+
+    def test_requires_postgres(self):
+        """
+        Test that the command refuses to run on databases without declarative partitions.
+        """
+        with self.assertRaisesMessage(CommandError, "PostgreSQL"):
+            call_command('partition_qa_entries', 'status')
+
+    def test_copy_with_gaps_is_refused(self):
+        """
+        Test that the swap check names the ranges whose row counts differ, even if max ids agree.
+        """
+        command = Command()
+        with mock.patch.object(command, 'copy_mismatches', return_value=[(200_000, 812, 790)]):
+            with self.assertRaisesMessage(CommandError, "ids 200000-299999: 790 of 812 rows"):
+                command.check_copy()
+        with mock.patch.object(command, 'copy_mismatches', return_value=[]):
+            command.check_copy()
@@ -0,0 +1,106 @@
+# backend/tests/test_profiling.py
+import asyncio
+import json
+import tempfile
+import time
+from pathlib import Path
+from unittest import mock
+
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase
+
+from backend import profiling
+from backend.profiling import ProfilingMiddleware, RequestProfile, make_profile_token, stage
+
+
+def slow_view(request):
+    with stage("work"):
+        time.sleep(0.05)
+    return HttpResponse("ok")
+
+
+async def slow_async_view(request):
+    with stage("work"):
+        await asyncio.sleep(0.05)
+    return HttpResponse("ok")
+
+
+class ProfilingMiddlewareTests(SimpleTestCase):
+    def setUp(self):
+        self.output_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.output_dir.cleanup)
+        patcher = mock.patch.object(profiling, 'OUTPUT_DIR', self.output_dir.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.factory = RequestFactory()
+
+    def test_unprofiled_requests_pass_through(self):
+        """
+        Test that requests without a trigger are not profiled.
+        """
+        response = ProfilingMiddleware(slow_view)(self.factory.get('/x/'))
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(list(Path(self.output_dir.name).iterdir()), [])
+
+    def test_invalid_token_is_ignored(self):
+        """
+        Test that a forged profile header does not trigger profiling.
+        """
+        request = self.factory.get('/x/', HTTP_X_PROFILE='forged')
+        response = ProfilingMiddleware(slow_view)(request)
+        self.assertNotIn('X-Profile-Id', response)
+
+    def test_signed_header_writes_profiles(self):
+        """
+        Test that a signed header profiles a sync request and writes all outputs.
+        """
+        request = self.factory.get('/x/', HTTP_X_PROFILE=make_profile_token(),
+                                   HTTP_X_REQUEST_ID='req-1')
+        response = ProfilingMiddleware(slow_view)(request)
+        self.assertEqual(response['X-Profile-Id'], 'req-1')
+        base = Path(self.output_dir.name) / 'req-1'
+        collapsed = Path(f"{base}.collapsed").read_text()
+        self.assertIn("request GET /x/;stage:work;", collapsed)
+        self.assertIn("slow_view", collapsed)
+        meta = json.loads(Path(f"{base}.meta.json").read_text())
+        self.assertEqual((meta['trigger'], meta['status']), ('header', 200))
+        self.assertEqual([s['name'] for s in meta['stages']], ['work'])
+        speedscope = json.loads(Path(f"{base}.speedscope.json").read_text())
+        self.assertEqual([p['type'] for p in speedscope['profiles']], ['sampled', 'evented'])
+
+    async def test_async_request_records_await_chain(self):
+        """
+        Test that an async request is sampled through its task's await chain.
+        """
+        request = self.factory.get('/y/', HTTP_X_PROFILE=make_profile_token(),
+                                   HTTP_X_REQUEST_ID='req-2')
+        response = await ProfilingMiddleware(slow_async_view)(request)
+        self.assertEqual(response['X-Profile-Id'], 'req-2')
+        collapsed = (Path(self.output_dir.name) / 'req-2.collapsed').read_text()
+        self.assertIn("slow_async_view", collapsed)
+
+    def test_slow_threshold_skips_fast_requests(self):
+        """
+        Test that the slow-request trigger only profiles requests past the threshold.
+        """
+        with mock.patch.object(profiling, 'SLOW_THRESHOLD', 0.5):
+            response = ProfilingMiddleware(slow_view)(self.factory.get('/x/'))
+        self.assertNotIn('X-Profile-Id', response)
+
+
+class StageTests(SimpleTestCase):
+    def test_stage_is_noop_without_profile(self):
+        """
+        Test that stage() can be used outside a profiled request.
+        """
+        with stage("anything"):
+            pass
+
+    def test_overlapping_stages_skip_evented_profile(self):
+        """
+        Test that stages that overlap without nesting are left out of the timeline.
+        """
+        profile = RequestProfile('r', 'GET /', 'header')
+        profile.stages = [('a', 0.0, 0.2), ('b', 0.1, 0.3)]
+        document = profiling.to_speedscope(profile, 0.3)
+        self.assertEqual([p['type'] for p in document['profiles']], [])
@@ -0,0 +1,65 @@
+# backend/tests/test_recommendations.py
+from unittest import mock
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from backend.recommendations import catalog_filters, recommend_plants, running_mean
+
+
+class RunningMeanTests(SimpleTestCase):
+    def test_add_and_remove_match_full_mean(self):
+        """
+        Test that incremental updates give the same mean as recomputing from scratch.
+        """
+        rng = np.random.default_rng(0)
+        vectors = rng.standard_normal((4, 8))
+        mean, count = None, 0
+        for vector in vectors:
+            mean, count = running_mean(mean, count, vector, 1)
+        np.testing.assert_allclose(mean, vectors.mean(axis=0))
+        mean, count = running_mean(mean, count, vectors[0], -1)
+        self.assertEqual(count, 3)
+        np.testing.assert_allclose(mean, vectors[1:].mean(axis=0))
+
+    def test_removing_last_vector_clears_mean(self):
+        """
+        Test that removing the only favourite leaves an empty profile.
+        """
+        mean, count = running_mean(None, 0, [1.0, 0.0], 1)
+        self.assertEqual(running_mean(mean, count, [1.0, 0.0], -1), (None, 0))
+
+
+class CatalogFilterTests(SimpleTestCase):
+    def test_light_terms_are_alternatives(self):
+        """
+        Test that each comma separated light term is an alternative match.
+        """
+        filters = str(catalog_filters("full sun, partial shade", "Europe"))
+        self.assertIn("('sunlight_requirements__icontains', 'full sun')", filters)
+        self.assertIn("('sunlight_requirements__icontains', 'partial shade')", filters)
+        self.assertIn("OR", filters)
+        self.assertIn("('native_regions__contains', ['europe'])", filters)
+
+    def test_empty_preferences_do_not_filter(self):
+        """
+        Test that missing preferences leave the catalog unfiltered.
+        """
+        self.assertEqual(len(catalog_filters("", None)), 0)
+
+
+class RecommendPlantsTests(SimpleTestCase):
+    def test_empty_region_falls_back_to_unfiltered(self):
+        """
+        Test that a region matching no plants is dropped instead of returning nothing.
+        """
+        user = mock.Mock()
+        fallback = [{'id': 1, 'common_name': 'Lavender', 'similarity': 0.9}]
+        with mock.patch('backend.recommendations.UserTasteProfile') as profiles, \
+                mock.patch('backend.recommendations.nearest_plants',
+                           side_effect=[[], fallback]) as nearest:
+            profiles.objects.filter.return_value.exists.return_value = True
+            results = recommend_plants(user, 5, light="full sun", location="my back garden")
+        self.assertEqual(results, fallback)
+        self.assertIn('native_regions__contains', str(nearest.call_args_list[0][0][3]))
+        self.assertNotIn('native_regions__contains', str(nearest.call_args_list[1][0][3]))
@@ -0,0 +1,32 @@
+# backend/tests/test_regions.py
+from django.test import SimpleTestCase, override_settings
+
+from backend.regions import bump_catalog_version, normalize_regions, region_cache_key
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                            'LOCATION': 'test-regions'}}
+
+
+class NormalizeRegionsTests(SimpleTestCase):
+    def test_accepts_stored_shapes(self):
+        """
+        Test that strings, lists, named objects and distribution dicts normalize alike.
+        """
+        self.assertEqual(normalize_regions("Europe,  Western Asia."), ["europe", "western asia"])
+        self.assertEqual(normalize_regions(["Europe", "europe ", None]), ["europe"])
+        self.assertEqual(normalize_regions([{"name": "Chile"}, {"name": "Peru"}]), ["chile", "peru"])
+        self.assertEqual(normalize_regions({"native": ["Japan"], "introduced": ["Korea"]}), ["japan"])
+        self.assertEqual(normalize_regions(None), [])
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class CatalogVersionTests(SimpleTestCase):
+    def test_bumping_version_changes_cache_keys(self):
+        """
+        Test that a catalog change moves region queries to new cache keys.
+        """
+        params = {'region': 'europe', 'filters': {}}
+        before = region_cache_key(params)
+        self.assertEqual(before, region_cache_key(params))
+        bump_catalog_version()
+        self.assertNotEqual(before, region_cache_key(params))
@@ -0,0 +1,80 @@
+# backend/tests/test_reminders.py
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from django.test import SimpleTestCase
+
+from backend.models import CareReminder
+from backend.notifications import LocalNotificationSink, Notification
+from backend.reminders import (apply_quiet_hours, kind_enabled, next_due, reminder_interval)
+
+
+def at(hour, minute=0):
+    return datetime(2024, 5, 1, hour, minute, tzinfo=timezone.utc)
+
+
+class ReminderIntervalTests(SimpleTestCase):
+    def test_watering_interval_from_requirements(self):
+        """
+        Test that watering intervals follow explicit periods first, then keywords.
+        """
+        def interval(text):
+            return reminder_interval(SimpleNamespace(water_requirements=text), CareReminder.WATERING)
+
+        self.assertEqual(interval("Water every 10 days"), timedelta(days=10))
+        self.assertEqual(interval("Once every 2 weeks"), timedelta(days=14))
+        self.assertEqual(interval("Keep soil moist"), timedelta(days=2))
+        self.assertEqual(interval("Drought tolerant"), timedelta(days=14))
+        self.assertEqual(interval(None), timedelta(days=7))
+
+    def test_light_interval_from_requirements(self):
+        """
+        Test that light check intervals follow the sunlight requirements.
+        """
+        def interval(text):
+            return reminder_interval(SimpleNamespace(sunlight_requirements=text), CareReminder.LIGHT)
+
+        self.assertEqual(interval("Full sun"), timedelta(days=14))
+        self.assertEqual(interval("Bright indirect light"), timedelta(days=21))
+        self.assertEqual(interval("Shade"), timedelta(days=30))
+
+
+class ReminderScheduleTests(SimpleTestCase):
+    def test_preferences_disable_kinds(self):
+        """
+        Test that reminders can be disabled globally or per kind.
+        """
+        self.assertTrue(kind_enabled(None, CareReminder.WATERING))
+        self.assertFalse(kind_enabled({'reminders': False}, CareReminder.WATERING))
+        self.assertFalse(kind_enabled({'light': False}, CareReminder.LIGHT))
+        self.assertTrue(kind_enabled({'light': False}, CareReminder.WATERING))
+
+    def test_quiet_hours_wrapping_midnight(self):
+        """
+        Test that due times inside quiet hours move to the end of them.
+        """
+        preferences = {'quiet_hours': {'start': 22, 'end': 7}}
+        self.assertEqual(apply_quiet_hours(at(23, 30), preferences), at(7) + timedelta(days=1))
+        self.assertEqual(apply_quiet_hours(at(3), preferences), at(7))
+        self.assertEqual(apply_quiet_hours(at(12), preferences), at(12))
+        self.assertEqual(apply_quiet_hours(at(3), None), at(3))
+
+    def test_next_due_skips_missed_intervals(self):
+        """
+        Test that an overdue reminder is rescheduled once past now, not once per missed interval.
+        """
+        interval = timedelta(days=7)
+        self.assertEqual(next_due(at(9), interval, at(10)), at(9) + interval)
+        self.assertEqual(next_due(at(9), interval, at(9) + timedelta(days=20)), at(9) + 3 * interval)
+
+
+class LocalNotificationSinkTests(SimpleTestCase):
+    def test_sink_records_notifications(self):
+        """
+        Test that the local sink keeps sent notifications for inspection.
+        """
+        sink = LocalNotificationSink(keep=1)
+        for plant in ("Fern", "Cactus"):
+            sink.send(Notification(1, "a@example.com", 1, plant, CareReminder.WATERING,
+                                   f"Time to water your {plant}.", at(9)))
+        self.assertEqual([n.plant_name for n in sink.sent], ["Cactus"])
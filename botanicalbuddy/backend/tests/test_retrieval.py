@@ -0,0 +1,86 @@
+# backend/tests/test_retrieval.py
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from backend.pydanticai import PlantData, RelatedAnswer
+from backend.retrieval import fetch_neighbours_batch, pack_context
+from backend.utils import estimate_tokens
+
+
+class PackContextTests(SimpleTestCase):
+    def setUp(self):
+        self.primary = PlantData(plant_name="Rose", scientific_name="Rosa damascena",
+                                 similarity=1.0)
+
+    def test_primary_plant_is_always_first(self):
+        """
+        Test that the plant the user asked about leads the packed context.
+        """
+        related = [PlantData(plant_name="Dog rose", similarity=0.8)]
+        context = pack_context(self.primary, related, [], token_budget=1000)
+        self.assertEqual([p.plant_name for p in context.plants], ["Rose", "Dog rose"])
+
+    def test_candidates_are_taken_by_similarity_within_budget(self):
+        """
+        Test that lower-similarity candidates are dropped once the budget is spent.
+        """
+        answers = [
+            RelatedAnswer(question_text="How often to water?", answer_text="Weekly.",
+                          similarity=0.9),
+            RelatedAnswer(question_text="When to prune?", answer_text="x" * 400,
+                          similarity=0.7),
+        ]
+        budget = (estimate_tokens(self.primary.to_prompt())
+                  + estimate_tokens(answers[0].to_prompt()))
+        context = pack_context(self.primary, [], answers, token_budget=budget)
+        self.assertEqual(context.answers, answers[:1])
+        self.assertLessEqual(context.token_count, budget)
+
+    def test_smaller_candidates_fill_the_budget_after_a_large_one(self):
+        """
+        Test that a candidate too large for the budget is skipped without ending the packing.
+        """
+        answers = [
+            RelatedAnswer(question_text="When to prune?", answer_text="x" * 400, similarity=0.9),
+            RelatedAnswer(question_text="How often to water?", answer_text="Weekly.",
+                          similarity=0.7),
+        ]
+        budget = (estimate_tokens(self.primary.to_prompt())
+                  + estimate_tokens(answers[1].to_prompt()))
+        context = pack_context(self.primary, [], answers, token_budget=budget)
+        self.assertEqual(context.answers, answers[1:])
+
+    def test_top_answer_ignores_budget(self):
+        """
+        Test that the best cached answer is reported even if it does not fit.
+        """
+        answer = RelatedAnswer(question_text="Why are leaves yellow?",
+                               answer_text="x" * 4000, similarity=0.95)
+        context = pack_context(self.primary, [], [answer], token_budget=100)
+        self.assertEqual(context.answers, [])
+        self.assertEqual(context.top_answer, answer)
+
+
+class FetchNeighboursBatchTests(SimpleTestCase):
+    def test_rows_are_grouped_by_question(self):
+        """
+        Test that one query serves every question and its rows go back to the right one.
+        """
+        rows = [
+            (2, 'answer', 0.1, {'question_text': 'Water?', 'answer_text': 'Weekly.'}),
+            (1, 'plant', 0.25, {'plant_name': 'Dog rose'}),
+            (2, 'plant', 0.5, {'plant_name': 'Sweetbriar'}),
+        ]
+        connection = mock.MagicMock()
+        cursor = connection.cursor.return_value.__enter__.return_value
+        cursor.fetchall.return_value = rows
+        with mock.patch('backend.retrieval.connections', {'default': connection}):
+            (plants1, answers1), (plants2, answers2) = fetch_neighbours_batch(
+                [[1.0, 0.0], [0.0, 1.0]], plant_id=7)
+        cursor.execute.assert_called_once()
+        self.assertIn('{"[1.0,0.0]","[0.0,1.0]"}', cursor.execute.call_args[0][1])
+        self.assertEqual([(p.plant_name, p.similarity) for p in plants1], [('Dog rose', 0.75)])
+        self.assertEqual(answers1, [])
+        self.assertEqual([p.plant_name for p in plants2], ['Sweetbriar'])
+        self.assertEqual([a.answer_text for a in answers2], ['Weekly.'])
@@ -0,0 +1,83 @@
+# backend/tests/test_routers.py
+import contextvars
+from unittest import mock
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from backend import routers
+from backend.models import CareReminder, PlantData, QAEntry
+from backend.routers import ReplicaPinningMiddleware, ReplicaRouter, client_key, pin_key
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                            'LOCATION': 'test-routers'}}
+
+
+def in_fresh_context(func):
+    """
+    Runs a test body in its own context so pins don't leak between tests.
+    """
+    def wrapper(*args, **kwargs):
+        return contextvars.copy_context().run(func, *args, **kwargs)
+    return wrapper
+
+
+@override_settings(DATABASE_REPLICAS=['replica_0'], CACHES=LOCMEM_CACHE)
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+        patcher = mock.patch.object(routers.lag_monitor, 'lag', return_value=0.0)
+        self.lag = patcher.start()
+        self.addCleanup(patcher.stop)
+        cache.clear()
+
+    @in_fresh_context
+    def test_catalog_reads_go_to_replica(self):
+        """
+        Test that PlantData and QAEntry reads use the replica and other models are left alone.
+        """
+        self.assertEqual(self.router.db_for_read(PlantData), 'replica_0')
+        self.assertEqual(self.router.db_for_read(QAEntry), 'replica_0')
+        self.assertIsNone(self.router.db_for_read(CareReminder))
+
+    @in_fresh_context
+    def test_lagging_replica_falls_back_to_primary(self):
+        """
+        Test that reads go to the primary when the replica is too far behind.
+        """
+        self.lag.return_value = routers.REPLICA_MAX_LAG + 1
+        self.assertEqual(self.router.db_for_read(PlantData), 'default')
+
+    @in_fresh_context
+    def test_write_pins_reads_and_client(self):
+        """
+        Test that a write sends later reads to the primary and pins the client in the cache.
+        """
+        routers._client_key.set('client')
+        self.assertEqual(self.router.db_for_write(QAEntry), 'default')
+        self.assertEqual(self.router.db_for_read(PlantData), 'default')
+        self.assertTrue(cache.get(pin_key('client')))
+
+    def test_replicas_are_not_migrated(self):
+        """
+        Test that migrations never run against a replica alias.
+        """
+        self.assertFalse(self.router.allow_migrate('replica_0', 'backend'))
+        self.assertIsNone(self.router.allow_migrate('default', 'backend'))
+
+    @in_fresh_context
+    def test_middleware_pins_recent_writer(self):
+        """
+        Test that a client that wrote recently has its next request pinned to the primary.
+        """
+        request = RequestFactory().get('/', HTTP_AUTHORIZATION='Bearer token')
+        seen = []
+        middleware = ReplicaPinningMiddleware(
+            lambda request: seen.append(self.router.db_for_read(PlantData)) or HttpResponse())
+
+        middleware(request)
+        cache.set(pin_key(client_key(request)), True)
+        middleware(request)
+        self.assertEqual(seen, ['replica_0', 'default'])
+        self.assertFalse(routers.is_pinned())
@@ -0,0 +1,30 @@
+# backend/tests/test_utils.py
+from django.test import SimpleTestCase
+
+from backend.utils import batch_by_tokens, estimate_tokens
+
+
+class BatchByTokensTests(SimpleTestCase):
+    def test_batches_stay_within_token_budget(self):
+        """
+        Test that batches are split before they exceed the token budget.
+        """
+        texts = ["a" * 40] * 10  # 11 estimated tokens each
+        batches = list(batch_by_tokens(texts, max_tokens=35))
+        self.assertEqual([len(b) for b in batches], [3, 3, 3, 1])
+        for batch in batches:
+            self.assertLessEqual(sum(estimate_tokens(t) for t in batch), 35)
+
+    def test_batches_respect_max_items(self):
+        """
+        Test that batches are split at max_items even under the token budget.
+        """
+        batches = list(batch_by_tokens(range(5), text_of=str, max_items=2))
+        self.assertEqual(batches, [[0, 1], [2, 3], [4]])
+
+    def test_oversized_item_gets_its_own_batch(self):
+        """
+        Test that an item larger than the budget is still emitted.
+        """
+        batches = list(batch_by_tokens(["short", "x" * 400, "short"], max_tokens=20))
+        self.assertEqual([len(b) for b in batches], [1, 1, 1])
@@ -0,0 +1,62 @@
+# backend/tests/test_vectorstore.py
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from backend.utils import CHARS_PER_TOKEN
+from backend.vectorstore import embed_texts, split_into_chunks
+
+
+class SplitIntoChunksTests(SimpleTestCase):
+    def test_short_paragraphs_are_packed_together(self):
+        """
+        Test that paragraphs share a chunk while they fit in the budget.
+        """
+        text = "Watered the fern.\n\nMoved the cactus to the window.\n\n\nRepotted the monstera."
+        self.assertEqual(split_into_chunks(text, max_tokens=200),
+                         ["Watered the fern.\nMoved the cactus to the window.\nRepotted the monstera."])
+
+    def test_long_paragraph_is_windowed_with_overlap(self):
+        """
+        Test that an oversized paragraph is split into overlapping windows within budget.
+        """
+        words = [f"word{i}" for i in range(200)]
+        chunks = split_into_chunks(" ".join(words), max_tokens=50, overlap_tokens=10)
+        self.assertGreater(len(chunks), 1)
+        self.assertTrue(all(len(chunk) <= 50 * CHARS_PER_TOKEN for chunk in chunks))
+        first, second = chunks[0].split(), chunks[1].split()
+        self.assertIn(second[0], first)
+        self.assertEqual(chunks[-1].split()[-1], "word199")
+        covered = {word for chunk in chunks for word in chunk.split()}
+        self.assertEqual(covered, set(words))
+
+    def test_empty_text_has_no_chunks(self):
+        """
+        Test that whitespace-only documents produce nothing to embed.
+        """
+        self.assertEqual(split_into_chunks(" \n\n \n"), [])
+
+
+class EmbedTextsTests(SimpleTestCase):
+    async def test_embeddings_keep_input_order_across_batches(self):
+        """
+        Test that batched embeddings are returned in the order of the input texts.
+        """
+        async def fake_embeddings(batch, client=None):
+            return [[float(text.split()[1])] for text in batch]
+
+        texts = [f"note {i} " + "x" * 10000 for i in range(5)]
+        with mock.patch('backend.vectorstore.get_embeddings', side_effect=fake_embeddings) as embed:
+            vectors = await embed_texts(texts, concurrency=2)
+        self.assertGreater(embed.call_count, 1)
+        self.assertEqual(vectors, [[0.0], [1.0], [2.0], [3.0], [4.0]])
+
+    async def test_any_failed_batch_fails_ingest(self):
+        """
+        Test that a failed batch fails the whole embedding call.
+        """
+        async def failing(batch, client=None):
+            return None
+
+        with mock.patch('backend.vectorstore.get_embeddings', side_effect=failing):
+            self.assertIsNone(await embed_texts(["a", "b"]))
@@ -0,0 +1,123 @@
+# backend/tests/test_writebehind.py
+import threading
+from types import SimpleNamespace
+
+from django.test import SimpleTestCase
+
+from backend.writebehind import QAEntryWriteBuffer
+
+
+class RecordingWriter:
+    def __init__(self, failures=0):
+        self.batches = []
+        self.failures = failures
+        self.written = threading.Event()
+
+    def __call__(self, rows):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("database unavailable")
+        self.batches.append(rows)
+        self.written.set()
+
+
+def plant(pk):
+    return SimpleNamespace(pk=pk)
+
+
+class QAEntryWriteBufferTests(SimpleTestCase):
+    def test_flushes_when_batch_size_is_reached(self):
+        """
+        Test that the background thread writes a full batch without waiting for the delay.
+        """
+        writer = RecordingWriter()
+        buffer = QAEntryWriteBuffer(writer=writer, max_batch=2, max_delay=60)
+        buffer.submit(plant(1), "Why are the leaves yellow?", [1.0, 0.0], "Overwatering.")
+        buffer.submit(plant(1), "How much light?", [0.0, 1.0], "Bright, indirect.")
+        self.assertTrue(writer.written.wait(2))
+        buffer.close()
+        self.assertEqual(len(writer.batches[0]), 2)
+        self.assertEqual(buffer.stats()['flushed'], 2)
+
+    def test_close_flushes_pending_rows(self):
+        """
+        Test that closing the buffer writes rows that have not reached a threshold.
+        """
+        writer = RecordingWriter()
+        buffer = QAEntryWriteBuffer(writer=writer, max_batch=100, max_delay=60)
+        buffer.submit(plant(1), "How often should I water?", [1.0, 0.0], "Weekly.")
+        self.assertEqual(buffer.stats()['pending'], 1)
+        buffer.close()
+        self.assertEqual(buffer.stats()['pending'], 0)
+        self.assertEqual(writer.batches[0][0]['plant_id'], 1)
+
+    def test_dedupes_near_identical_questions_per_plant(self):
+        """
+        Test that repeated questions about the same plant are written once.
+        """
+        buffer = QAEntryWriteBuffer(writer=RecordingWriter(), dedupe_threshold=0.98)
+        rows = [
+            {'plant_id': 1, 'question_text': "Why are leaves yellow?", 'question_vector': [1.0, 0.0]},
+            {'plant_id': 1, 'question_text': "why are  leaves yellow?", 'question_vector': None},
+            {'plant_id': 1, 'question_text': "Why are my leaves yellow", 'question_vector': [0.99, 0.01]},
+            {'plant_id': 2, 'question_text': "Why are leaves yellow?", 'question_vector': [1.0, 0.0]},
+            {'plant_id': 1, 'question_text': "How much light?", 'question_vector': [0.0, 1.0]},
+        ]
+        kept = buffer.dedupe(rows)
+        self.assertEqual([(r['plant_id'], r['question_text']) for r in kept],
+                         [(1, "Why are leaves yellow?"), (2, "Why are leaves yellow?"),
+                          (1, "How much light?")])
+
+    def test_failed_flush_is_retried_then_dropped(self):
+        """
+        Test that a failed batch stays buffered for a retry and is counted once dropped.
+        """
+        writer = RecordingWriter(failures=2)
+        buffer = QAEntryWriteBuffer(writer=writer, max_retries=1, retry_delay=0)
+        buffer.submit(plant(1), "Is it toxic to cats?", [1.0, 0.0], "Yes.")
+        self.assertEqual(buffer.flush(), 0)
+        self.assertEqual(buffer.stats()['pending'], 1)
+        self.assertEqual(buffer.flush(), 0)
+        stats = buffer.stats()
+        self.assertEqual((stats['pending'], stats['failed']), (0, 1))
+        buffer.close()
+
+    def test_retries_back_off(self):
+        """
+        Test that a failed batch is not retried before its backoff delay has passed.
+        """
+        writer = RecordingWriter(failures=1)
+        buffer = QAEntryWriteBuffer(writer=writer, max_delay=60, retry_delay=60)
+        buffer.submit(plant(1), "Is it toxic to cats?", [1.0, 0.0], "Yes.")
+        buffer.flush()
+        self.assertFalse(buffer._due())
+        self.assertEqual(buffer.flush(), 0)
+        self.assertEqual((writer.batches, buffer.stats()['retrying']), ([], 1))
+        buffer.close()
+        self.assertEqual(len(writer.batches), 1)
+
+    def test_new_rows_do_not_share_a_failed_batch_attempts(self):
+        """
+        Test that rows submitted after a failure are written even when the failed batch is dropped.
+        """
+        writer = RecordingWriter(failures=1)
+        buffer = QAEntryWriteBuffer(writer=writer, max_retries=0, retry_delay=0)
+        buffer.submit(plant(1), "Is it toxic to cats?", [1.0, 0.0], "Yes.")
+        buffer.flush()
+        buffer.submit(plant(2), "How much light?", [0.0, 1.0], "Bright, indirect.")
+        self.assertEqual(buffer.flush(), 1)
+        stats = buffer.stats()
+        self.assertEqual((stats['flushed'], stats['failed']), (1, 1))
+        self.assertEqual(writer.batches[0][0]['plant_id'], 2)
+        buffer.close()
+
+    def test_full_buffer_drops_new_entries(self):
+        """
+        Test that submissions beyond max_pending are rejected and counted.
+        """
+        buffer = QAEntryWriteBuffer(writer=RecordingWriter(), max_batch=10, max_delay=60,
+                                    max_pending=1)
+        self.assertTrue(buffer.submit(plant(1), "a", None, "x"))
+        self.assertFalse(buffer.submit(plant(1), "b", None, "y"))
+        self.assertEqual(buffer.stats()['dropped'], 1)
+        buffer.close()
@@ -5,10 +5,20 @@ app_name = 'backend'
 
 urlpatterns = [
     path('ask_botanical_question/', views.ask_botanical_question, name='ask_botanical_question'),
+    path('ask_botanical_questions/', views.ask_botanical_questions, name='ask_botanical_questions'),
     path('upload_image/', views.upload_image, name='upload_image'),
     path('create_plant_data/', views.create_plant_data, name='create_plant_data'),
     path('get_plant_data/<int:pk>/', views.get_plant_data, name='get_plant_data'),
     path('create_qa_entry/', views.create_qa_entry, name='create_qa_entry'),
     path('get_qa_entry/<int:pk>/', views.get_qa_entry, name='get_qa_entry'),
+    path('native_plants/', views.native_plants, name='native_plants'),
+    path('recommendations/', views.recommend_plants_view, name='recommendations'),
+    path('collections/', views.vector_collections, name='vector_collections'),
+    path('collections/search/', views.search_collections, name='search_collections'),
+    path('collections/<int:pk>/documents/', views.ingest_collection_documents,
+         name='ingest_collection_documents'),
+    path('catalog/manifest/', views.catalog_manifest, name='catalog_manifest'),
+    path('catalog/<str:name>/', views.catalog_bundle, name='catalog_bundle'),
+    path('write_buffer_stats/', views.write_buffer_stats, name='write_buffer_stats'),
     # ... other URL patterns ...
 ]
\ No newline at end of file
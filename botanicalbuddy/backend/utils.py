@@ -5,6 +5,43 @@ import logging
 import numpy as np
 
 logger=logging.getLogger(__name__)
+
+# Rough characters-per-token ratio for English text with the OpenAI tokenizers.
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text):
+    """
+    Estimates the token count of a text without calling a tokenizer.
+    """
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def batch_by_tokens(items, text_of=lambda item: item, max_tokens=8000, max_items=512):
+    """
+    Groups items into batches whose estimated token count stays under max_tokens.
+
+    Args:
+        items (iterable): The items to batch; consumed lazily.
+        text_of (callable, optional): Returns the text of an item.
+        max_tokens (int, optional): Token budget per batch.
+        max_items (int, optional): Maximum number of items per batch.
+
+    Yields:
+        list: Batches of items. An item larger than max_tokens gets a batch of its own.
+    """
+    batch, batch_tokens = [], 0
+    for item in items:
+        tokens = estimate_tokens(text_of(item))
+        if batch and (batch_tokens + tokens > max_tokens or len(batch) >= max_items):
+            yield batch
+            batch, batch_tokens = [], 0
+        batch.append(item)
+        batch_tokens += tokens
+    if batch:
+        yield batch
+
+
 async def get_embedding(text, model="text-embedding-ada-002"):
     """
     Asynchronously generates an OpenAI embedding for a given text, using the specified model.
@@ -20,11 +57,33 @@ async def get_embedding(text, model="text-embedding-ada-002"):
         openai.api_key = os.environ.get("OPENAI_API_KEY")
         client = AsyncOpenAI()
         response = await client.embeddings.create(input=[text], model=model)
-        return response["data"][0]["embedding"]
+        return response.data[0].embedding
     except Exception as e:
         logger.error(f"Error generating embedding: {e}")
         return None
-    
+
+
+async def get_embeddings(texts, model="text-embedding-ada-002", client=None):
+    """
+    Asynchronously generates OpenAI embeddings for several texts in a single request.
+
+    Args:
+        texts (list): The texts to generate embeddings for.
+        model (str, optional): The model to use. Defaults to "text-embedding-ada-002".
+        client (AsyncOpenAI, optional): A client to reuse across calls.
+
+    Returns:
+        list: One embedding per text, in input order, or None on failure.
+    """
+    try:
+        client = client or AsyncOpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+        response = await client.embeddings.create(input=list(texts), model=model)
+        return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+    except Exception as e:
+        logger.error(f"Error generating embeddings for {len(texts)} texts: {e}")
+        return None
+
+
 def calculate_cosine_similarity(vector1, vector2):
     """
     Calculates the cosine similarity between two vectors.
@@ -33,3 +92,19 @@ def calculate_cosine_similarity(vector1, vector2):
     magnitude1 = np.linalg.norm(vector1)
     magnitude2 = np.linalg.norm(vector2)
     return dot_product / (magnitude1 * magnitude2)
+
+
+def get_backend_user(user):
+    """
+    Returns the backend.models.User with the same username as an
+    authenticated (django.contrib.auth) user, or None if there is none.
+
+    Args:
+        user: The request's authenticated user.
+
+    Returns:
+        User: The profile holding favourites and preferences, or None.
+    """
+    from .models import User
+
+    return User.objects.filter(username=user.get_username()).first()
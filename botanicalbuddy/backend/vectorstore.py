@@ -0,0 +1,226 @@
+import asyncio
+import logging
+import os
+import re
+
+from asgiref.sync import sync_to_async
+from django.db import connection, transaction
+from django.db.models import F, Sum
+from pgvector.django import CosineDistance
+from pgvector.utils import Vector
+
+from .models import User, VectorChunk, VectorDatabase
+from .pydanticai import UserNote
+from .utils import CHARS_PER_TOKEN, batch_by_tokens, get_embeddings
+
+logger = logging.getLogger(__name__)
+
+CHUNK_TOKENS = int(os.environ.get("VECTORSTORE_CHUNK_TOKENS", 200))
+CHUNK_OVERLAP_TOKENS = int(os.environ.get("VECTORSTORE_CHUNK_OVERLAP_TOKENS", 30))
+EMBEDDING_CONCURRENCY = int(os.environ.get("VECTORSTORE_EMBEDDING_CONCURRENCY", 4))
+# Up to this many chunks a user's search is an exact scan of their own rows;
+# above it the shared HNSW index is used. Each 1536-dim chunk is ~6KB, so the
+# default keeps an exact scan to ~30MB, around ten milliseconds.
+EXACT_SEARCH_LIMIT = int(os.environ.get("VECTORSTORE_EXACT_SEARCH_LIMIT", 5000))
+ANN_EF_SEARCH = int(os.environ.get("VECTORSTORE_EF_SEARCH", 200))
+# With pgvector 0.8+, an index search that filters out other users' rows keeps
+# walking the graph until it has k of the user's chunks or has visited this
+# many tuples, instead of returning only what the first ef_search candidates held.
+ANN_MAX_SCAN_TUPLES = int(os.environ.get("VECTORSTORE_MAX_SCAN_TUPLES", 50000))
+NOTES_TOP_K = int(os.environ.get("USER_NOTES_TOP_K", 3))
+NOTES_MIN_SIMILARITY = float(os.environ.get("USER_NOTES_MIN_SIMILARITY", 0.75))
+
+# MATERIALIZED keeps the planner from answering the ORDER BY with the shared
+# HNSW index and filtering afterwards; the user's rows come from the b-tree.
+EXACT_SEARCH_SQL = """
+    WITH candidates AS MATERIALIZED (
+        SELECT id, collection_id, title, position, text, embedding
+          FROM backend_vectorchunk
+         WHERE user_id = %s AND (%s::bigint[] IS NULL OR collection_id = ANY(%s::bigint[]))
+    )
+    SELECT id, collection_id, title, position, text, embedding <=> %s::vector AS distance
+      FROM candidates
+     ORDER BY distance
+     LIMIT %s
+"""
+
+
+def _word_windows(words, max_chars, overlap_chars):
+    start = 0
+    while True:
+        end, length = start, 0
+        while end < len(words) and (end == start or length + len(words[end]) + 1 <= max_chars):
+            length += len(words[end]) + 1
+            end += 1
+        yield " ".join(words[start:end])
+        if end >= len(words):
+            return
+        # Step back over up to overlap_chars of words, always moving forward.
+        back, overlap = end, 0
+        while back - 1 > start + 1 and overlap + len(words[back - 1]) + 1 <= overlap_chars:
+            back -= 1
+            overlap += len(words[back]) + 1
+        start = back
+
+
+def split_into_chunks(text, max_tokens=CHUNK_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+    """
+    Splits a document into chunks of about `max_tokens`.
+
+    Paragraphs are packed together while they fit; a paragraph that is too
+    long on its own is cut into word windows that overlap by `overlap_tokens`.
+
+    Args:
+        text (str): The document text.
+        max_tokens (int, optional): Estimated tokens per chunk.
+        overlap_tokens (int, optional): Estimated tokens repeated between windows.
+
+    Returns:
+        list: The chunk texts, in document order.
+    """
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    chunks, current = [], ""
+    for paragraph in re.split(r'\n\s*\n', text):
+        paragraph = " ".join(paragraph.split())
+        if not paragraph:
+            continue
+        if len(current) + len(paragraph) + 1 <= max_chars:
+            current = f"{current}\n{paragraph}" if current else paragraph
+            continue
+        if current:
+            chunks.append(current)
+            current = ""
+        if len(paragraph) <= max_chars:
+            current = paragraph
+        else:
+            chunks.extend(_word_windows(paragraph.split(" "), max_chars,
+                                        overlap_tokens * CHARS_PER_TOKEN))
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+async def embed_texts(texts, client=None, concurrency=EMBEDDING_CONCURRENCY):
+    """
+    Embeds texts in token-bounded batches, several batches at a time.
+
+    Returns:
+        list: One embedding per text, in order, or None if any batch failed.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def embed(batch):
+        async with semaphore:
+            return await get_embeddings(batch, client=client)
+
+    batches = list(batch_by_tokens(texts))
+    results = await asyncio.gather(*(embed(batch) for batch in batches))
+    if any(result is None for result in results):
+        return None
+    return [vector for result in results for vector in result]
+
+
+@sync_to_async
+def store_chunks(collection, rows, vectors):
+    chunks = [VectorChunk(collection=collection, user_id=collection.user_id, title=title,
+                          position=position, text=text, embedding=vector)
+              for (title, position, text), vector in zip(rows, vectors)]
+    with transaction.atomic():
+        VectorChunk.objects.bulk_create(chunks, batch_size=500)
+        VectorDatabase.objects.filter(pk=collection.pk).update(chunk_count=F('chunk_count') + len(chunks))
+    return len(chunks)
+
+
+async def ingest_documents(collection, documents, client=None):
+    """
+    Chunks, embeds and stores documents in a collection.
+
+    Args:
+        collection (VectorDatabase): The target collection.
+        documents (list): Dicts with "text" and an optional "title".
+        client (AsyncOpenAI, optional): A client to reuse across calls.
+
+    Returns:
+        int: The number of chunks stored, or None if embedding failed.
+    """
+    rows = [((document.get('title') or '')[:255], position, chunk)
+            for document in documents
+            for position, chunk in enumerate(split_into_chunks(document['text']))]
+    if not rows:
+        return 0
+    vectors = await embed_texts([text for _, _, text in rows], client=client)
+    if vectors is None:
+        return None
+    return await store_chunks(collection, rows, vectors)
+
+
+_iterative_scan_supported = None
+
+
+def iterative_scan_supported():
+    """
+    Returns whether the installed pgvector has hnsw.iterative_scan (0.8+);
+    older versions reject the setting.
+    """
+    global _iterative_scan_supported
+    if _iterative_scan_supported is None:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT extversion FROM pg_extension WHERE extname = 'vector'")
+            row = cursor.fetchone()
+        version = tuple(int(part) for part in row[0].split('.')[:2]) if row else (0, 0)
+        _iterative_scan_supported = version >= (0, 8)
+        if not _iterative_scan_supported:
+            logger.warning("pgvector < 0.8: filtered index searches may return fewer "
+                           "than k chunks; upgrade to enable iterative scans.")
+    return _iterative_scan_supported
+
+
+def search_chunks(user_id, vector, k=10, collection_ids=None):
+    """
+    Returns the user's k chunks nearest to a vector, optionally within some
+    collections, as dicts with a similarity score.
+    """
+    collections = VectorDatabase.objects.filter(user_id=user_id)
+    if collection_ids is not None:
+        collections = collections.filter(pk__in=collection_ids)
+    total = collections.aggregate(total=Sum('chunk_count'))['total'] or 0
+    if not total:
+        return []
+
+    fields = ('id', 'collection_id', 'title', 'position', 'text')
+    if total <= EXACT_SEARCH_LIMIT and connection.vendor == 'postgresql':
+        ids = list(collection_ids) if collection_ids is not None else None
+        with connection.cursor() as cursor:
+            cursor.execute(EXACT_SEARCH_SQL, [user_id, ids, ids, Vector._to_db(vector), k])
+            rows = cursor.fetchall()
+        return [{**dict(zip(fields, row[:-1])), 'similarity': 1.0 - row[-1]} for row in rows]
+
+    chunks = VectorChunk.objects.filter(user_id=user_id)
+    if collection_ids is not None:
+        chunks = chunks.filter(collection_id__in=collection_ids)
+    nearest = (chunks.annotate(distance=CosineDistance('embedding', vector))
+               .order_by('distance').values(*fields, 'distance')[:k])
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT set_config('hnsw.ef_search', %s, true)",
+                               [str(max(ANN_EF_SEARCH, k))])
+                if iterative_scan_supported():
+                    cursor.execute("SELECT set_config('hnsw.iterative_scan', 'strict_order', true), "
+                                   "set_config('hnsw.max_scan_tuples', %s, true)",
+                                   [str(ANN_MAX_SCAN_TUPLES)])
+        rows = list(nearest)
+    return [{**{f: row[f] for f in fields}, 'similarity': 1.0 - row['distance']} for row in rows]
+
+
+@sync_to_async
+def search_user_notes(username, vector, k=NOTES_TOP_K, min_similarity=NOTES_MIN_SIMILARITY):
+    """
+    Finds the user's own notes relevant to a question, for the agent's context.
+    """
+    user_id = User.objects.filter(username=username).values_list('pk', flat=True).first()
+    if user_id is None:
+        return []
+    return [UserNote(title=chunk['title'], text=chunk['text'], similarity=chunk['similarity'])
+            for chunk in search_chunks(user_id, vector, k)
+            if chunk['similarity'] >= min_similarity]
@@ -1,25 +1,46 @@
 # backend/views.py
+import asyncio
+import gzip
 import logging
 import json
+import math
 import os
-from io import BytesIO
+from dataclasses import asdict
 
-import requests  # For making API requests to your model
-from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from adrf.decorators import api_view  # Supports async def views
+from rest_framework.decorators import permission_classes
+from rest_framework.permissions import IsAdminUser, IsAuthenticated, AllowAny
 from rest_framework.response import Response
 from rest_framework import status
-from django.http import JsonResponse
+from django.http import FileResponse, JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import quote_etag
 from asgiref.sync import sync_to_async
 from django.db.models import F, Q
 import spacy
 import numpy as np
+from PIL import UnidentifiedImageError
 from .serializers import PlantDataSerializer  # Import your serializer
-from .serializers import QAEntrySerializer
-
-from .models import PlantData as DjangoPlantData, QAEntry
-from .pydanticai import PlantData, Agent, InferenceResult
-from .utils import calculate_cosine_similarity, get_embedding
+from .serializers import QAEntrySerializer, VectorDatabaseSerializer
+
+from .admission import (PRIORITY_HIGH, PRIORITY_NORMAL, Overloaded, admission_controlled,
+                        inference_admission, too_many_requests, user_quotas)
+from .catalog import bundle_file, read_manifest
+from .conversations import get_or_start_conversation, load_history, record_turn
+from .models import PlantData as DjangoPlantData, QAEntry, VectorDatabase
+from .profiling import stage
+from .pydanticai import Agent, InferenceResult, VectorData
+from .diagnosis import arank_diagnoses, rank_diagnoses
+from .entities import aextract_entities, extract_entities
+from .httpcache import conditional_response, get_representation
+from .inference import ImageModelUnavailable, predict_image
+from .retrieval import retrieve_context, retrieve_contexts
+from .routers import pin_to_primary
+from .regions import search_native_plants
+from .recommendations import RECOMMENDATION_TOP_K, recommend_plants
+from .utils import get_backend_user, get_embedding, get_embeddings
+from .vectorstore import ingest_documents, search_chunks, search_user_notes
+from .writebehind import qa_write_buffer
 
 logger = logging.getLogger(__name__)
 agent = Agent()
@@ -42,28 +63,57 @@ def find_closest_match_nlp(text, options):
     return closest_match
 
 
-async def get_similar_qa_entry(question_vector, plant, threshold=0.75):
+async def resolve_plant(plant_name):
+    """
+    Finds the plant a question names, by exact common or scientific name and
+    otherwise by the closest common name.
+
+    Returns:
+        PlantData: The plant without its vector, or None if nothing matches.
+    """
+    query = Q(common_name__iexact=plant_name) | Q(
+        scientific_name__iexact=plant_name)
+    # The plant's own vector is never needed here; skip loading it
+    plants = DjangoPlantData.objects.defer('vector_data')
+    django_plant = await plants.filter(query).afirst()
+    if django_plant is None:
+        plant_names = [
+            name async for name in DjangoPlantData.objects.filter(
+                common_name__isnull=False).values_list('common_name', flat=True)
+        ]
+        closest_match = find_closest_match_nlp(plant_name, plant_names)
+        if closest_match:
+            django_plant = await plants.filter(
+                common_name=closest_match).afirst()
+    return django_plant
+
+
+# Seconds a client is told to wait when OpenAI rate-limits us without saying for how long.
+UPSTREAM_RETRY_AFTER = int(os.environ.get("UPSTREAM_RETRY_AFTER", 30))
+
+
+def inference_error_response(inference_result):
     """
-    Retrieves a similar Q&A entry from the database based on cosine similarity.
+    Maps a failed generation to an error response. An upstream rate limit
+    is a 503 with Retry-After; anything else is a 502. The upstream error
+    text is only logged, never returned.
     """
-    qa_entries = await QAEntry.objects.filter(plant=plant).aall()
-    for entry in qa_entries:
-        similarity = calculate_cosine_similarity(question_vector,
-                                                entry.question_vector)
-        if similarity >= threshold:
-            return entry
-    return None
+    if inference_result.error == "rate_limit":
+        response = Response({'error': 'The answer service is busy. Please retry later.'},
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        response['Retry-After'] = str(math.ceil(inference_result.retry_after or UPSTREAM_RETRY_AFTER))
+        return response
+    return Response({'error': 'Failed to generate an answer.'}, status=status.HTTP_502_BAD_GATEWAY)
 
 
-@sync_to_async
-def create_qa_entry(plant, question_text, question_vector, answer_text):
+async def create_qa_entry(plant, question_text, question_vector, answer_text):
     """
     Creates a new Q&A entry in the database.
     """
-    QAEntry.objects.create(plant=plant,
-                           question_text=question_text,
-                           question_vector=question_vector,
-                           answer_text=answer_text)
+    return await QAEntry.objects.acreate(plant=plant,
+                                         question_text=question_text,
+                                         question_vector=question_vector,
+                                         answer_text=answer_text)
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
@@ -79,6 +129,7 @@ def session_view(request):
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@admission_controlled(cost=2)
 async def upload_image(request):
     if request.method == 'POST':
         if 'image' not in request.FILES:
@@ -88,30 +139,17 @@ async def upload_image(request):
         plant_id = request.POST.get('plant_id')
 
         try:
-            plant = await DjangoPlantData.objects.aget(id=plant_id)
-            plant.image = image_file
-            await sync_to_async(plant.save)()
-
-            # Preprocess the image using Pillow (PIL)
-            image = image.open(image_file)
-            image = image.resize(
-                (224, 224))  # Example resize, adjust as needed
-            # ... other preprocessing steps (e.g., normalization) ...
-
-            # Prepare the image for sending to the OpenAI API
-            image_bytes = BytesIO()
-            image.save(image_bytes, format='PNG')  # Or appropriate format
-            image_bytes.seek(0)
+            plant = await DjangoPlantData.objects.defer('vector_data').aget(id=plant_id)
 
-            # Make a request to your OpenAI model API
-            model_api_url = "your_openai_model_api_endpoint"  # Replace with your actual endpoint
-            response = requests.post(model_api_url,
-                                     files={'image': image_bytes})
-            response.raise_for_status()  # Raise an exception for bad status codes
+            # Decoded, resized and classified on the image engine's thread
+            # pool, batched with other uploads arriving at the same time.
+            # Only an image that decodes is stored on the plant.
+            with stage("image_prediction"):
+                prediction_results = await predict_image(image_file.read())
 
-            # Parse the prediction results
-            prediction_results = response.json()
-            # ... extract the relevant prediction information (e.g., disease label, probability) ...
+            image_file.seek(0)
+            plant.image = image_file
+            await plant.asave(update_fields=['image'])
 
             return JsonResponse(
                 {'status': 'success',
@@ -119,40 +157,52 @@ async def upload_image(request):
 
         except DjangoPlantData.DoesNotExist:
             return JsonResponse({'error': 'Plant not found'}, status=404)
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Error communicating with the model API: {e}")
-            return JsonResponse({
-                'error': 'Failed to get a prediction from the model'
-            },
-                status=500)
+        except UnidentifiedImageError:
+            logger.warning(f"Upload for plant {plant_id} is not a readable image.")
+            return JsonResponse({'error': 'The upload is not a readable image.'}, status=400)
+        except ImageModelUnavailable as e:
+            logger.error(f"Image model unavailable: {e}")
+            return JsonResponse({'error': 'Image diagnosis is not available.'}, status=503)
         except Exception as e:
             logger.exception(f"An unexpected error occurred in upload_image: {e}")
-            return JsonResponse({'error': str(e)}, status=500)
+            return JsonResponse({'error': 'An unexpected error occurred.'}, status=500)
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_qa_entry(request, pk):
     try:
-        qa_entry = QAEntry.objects.get(pk=pk)
+        representation = get_representation(QAEntry, pk, QAEntrySerializer, 'created_at')
     except QAEntry.DoesNotExist:
         return Response({'error': 'QA Entry not found'}, status=status.HTTP_404_NOT_FOUND)
 
-    serializer = QAEntrySerializer(qa_entry)
-    return Response(serializer.data)
+    return conditional_response(request, representation)
 
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@admission_controlled(cost=1)
 async def ask_botanical_question(request):
     """
     This endpoint allows authenticated users to ask questions about plants.
+    Pass `start_conversation: true` to start a conversation, and the
+    `conversation_id` from a previous answer to continue it. Questions sent
+    with neither are answered on their own and nothing is stored for them.
     """
     try:
         user_query = request.data.get('query', '')
         plant_name = request.data.get('plant_name', '')
+        conversation_id = request.data.get('conversation_id')
+        start_conversation = request.data.get('start_conversation') is True
         similarity_threshold = float(
             os.environ.get("SIMILARITY_THRESHOLD", 0.75))
 
+        if conversation_id is not None:
+            try:
+                conversation_id = int(conversation_id)
+            except (TypeError, ValueError):
+                return Response({'error': 'conversation_id must be an integer.'},
+                                status=status.HTTP_400_BAD_REQUEST)
+
         if not user_query:
             logger.warning("Missing 'query' parameter.")
             return Response({'error': 'Missing query parameter.'},
@@ -163,39 +213,59 @@ async def ask_botanical_question(request):
             return Response({'error': 'Missing plant_name parameter.'},
                             status=status.HTTP_400_BAD_REQUEST)
 
-        query = Q(common_name__iexact=plant_name) | Q(
-            scientific_name__iexact=plant_name)
-        django_plant = await DjangoPlantData.objects.filter(query).afirst()
+        django_plant = await resolve_plant(plant_name)
         if django_plant is None:
-            plant_names = [
-                plant.common_name
-                for plant in await DjangoPlantData.objects.aall()
-            ]
-            closest_match = find_closest_match_nlp(plant_name, plant_names)
-            if closest_match:
-                django_plant = await DjangoPlantData.objects.aget(
-                    common_name=closest_match)
-            else:
-                logger.warning(f"Plant '{plant_name}' not found.")
-                return Response({'error': f"Plant '{plant_name}' not found."},
-                                status=status.HTTP_404_NOT_FOUND)
+            logger.warning(f"Plant '{plant_name}' not found.")
+            return Response({'error': f"Plant '{plant_name}' not found."},
+                            status=status.HTTP_404_NOT_FOUND)
+
+        # Only the summary and one window of recent turns are read, so this
+        # costs the same on the first turn and the hundredth.
+        conversation = None
+        history, summary_due = None, False
+        if conversation_id is not None or start_conversation:
+            with stage("conversation"):
+                conversation = await get_or_start_conversation(
+                    request.user.get_username(), conversation_id, django_plant)
+                if conversation is None and conversation_id is not None:
+                    return Response({'error': 'Conversation not found.'},
+                                    status=status.HTTP_404_NOT_FOUND)
+                if conversation is not None:
+                    history, summary_due = await load_history(conversation)
+        # A follow-up depends on earlier turns, so it neither reads nor
+        # writes the shared Q&A cache.
+        follow_up = history is not None and bool(history.summary or history.turns)
+
+        async def reply(response_data):
+            if conversation is not None:
+                await record_turn(conversation, user_query, response_data['answer'], summary_due)
+                response_data['conversation_id'] = conversation.pk
+            return Response(response_data)
 
         # --- Enhanced NLP ---
-        doc = nlp(user_query)
-        entities = [(ent.text, ent.label_) for ent in doc.ents]
-        logger.info(f"Entities identified: {entities}")
+        # Parsed once here and reused by refine_diagnosis
+        with stage("entities"):
+            entities = await aextract_entities(user_query)
+        logger.info(f"Entities identified: {[(m.text, m.label) for m in entities.matches]}")
 
-        # Example: Check if the query is about pests or diseases
-        if any(label in ["PEST", "DISEASE", "SYMPTOM"]
-               for _, label in entities):
+        # Check if the query is about pests, diseases or symptoms
+        if entities.is_diagnostic:
             # Assuming you have the prediction results from the upload_image view
             prediction_results = request.data.get('prediction')
 
+            # Rank likely issues from the image, symptoms and the plant's known issues
+            with stage("diagnosis"):
+                diagnoses = await arank_diagnoses(
+                    prediction_results, entities.symptoms, entities.diseases,
+                    entities.pests, django_plant.common_diseases,
+                    django_plant.common_pests)
+
             # Combine prediction with other information
             diagnosis = refine_diagnosis(prediction_results,
                                         django_plant.common_name,
                                         django_plant.common_diseases,
-                                        django_plant.common_pests, user_query)
+                                        django_plant.common_pests, user_query,
+                                        entities=entities, diagnoses=diagnoses)
 
             # Use the refined diagnosis in the response
             response_data = {
@@ -205,10 +275,14 @@ async def ask_botanical_question(request):
             # Add information about common diseases and pests for the plant
             response_data['common_diseases'] = django_plant.common_diseases
             response_data['common_pests'] = django_plant.common_pests
+            response_data['differential_diagnoses'] = [
+                asdict(d) for d in diagnoses
+            ]
 
-            return Response(response_data)
+            return await reply(response_data)
 
-        question_embedding = get_embedding(user_query)
+        with stage("embedding"):
+            question_embedding = await get_embedding(user_query)
         if question_embedding is None:
             logger.error("Failed to generate user query embedding.")
             return Response({
@@ -216,28 +290,40 @@ async def ask_botanical_question(request):
             },
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-        # Check for similar Q&A entries
-        similar_qa_entry = await get_similar_qa_entry(
-            question_embedding, django_plant, similarity_threshold)
-        if similar_qa_entry:
+        # Retrieve related plants and Q&A entries in a single indexed query
+        with stage("retrieval"):
+            context = await retrieve_context(question_embedding, django_plant)
+        if (not follow_up and context.top_answer
+                and context.top_answer.similarity >= similarity_threshold):
             logger.info("Found similar Q&A entry in the database.")
-            return Response({'answer': similar_qa_entry.answer_text})
+            return await reply({'answer': context.top_answer.answer_text})
+
+        # Include the user's own garden notes that relate to the question
+        with stage("user_notes"):
+            user_notes = await search_user_notes(request.user.get_username(),
+                                                 question_embedding)
 
         # If no similar entry is found, generate a new answer
-        plant_data = PlantData(
-            common_name=django_plant.common_name,
-            scientific_name=django_plant.scientific_name,
-            # ... other relevant fields from django_plant ...
-        )
-        inference_result = agent.run_inference(plant_data, user_query)
+        with stage("inference"):
+            inference_result = await agent.run_sync(
+                VectorData(data=question_embedding), context.plants, user_query,
+                related_answers=context.answers, user_notes=user_notes, history=history)
         if isinstance(inference_result, InferenceResult):
-            answer = inference_result.answer
-            # Create a new Q&A entry asynchronously
-            await create_qa_entry(plant=django_plant,
-                                   question_text=user_query,
-                                   question_vector=question_embedding,
-                                   answer_text=answer)
-            return Response({'answer': answer})
+            # Failed generations are neither cached nor kept in the conversation.
+            if inference_result.error:
+                return inference_error_response(inference_result)
+            answer = inference_result.inference
+            # Queue the new Q&A entry; it is written in the next batch.
+            # Answers drawn from the user's private notes or from earlier
+            # turns of the conversation are returned but never cached.
+            if not user_notes and not follow_up:
+                qa_write_buffer.submit(plant=django_plant,
+                                       question_text=user_query,
+                                       question_vector=question_embedding,
+                                       answer_text=answer)
+                # Keep this client on the primary until the entry has replicated.
+                pin_to_primary()
+            return await reply({'answer': answer})
         else:
             logger.error(f"Inference failed: {inference_result}")
             return Response({'error': 'Failed to generate an answer.'},
@@ -252,27 +338,366 @@ async def ask_botanical_question(request):
         return Response({'error': 'An unexpected error occurred.'},
                         status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+
+MAX_BATCH_QUESTIONS = int(os.environ.get("BATCH_MAX_QUESTIONS", 20))
+BATCH_INFERENCE_CONCURRENCY = int(os.environ.get("BATCH_INFERENCE_CONCURRENCY", 4))
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+async def ask_botanical_questions(request):
+    """
+    Answers several `questions` about one `plant_name` in a single request.
+
+    The plant is resolved once, all questions are embedded in one call and
+    looked up in the Q&A cache with one query, and only the misses go to the
+    agent, a few at a time. Results are streamed as NDJSON lines of
+    {"index", "question", "answer", "cached"} (or "error") as they finish,
+    cached answers first. Questions about an image prediction still go
+    through ask_botanical_question, which runs the diagnosis.
+    """
+    questions = request.data.get('questions')
+    plant_name = request.data.get('plant_name', '')
+    if (not isinstance(questions, list) or not 0 < len(questions) <= MAX_BATCH_QUESTIONS
+            or not all(isinstance(q, str) and q.strip() for q in questions)):
+        return Response({'error': f'questions must be a list of 1 to {MAX_BATCH_QUESTIONS} '
+                                  f'non-empty strings.'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    if not plant_name:
+        return Response({'error': 'Missing plant_name parameter.'},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    # Each question counts against the quota as if it had been asked alone.
+    user = request.user
+    wait = user_quotas.consume(user.pk, len(questions))
+    if wait:
+        logger.info(f"User {user.pk} is over quota; retry in {wait:.1f}s.")
+        return too_many_requests(wait, 'Request quota exceeded. Please retry later.')
+
+    django_plant = await resolve_plant(plant_name)
+    if django_plant is None:
+        logger.warning(f"Plant '{plant_name}' not found.")
+        return Response({'error': f"Plant '{plant_name}' not found."},
+                        status=status.HTTP_404_NOT_FOUND)
+
+    unique_questions = list(dict.fromkeys(questions))
+    with stage("embedding"):
+        embeddings = await get_embeddings(unique_questions)
+    if embeddings is None:
+        return Response({'error': 'Failed to generate question embeddings.'},
+                        status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    with stage("retrieval"):
+        contexts = await retrieve_contexts(embeddings, django_plant)
+
+    similarity_threshold = float(os.environ.get("SIMILARITY_THRESHOLD", 0.75))
+    indexes = {}
+    for index, question in enumerate(questions):
+        indexes.setdefault(question, []).append(index)
+    hits, misses = [], []
+    for question, vector, context in zip(unique_questions, embeddings, contexts):
+        top_answer = context.top_answer
+        if top_answer and top_answer.similarity >= similarity_threshold:
+            hits.append({'question': question, 'answer': top_answer.answer_text, 'cached': True})
+        else:
+            misses.append((question, vector, context))
+    if misses:
+        # Keep this client on the primary until the new entries have replicated.
+        pin_to_primary()
+
+    username = user.get_username()
+    priority = PRIORITY_HIGH if user.is_staff else PRIORITY_NORMAL
+
+    async def answer(question, vector, context, semaphore):
+        result = {'question': question, 'cached': False}
+        try:
+            async with semaphore, inference_admission.slot(priority):
+                user_notes = await search_user_notes(username, vector)
+                inference_result = await agent.run_sync(
+                    VectorData(data=vector), context.plants, question,
+                    related_answers=context.answers, user_notes=user_notes)
+        except Overloaded as e:
+            result.update(error='Server is busy. Please retry later.',
+                          retry_after=math.ceil(e.retry_after))
+            return result
+        except Exception as e:
+            # One failed question must not cut the stream short for the rest.
+            logger.exception(f"Failed to answer batch question '{question}': {e}")
+            result['error'] = 'Failed to generate an answer.'
+            return result
+        if not isinstance(inference_result, InferenceResult):
+            logger.error(f"Inference failed: {inference_result}")
+            result['error'] = 'Failed to generate an answer.'
+            return result
+        # Failures are reported like ask_botanical_question's, never as an answer.
+        if inference_result.error == "rate_limit":
+            result.update(error='The answer service is busy. Please retry later.',
+                          retry_after=math.ceil(inference_result.retry_after or UPSTREAM_RETRY_AFTER))
+            return result
+        if inference_result.error:
+            result['error'] = 'Failed to generate an answer.'
+            return result
+        result['answer'] = inference_result.inference
+        # Cached under the same rules as ask_botanical_question.
+        if not user_notes:
+            qa_write_buffer.submit(plant=django_plant, question_text=question,
+                                   question_vector=vector, answer_text=inference_result.inference)
+        return result
+
+    def lines(result):
+        return "".join(json.dumps({'index': index, **result}) + "\n"
+                       for index in indexes[result['question']])
+
+    async def stream():
+        for result in hits:
+            yield lines(result)
+        semaphore = asyncio.Semaphore(BATCH_INFERENCE_CONCURRENCY)
+        tasks = [asyncio.ensure_future(answer(*miss, semaphore)) for miss in misses]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                yield lines(await finished)
+        finally:
+            # The client went away; stop paying for answers nobody will read.
+            for task in tasks:
+                task.cancel()
+
+    return StreamingHttpResponse(stream(), content_type='application/x-ndjson')
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def recommend_plants_view(request):
+    """
+    Recommends plants close to the user's favourites. Light defaults to the
+    user's preferred_light_conditions and can be overridden with the `light`
+    query parameter. Plants are only filtered by native region when a
+    `location` query parameter names one; the free-text profile location
+    rarely matches a catalog region exactly.
+    """
+    user = get_backend_user(request.user)
+    if user is None:
+        return Response({'error': 'User profile not found.'}, status=status.HTTP_404_NOT_FOUND)
+    try:
+        k = min(int(request.query_params.get('k', RECOMMENDATION_TOP_K)), 50)
+    except ValueError:
+        return Response({'error': 'k must be an integer.'}, status=status.HTTP_400_BAD_REQUEST)
+    light = request.query_params.get('light', user.preferred_light_conditions)
+    location = request.query_params.get('location', '').strip() or None
+    return Response({'results': recommend_plants(user, max(k, 1), light=light, location=location)})
+
+
+# Query parameter -> PlantData lookup accepted alongside the region
+NATIVE_PLANT_FILTERS = {
+    'family': 'family__iexact',
+    'genus': 'genus__iexact',
+    'growth_habit': 'growth_habit__icontains',
+    'flower_color': 'flower_color__icontains',
+    'light': 'sunlight_requirements__icontains',
+    'water': 'water_requirements__icontains',
+    'max_height': 'maximum_height__lte',
+}
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def native_plants(request):
+    """
+    Lists plants native to `region`, optionally narrowed by family, genus,
+    growth_habit, flower_color, light, water and max_height.
+    """
+    region = request.query_params.get('region', '').strip()
+    if not region:
+        return Response({'error': 'Missing region parameter.'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        limit = min(max(int(request.query_params.get('limit', 50)), 1), 200)
+        offset = max(int(request.query_params.get('offset', 0)), 0)
+        filters = {lookup: request.query_params[param]
+                   for param, lookup in NATIVE_PLANT_FILTERS.items() if request.query_params.get(param)}
+        if 'maximum_height__lte' in filters:
+            filters['maximum_height__lte'] = float(filters['maximum_height__lte'])
+    except ValueError:
+        return Response({'error': 'limit, offset and max_height must be numbers.'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    fields = ('id', 'common_name', 'scientific_name', 'family', 'image_url',
+              'sunlight_requirements', 'water_requirements', 'native_regions')
+    return Response(search_native_plants(DjangoPlantData.objects.all(), region, filters,
+                                         limit, offset, fields))
+
+
+MAX_DOCUMENTS_PER_REQUEST = 100
+MAX_DOCUMENT_CHARS = 200_000
+
+
+@api_view(['GET', 'POST'])
+@permission_classes([IsAuthenticated])
+def vector_collections(request):
+    """
+    Lists the user's note collections, or creates one from `name` and `description`.
+    """
+    user = get_backend_user(request.user)
+    if user is None:
+        return Response({'error': 'User profile not found.'}, status=status.HTTP_404_NOT_FOUND)
+    if request.method == 'GET':
+        collections = VectorDatabase.objects.filter(user=user).order_by('-created_at')
+        return Response(VectorDatabaseSerializer(collections, many=True).data)
+    serializer = VectorDatabaseSerializer(data=request.data)
+    if serializer.is_valid():
+        serializer.save(user=user)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+async def ingest_collection_documents(request, pk):
+    """
+    Adds `documents` ([{"title": ..., "text": ...}]) to one of the user's
+    collections. Documents are chunked and embedded in batches.
+    """
+    documents = request.data.get('documents')
+    if (not isinstance(documents, list) or not documents
+            or len(documents) > MAX_DOCUMENTS_PER_REQUEST
+            or not all(isinstance(d, dict) and isinstance(d.get('text'), str) for d in documents)):
+        return Response({'error': f'documents must be a list of 1 to {MAX_DOCUMENTS_PER_REQUEST} '
+                                  f'objects with a text field.'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    if any(len(d['text']) > MAX_DOCUMENT_CHARS for d in documents):
+        return Response({'error': f'Documents are limited to {MAX_DOCUMENT_CHARS} characters.'},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    collection = await VectorDatabase.objects.filter(
+        pk=pk, user__username=request.user.get_username()).afirst()
+    if collection is None:
+        return Response({'error': 'Collection not found.'}, status=status.HTTP_404_NOT_FOUND)
+
+    with stage("ingest"):
+        stored = await ingest_documents(collection, documents)
+    if stored is None:
+        return Response({'error': 'Failed to embed documents.'},
+                        status=status.HTTP_502_BAD_GATEWAY)
+    return Response({'documents': len(documents), 'chunks': stored}, status=status.HTTP_201_CREATED)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+async def search_collections(request):
+    """
+    Returns the user's `k` note chunks most similar to `query`, optionally
+    limited to `collection_ids`.
+    """
+    query = request.data.get('query', '')
+    collection_ids = request.data.get('collection_ids')
+    try:
+        k = min(max(int(request.data.get('k', 10)), 1), 50)
+        if collection_ids is not None:
+            collection_ids = [int(pk) for pk in collection_ids]
+    except (TypeError, ValueError):
+        return Response({'error': 'k and collection_ids must be integers.'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    if not query:
+        return Response({'error': 'Missing query parameter.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    user = await sync_to_async(get_backend_user)(request.user)
+    if user is None:
+        return Response({'error': 'User profile not found.'}, status=status.HTTP_404_NOT_FOUND)
+    with stage("embedding"):
+        query_embedding = await get_embedding(query)
+    if query_embedding is None:
+        return Response({'error': 'Failed to generate query embedding.'},
+                        status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    with stage("search"):
+        results = await sync_to_async(search_chunks)(user.pk, query_embedding, k, collection_ids)
+    return Response({'results': results})
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def write_buffer_stats(request):
+    """
+    Reports the QAEntry write-behind buffer's backlog and counters.
+    """
+    return Response(qa_write_buffer.stats())
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_plant_data(request, pk):
     try:
-        plant = PlantData.objects.get(pk=pk)
-    except PlantData.DoesNotExist:
+        representation = get_representation(DjangoPlantData, pk, PlantDataSerializer, 'updated_at')
+    except DjangoPlantData.DoesNotExist:
         return Response({'error': 'Plant not found'}, status=status.HTTP_404_NOT_FOUND)
 
-    serializer = PlantDataSerializer(plant)
-    return Response(serializer.data)
+    return conditional_response(request, representation)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def catalog_manifest(request):
+    """
+    Names the current catalog bundle and the deltas that lead to it. Clients
+    holding a listed older version fetch its delta; others fetch the bundle.
+    """
+    manifest = read_manifest()
+    if manifest is None:
+        return Response({'error': 'No catalog bundle has been built.'},
+                        status=status.HTTP_404_NOT_FOUND)
+    etag = quote_etag(manifest['version'])
+    response = Response(manifest)
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return get_conditional_response(request, etag=etag, response=response)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def catalog_bundle(request, name):
+    """
+    Serves a catalog bundle or delta, brotli- or gzip-encoded as the client
+    accepts. The names are content hashes, so the files are cached for a year.
+    """
+    found = bundle_file(name, request.headers.get('Accept-Encoding', ''))
+    if found is None:
+        return Response({'error': 'Catalog file not found.'}, status=status.HTTP_404_NOT_FOUND)
+    path, encoding = found
+    etag = quote_etag(f"{name}{'.' + encoding if encoding else ''}")
+    # Checked before any file is opened, so a 304 costs no file handle.
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        if encoding:
+            response = FileResponse(open(path, 'rb'), content_type='application/json')
+            response['Content-Encoding'] = encoding
+        else:
+            # Streamed as it is decompressed; no Content-Length, since
+            # finding it would mean decompressing the whole file first.
+            response = StreamingHttpResponse(decompressed_chunks(path), content_type='application/json')
+    response['ETag'] = etag
+    patch_vary_headers(response, ('Accept-Encoding',))
+    patch_cache_control(response, private=True, max_age=365 * 24 * 3600, immutable=True)
+    return response
+
+
+def decompressed_chunks(path, chunk_size=64 * 1024):
+    with gzip.open(path, 'rb') as f:
+        while chunk := f.read(chunk_size):
+            yield chunk
 
 
 def refine_diagnosis(prediction, plant_name, common_diseases, common_pests,
-                    user_query):
+                    user_query, entities=None, diagnoses=None):
     """
     Refines the initial prediction by combining it with other information.
+
+    Pass the already extracted `entities` and ranked `diagnoses` to avoid
+    recomputing them.
     """
     refined_diagnosis = f"Based on the image analysis and your query, "
+    prediction = prediction or {}
+    disease_probability = prediction.get('disease_probability') or 0
+    pest_probability = prediction.get('pest_probability') or 0
+    common_diseases = common_diseases or []
+    common_pests = common_pests or []
 
     # --- Disease Diagnosis ---
-    if prediction['disease_probability'] > 0.8:  # Example threshold
+    if disease_probability > 0.8:  # Example threshold
         predicted_disease = prediction['disease_label']
         if predicted_disease in common_diseases:
             refined_diagnosis += f"it seems like your {plant_name} might have {predicted_disease}. "
@@ -283,7 +708,7 @@ def refine_diagnosis(prediction, plant_name, common_diseases, common_pests,
 
     # --- Pest Diagnosis ---
     # (Assuming your model also predicts pests with a 'pest_probability' and 'pest_label')
-    if prediction['pest_probability'] > 0.8:
+    if pest_probability > 0.8:
         predicted_pest = prediction['pest_label']
         if predicted_pest in common_pests:
             refined_diagnosis += f"I also noticed signs of {predicted_pest}. "
@@ -291,19 +716,25 @@ def refine_diagnosis(prediction, plant_name, common_diseases, common_pests,
             refined_diagnosis += f"I also noticed signs of a pest similar to {predicted_pest}. "
 
     # --- Symptom Analysis ---
-    # Use spaCy to extract symptom keywords from the user query
-    doc = nlp(user_query)
-    symptom_keywords = [
-        ent.text for ent in doc.ents if ent.label_ == "SYMPTOM"
-    ]
+    # Use the catalog gazetteer to extract symptom keywords from the user query
+    if entities is None:
+        entities = extract_entities(user_query)
+    symptom_keywords = entities.symptoms
     if symptom_keywords:
         refined_diagnosis += f"You mentioned symptoms like {', '.join(symptom_keywords)}. "
-        # ... (You can add logic here to cross-reference symptoms with diseases/pests) ...
+
+    # --- Differential Diagnosis ---
+    # Cross-reference the symptoms and prediction with the catalog's diseases/pests
+    if diagnoses is None:
+        diagnoses = rank_diagnoses(prediction, symptom_keywords, entities.diseases,
+                                   entities.pests, common_diseases, common_pests)
+    if diagnoses:
+        candidates = ', '.join(f"{d.name} ({d.confidence:.0%})" for d in diagnoses)
+        refined_diagnosis += f"The most likely causes are: {candidates}. "
 
     # --- Additional Advice ---
     # (If no clear diagnosis can be made)
-    if prediction['disease_probability'] < 0.8 and prediction[
-            'pest_probability'] < 0.8:
+    if disease_probability < 0.8 and pest_probability < 0.8:
         refined_diagnosis += "To help me diagnose the issue more accurately, " \
                              "could you please provide more details about the symptoms " \
                              "or any recent changes in the plant's environment?"
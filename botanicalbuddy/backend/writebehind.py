@@ -0,0 +1,222 @@
+import atexit
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+def bulk_create_qa_entries(rows):
+    """
+    Inserts buffered rows as QAEntry objects in a single bulk_create.
+    """
+    from .models import QAEntry
+
+    close_old_connections()
+    QAEntry.objects.bulk_create([QAEntry(**row) for row in rows], batch_size=500)
+
+
+class QAEntryWriteBuffer:
+    """
+    Write-behind buffer for QAEntry inserts.
+
+    submit() only appends to memory, so answering a question no longer waits
+    for a 1536-dim vector insert. A daemon thread flushes the buffer with
+    bulk_create when it reaches `max_batch` rows or its oldest row is
+    `max_delay` seconds old, and a final flush runs at interpreter exit.
+
+    A batch that fails to write is set aside and retried on its own after
+    `retry_delay` seconds, doubling with each attempt up to
+    `max_retry_delay`, and dropped after `max_retries` retries. Rows
+    submitted in the meantime are flushed as usual.
+
+    Rows still in memory are lost if the process dies without exiting
+    cleanly; stats() exposes how many rows and how many seconds of writes
+    are at risk.
+    """
+
+    def __init__(self, writer=bulk_create_qa_entries, max_batch=100, max_delay=1.0,
+                 max_pending=10_000, dedupe_threshold=0.98, max_retries=3,
+                 retry_delay=1.0, max_retry_delay=30.0):
+        self.writer = writer
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self.dedupe_threshold = dedupe_threshold
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self._pending = []
+        self._oldest = None
+        # Failed batches as [rows, attempts, retry_at, oldest], never merged.
+        self._retrying = []
+        self._condition = threading.Condition()
+        self._thread = None
+        self._stopped = False
+        self.submitted = self.flushed = self.deduped = self.dropped = self.failed = 0
+        self.last_flush_at = None
+        self.last_flush_seconds = None
+
+    def submit(self, plant, question_text, question_vector, answer_text):
+        """
+        Queues a Q&A entry for insertion and returns immediately.
+
+        Returns:
+            bool: False if the buffer is full and the entry was dropped.
+        """
+        row = {'plant_id': plant.pk, 'question_text': question_text,
+               'question_vector': question_vector, 'answer_text': answer_text}
+        with self._condition:
+            if len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                logger.warning("QAEntry write buffer is full; dropping entry.")
+                return False
+            if not self._pending:
+                self._oldest = time.monotonic()
+            self._pending.append(row)
+            self.submitted += 1
+            if len(self._pending) >= self.max_batch:
+                self._condition.notify()
+        self._ensure_thread()
+        return True
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._condition:
+                if self._thread is None or not self._thread.is_alive():
+                    self._stopped = False
+                    self._thread = threading.Thread(target=self._run, name="qaentry-write-buffer",
+                                                    daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._stopped and not self._due():
+                    self._condition.wait(self._timeout())
+                if self._stopped:
+                    return
+            self.flush()
+
+    def _due(self):
+        now = time.monotonic()
+        return (bool(self._pending) and (len(self._pending) >= self.max_batch
+                                         or now - self._oldest >= self.max_delay)
+                or any(retry_at <= now for _, _, retry_at, _ in self._retrying))
+
+    def _timeout(self):
+        deadlines = [retry_at for _, _, retry_at, _ in self._retrying]
+        if self._oldest is not None:
+            deadlines.append(self._oldest + self.max_delay)
+        return max(0.0, min(deadlines) - time.monotonic()) if deadlines else self.max_delay
+
+    def dedupe(self, rows):
+        """
+        Drops rows that repeat an earlier question for the same plant, either
+        word for word or with near-identical question vectors.
+        """
+        kept, seen_text, vectors_by_plant = [], set(), {}
+        for row in rows:
+            key = (row['plant_id'], " ".join(row['question_text'].lower().split()))
+            if key in seen_text:
+                continue
+            vector = row['question_vector']
+            if vector is not None:
+                vector = np.asarray(vector, dtype=np.float32)
+                vector = vector / (np.linalg.norm(vector) or 1.0)
+                previous = vectors_by_plant.setdefault(row['plant_id'], [])
+                if previous and float(np.max(np.stack(previous) @ vector)) >= self.dedupe_threshold:
+                    continue
+                previous.append(vector)
+            seen_text.add(key)
+            kept.append(row)
+        return kept
+
+    def flush(self, retry_all=False):
+        """
+        Writes everything buffered so far, plus each failed batch whose
+        retry is due (all of them if `retry_all`).
+
+        Returns:
+            int: The number of rows written.
+        """
+        now = time.monotonic()
+        with self._condition:
+            rows, self._pending = self._pending, []
+            oldest, self._oldest = self._oldest, None
+            retries = [r for r in self._retrying if retry_all or r[2] <= now]
+            self._retrying = [r for r in self._retrying if not (retry_all or r[2] <= now)]
+        written = 0
+        if rows:
+            batch = self.dedupe(rows)
+            self.deduped += len(rows) - len(batch)
+            written += self._write(batch, 0, oldest)
+        for batch, attempts, _, batch_oldest in retries:
+            written += self._write(batch, attempts, batch_oldest)
+        return written
+
+    def _write(self, batch, attempts, oldest):
+        started = time.monotonic()
+        try:
+            self.writer(batch)
+        except Exception as e:
+            attempts += 1
+            if attempts > self.max_retries:
+                self.failed += len(batch)
+                logger.exception(f"Dropping {len(batch)} QAEntry rows after {attempts} failed attempts: {e}")
+            else:
+                delay = min(self.retry_delay * 2 ** (attempts - 1), self.max_retry_delay)
+                logger.error(f"Failed to flush {len(batch)} QAEntry rows (attempt {attempts}); "
+                             f"retrying in {delay:.1f}s: {e}")
+                with self._condition:
+                    self._retrying.append([batch, attempts, time.monotonic() + delay, oldest])
+            return 0
+        self.flushed += len(batch)
+        self.last_flush_at = time.time()
+        self.last_flush_seconds = time.monotonic() - started
+        logger.debug(f"Flushed {len(batch)} QAEntry rows in {self.last_flush_seconds * 1000:.1f}ms")
+        return len(batch)
+
+    def close(self):
+        """
+        Stops the flusher thread and writes whatever is still buffered.
+        """
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        # One last attempt for everything, including batches still backing off.
+        self.flush(retry_all=True)
+
+    def stats(self):
+        with self._condition:
+            retrying = sum(len(rows) for rows, _, _, _ in self._retrying)
+            pending = len(self._pending) + retrying
+            oldest = [o for o in [self._oldest] + [r[3] for r in self._retrying] if o is not None]
+            oldest_age = time.monotonic() - min(oldest) if oldest else 0.0
+        return {
+            'pending': pending,
+            'retrying': retrying,
+            'oldest_pending_seconds': round(oldest_age, 3),
+            'submitted': self.submitted,
+            'flushed': self.flushed,
+            'deduped': self.deduped,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'last_flush_at': self.last_flush_at,
+            'last_flush_seconds': self.last_flush_seconds,
+        }
+
+
+qa_write_buffer = QAEntryWriteBuffer(
+    max_batch=int(os.environ.get("QA_WRITE_BATCH_SIZE", 100)),
+    max_delay=float(os.environ.get("QA_WRITE_MAX_DELAY", 1.0)),
+    max_pending=int(os.environ.get("QA_WRITE_MAX_PENDING", 10_000)),
+    retry_delay=float(os.environ.get("QA_WRITE_RETRY_DELAY", 1.0)),
+)
+atexit.register(qa_write_buffer.close)
@@ -33,11 +33,14 @@ INSTALLED_APPS = [
     # Third-party libraries
     'rest_framework',
     'rest_framework_simplejwt',
+    'adrf',
     'django_filters',
     'pgvector.django',  # If you're using pgvector
 ]
 
 MIDDLEWARE = [
+    'backend.profiling.ProfilingMiddleware',  # Opt-in; see backend/profiling.py
+    'backend.routers.ReplicaPinningMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -68,6 +71,20 @@ TEMPLATES = [
 WSGI_APPLICATION = 'botanicalbuddy.wsgi.application'  # Replace with your project's name
 
 # Database
+# DATABASE_POOL=true uses a psycopg connection pool shared by all threads,
+# which is what ASGI needs: persistent connections (CONN_MAX_AGE) belong to
+# the thread that opened them, and ASGI runs each request's sync work on a
+# new thread, so under ASGI they are orphaned rather than reused. Without the
+# pool, connections are therefore closed after each request unless
+# DATABASE_CONN_MAX_AGE is set, which only helps a WSGI deployment.
+DATABASE_POOL = os.environ.get('DATABASE_POOL', 'False').lower() == 'true'
+DATABASE_POOL_OPTIONS = {
+    'min_size': int(os.environ.get('DATABASE_POOL_MIN_SIZE', 2)),
+    'max_size': int(os.environ.get('DATABASE_POOL_MAX_SIZE', 20)),
+    'timeout': float(os.environ.get('DATABASE_POOL_TIMEOUT', 10)),
+    'max_idle': float(os.environ.get('DATABASE_POOL_MAX_IDLE', 300)),
+}
+
 DATABASES = {
     'default': {
         'ENGINE': os.environ.get('DATABASE_ENGINE'),
@@ -76,9 +93,48 @@ DATABASES = {
         'PASSWORD': os.environ.get('DATABASE_PASSWORD'),
         'HOST': os.environ.get('DATABASE_HOST'),
         'PORT': int(os.environ.get('DATABASE_PORT', 5432)),
+        'CONN_MAX_AGE': 0 if DATABASE_POOL else int(os.environ.get('DATABASE_CONN_MAX_AGE', 0)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {'pool': DATABASE_POOL_OPTIONS} if DATABASE_POOL else {},
     }
 }
 
+# Read replicas for PlantData and QAEntry reads (see backend/routers.py).
+# Each "host" or "host:port" in DATABASE_REPLICA_HOSTS becomes an alias
+# replica_0, replica_1, ... with the primary's credentials. Tests mirror them
+# onto the test database instead of creating their own.
+for index, replica in enumerate(filter(None, os.environ.get('DATABASE_REPLICA_HOSTS', '').split(','))):
+    replica_host, _, replica_port = replica.strip().partition(':')
+    DATABASES[f'replica_{index}'] = {
+        **DATABASES['default'],
+        'HOST': replica_host,
+        'PORT': int(replica_port or DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias.startswith('replica_')]
+DATABASE_ROUTERS = ['backend.routers.ReplicaRouter']
+
+# Cache shared by the workers: API responses, catalog queries and replica
+# pins. Without REDIS_URL each process keeps its own in-memory cache.
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'botanicalbuddy',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Session users are loaded through the user cache (backend/authentication.py).
+AUTHENTICATION_BACKENDS = ['backend.authentication.CachedModelBackend']
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     # ... your password validators ...
@@ -100,7 +156,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Django REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'backend.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
@@ -148,7 +204,8 @@ LOGGING = {
     }
 }
 
-SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+# Sessions are read from the cache and written through to the database.
+SESSION_ENGINE = os.environ.get('SESSION_ENGINE', 'django.contrib.sessions.backends.cached_db')
 SESSION_COOKIE_AGE = 3600  # 1 hour (in seconds)
 SESSION_COOKIE_SECURE = True  # Set to True in production
 SESSION_COOKIE_HTTPONLY = True  # Set to True for security
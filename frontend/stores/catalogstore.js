@@ -0,0 +1,74 @@
+import { defineStore } from 'pinia';
+
+const STORAGE_KEY = 'plant-catalog';
+
+// Turns the bundle's [fields, rows] layout into one object per plant.
+function toPlants(fields, rows) {
+  return rows.map((row) => Object.fromEntries(fields.map((field, i) => [field, row[i]])));
+}
+
+export const useCatalogStore = defineStore('catalog', {
+  state: () => ({
+    version: null,
+    plants: [],
+    loading: false,
+  }),
+  getters: {
+    search: (state) => (text) => {
+      const query = text.trim().toLowerCase();
+      if (!query) return state.plants;
+      return state.plants.filter((plant) =>
+        [plant.common_name, plant.scientific_name, plant.family, plant.genus]
+          .some((name) => name && name.toLowerCase().includes(query)));
+    },
+  },
+  actions: {
+    // Brings the local catalog up to the server's version: nothing to fetch
+    // when it is current, a delta when the local version is still listed,
+    // the full bundle otherwise. Bundles are cached by the browser for good.
+    async sync() {
+      this.loading = true;
+      try {
+        if (!this.version) this.restore();
+        const manifest = await (await fetch('/api/catalog/manifest/')).json();
+        if (manifest.version === this.version) return;
+        const delta = this.version && manifest.deltas[this.version];
+        if (delta) {
+          const changes = await (await fetch(`/api/catalog/${delta.name}/`)).json();
+          const byId = new Map(this.plants.map((plant) => [plant.id, plant]));
+          changes.deletes.forEach((id) => byId.delete(id));
+          toPlants(changes.fields, changes.upserts).forEach((plant) => byId.set(plant.id, plant));
+          this.plants = [...byId.values()].sort((a, b) => a.id - b.id);
+        } else {
+          const bundle = await (await fetch(`/api/catalog/${manifest.bundle.name}/`)).json();
+          this.plants = toPlants(bundle.fields, bundle.rows);
+        }
+        this.version = manifest.version;
+        this.persist();
+      } catch (error) {
+        console.error('Error syncing the plant catalog:', error);
+      } finally {
+        this.loading = false;
+      }
+    },
+    restore() {
+      try {
+        const saved = JSON.parse(localStorage.getItem(STORAGE_KEY));
+        if (saved) {
+          this.version = saved.version;
+          this.plants = saved.plants;
+        }
+      } catch (error) {
+        localStorage.removeItem(STORAGE_KEY);
+      }
+    },
+    persist() {
+      try {
+        localStorage.setItem(STORAGE_KEY, JSON.stringify({ version: this.version, plants: this.plants }));
+      } catch (error) {
+        // Over the storage quota: the next visit downloads the bundle again.
+        localStorage.removeItem(STORAGE_KEY);
+      }
+    },
+  },
+});
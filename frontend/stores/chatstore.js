@@ -4,12 +4,14 @@ export const useChatStore = defineStore('chat', {
   state: () => ({
     messages: [],
     plantName: null, 
+    conversationId: null,
     loading: false,
   }),
   actions: {
     async initializeChat(plantName) { 
       this.plantName = plantName;
       this.messages = []; 
+      this.conversationId = null;
       this.loading = true;
       try {
         const response = await fetch(`/api/get_plant_data/?name=${plantName}`);
@@ -32,9 +34,15 @@ export const useChatStore = defineStore('chat', {
         const response = await fetch('/api/ask_botanical_question/', {
           method: 'POST',
           headers: { 'Content-Type': 'application/json' },
-          body: JSON.stringify({ query: message, plant_name: this.plantName }),
+          body: JSON.stringify({
+            query: message,
+            plant_name: this.plantName,
+            conversation_id: this.conversationId,
+            start_conversation: this.conversationId === null,
+          }),
         });
         const data = await response.json();
+        if (data.conversation_id) this.conversationId = data.conversation_id;
         this.messages.push({ text: data.answer, isUser: false });
       } catch (error) {
         console.error('Error sending message:', error);